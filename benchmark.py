@@ -0,0 +1,205 @@
+import time
+import random
+import difflib
+import calendar
+import numpy as np
+import pandas as pd
+
+import trial
+
+
+def legacy_standardize_state_names(df, state_col='Store State'):
+    if state_col in df.columns:
+        df[state_col] = df[state_col].str.strip().str.title()
+        df[state_col] = df[state_col].replace({
+            'Pondicherry': 'Puducherry',
+            'Puducherry': 'Puducherry'
+        })
+        df[state_col] = df[state_col].map(lambda x: trial.STATE_MAPPING.get(x.lower(), x) if pd.notna(x) else x)
+    return df
+
+def legacy_standardize_names(df, store_col='Store Name', spoc_col='Spoc Name', state_col='Store State', product_col=None):
+    for col in [store_col, spoc_col, state_col, product_col]:
+        if col and col in df.columns:
+            df[col] = df[col].apply(lambda x: str(x).strip().title() if pd.notna(x) else x)
+    df = legacy_standardize_state_names(df, state_col)
+    return df
+
+def legacy_filter_by_date(df, year, month, day=None, date_column='Created Date'):
+    dates = pd.to_datetime(df[date_column], errors='coerce', dayfirst=True)
+    mask = df['Year'] == year
+    if month and month != "All":
+        mask &= df['Month'] == month
+    if day and day != "All":
+        mask &= dates.dt.day == day
+    df = df[mask]
+    df[date_column] = dates[mask]
+    return df
+
+def legacy_categorize_product_type(product_type):
+    if pd.isna(product_type):
+        return 'Other'
+    product_type = str(product_type).lower().strip()
+    if any(x in product_type for x in ['mobile', 'phone']):
+        return 'Mobile Phone'
+    elif 'laptop' in product_type:
+        return 'Laptop'
+    elif 'tablet' in product_type:
+        return 'Tablet'
+    elif any(x in product_type for x in ['smartwatch', 'watch']):
+        if 'apple' in product_type:
+            return 'SmartWatch (Apple)'
+        return 'SmartWatch (Android)'
+    return 'Other'
+
+def make_name_frame(rows, seed=42):
+    rng = random.Random(seed)
+    stores = [f" maple @ store {i} " for i in range(300)] + [None]
+    spocs = [f"SPOC NAME {i}" for i in range(200)] + [None]
+    states = ['ka', 'Tamil Nadu', ' kerala', 'TN', 'telengana', 'pondicherry', 'AP', 'Maharashtra', None]
+    products = [f"apple iphone {i} (4 gb/128 gb)" for i in range(400)]
+    return pd.DataFrame({
+        'Store Name': [rng.choice(stores) for _ in range(rows)],
+        'Spoc Name': [rng.choice(spocs) for _ in range(rows)],
+        'Store State': [rng.choice(states) for _ in range(rows)],
+        'Old Product Name': [rng.choice(products) for _ in range(rows)]
+    })
+
+def time_call(func, df, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        result = func(frame, product_col='Old Product Name')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_standardize_names(rows):
+    df = make_name_frame(rows)
+    legacy_time, legacy_result = time_call(legacy_standardize_names, df)
+    new_time, new_result = time_call(trial.standardize_names, df)
+    for col in df.columns:
+        legacy_values = legacy_result[col].astype(object).where(legacy_result[col].notna(), None)
+        new_values = new_result[col].astype(object).where(new_result[col].notna(), None)
+        assert legacy_values.tolist() == new_values.tolist(), f"Mismatch in {col}"
+    print(f"standardize_names rows={rows:>9,}  legacy={legacy_time:.3f}s  unique-map={new_time:.3f}s  speedup={legacy_time / new_time:.1f}x")
+
+def make_date_frame(rows, seed=42):
+    rng = random.Random(seed)
+    start = pd.Timestamp('2024-06-01')
+    dates = pd.Series([start + pd.Timedelta(minutes=rng.randrange(400 * 24 * 60)) for _ in range(rows)])
+    df = pd.DataFrame({'Created Date': dates, 'Year': dates.dt.year, 'Month': dates.dt.month_name()})
+    return trial.sort_by_date(df, 'Created Date')
+
+def bench_filter_by_date(rows, repeat=5):
+    df = make_date_frame(rows)
+    windows = [(2025, 'April', 'All'), (2025, 'May', 6), (2024, 'All', 'All')]
+    timings = {'legacy': None, 'searchsorted': None}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        legacy_results = [legacy_filter_by_date(df, *window) for window in windows]
+        elapsed = time.perf_counter() - start
+        timings['legacy'] = elapsed if timings['legacy'] is None else min(timings['legacy'], elapsed)
+        start = time.perf_counter()
+        new_results = [trial.slice_by_date(df, 'Created Date', *trial.get_date_window(*window)) for window in windows]
+        elapsed = time.perf_counter() - start
+        timings['searchsorted'] = elapsed if timings['searchsorted'] is None else min(timings['searchsorted'], elapsed)
+    for legacy_result, new_result in zip(legacy_results, new_results):
+        assert legacy_result.index.tolist() == new_result.index.tolist(), "Mismatch in date window"
+    print(f"filter_by_date    rows={rows:>9,}  legacy={timings['legacy']:.4f}s  searchsorted={timings['searchsorted']:.4f}s  speedup={timings['legacy'] / timings['searchsorted']:.1f}x")
+
+def bench_categorize_product_types(rows):
+    rng = random.Random(42)
+    types = ['Mobile Phone', 'Laptop', 'Tablet', 'Apple Watch', 'Android Smartwatch', 'Apple', 'Android', None]
+    product_types = pd.Series([rng.choice(types) for _ in range(rows)])
+    start = time.perf_counter()
+    legacy = product_types.apply(legacy_categorize_product_type)
+    legacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    categories = trial.categorize_product_types(product_types, trial.PRODUCT_CATEGORY_RULES)
+    new_time = time.perf_counter() - start
+    assert legacy.tolist() == categories.astype(object).tolist(), "Mismatch in product categories"
+    print(f"product category  rows={rows:>9,}  apply={legacy_time:.3f}s  rules-lookup={new_time:.4f}s  speedup={legacy_time / new_time:.1f}x")
+
+def make_store_variants(stores, variants, seed=42):
+    rng = random.Random(seed)
+    names = []
+    truth = []
+    for _ in range(variants):
+        store = rng.choice(stores)
+        name = store.replace(' @ ', rng.choice([' ', ' @', '-', ' @ ']))
+        if rng.random() < 0.5:
+            name = name.upper()
+        if rng.random() < 0.3:
+            i = rng.randrange(len(name))
+            name = name[:i] + name[i + 1:]
+        names.append(name.strip().title())
+        truth.append(store)
+    return names, truth
+
+def bench_store_matching(stores, variants):
+    store_names = sorted(f"Iplanet @ {area} Road {city} {code}{i % 9}" for i, (area, city, code) in enumerate(
+        (f"Area{i}", f"City{i % 40}", f"C{i:03d}") for i in range(stores)))
+    names, truth = make_store_variants(store_names, variants)
+    start = time.perf_counter()
+    legacy = [(difflib.get_close_matches(name, store_names, n=1, cutoff=0) or [None])[0] for name in names]
+    legacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    matches = trial.match_store_names(names, store_names)
+    new_time = time.perf_counter() - start
+    indexed = dict(zip(matches['Alias'], matches['Store Name']))
+    legacy_hits = sum(match == store for match, store in zip(legacy, truth))
+    indexed_hits = sum(indexed.get(name) == store for name, store in zip(names, truth))
+    rows = pd.Series(names * 200)
+    start = time.perf_counter()
+    rows.map(indexed).fillna(rows)
+    apply_time = time.perf_counter() - start
+    print(f"store matching    stores={stores:>5,} names={variants:>6,}  difflib={legacy_time:.3f}s ({legacy_hits / variants:.0%})  "
+          f"ngram-index={new_time:.3f}s ({indexed_hits / variants:.0%})  speedup={legacy_time / new_time:.1f}x  "
+          f"alias map over {len(rows):,} rows={apply_time:.3f}s")
+
+def make_price_rows(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    types = np.array(['Mobile Phone', 'Laptop', 'Tablet', 'Apple Watch', 'Android Smartwatch'])
+    return pd.DataFrame({
+        'Source': rng.choice(['Maple', 'Cashify'], rows),
+        'Year': rng.choice([2024, 2025], rows),
+        'Month': rng.choice(list(calendar.month_name)[1:], rows),
+        'Store State': rng.choice(trial.SOUTH_STATES, rows),
+        'Product Type': rng.choice(types, rows),
+        'Amount': rng.lognormal(9.5, 0.6, rows)
+    }).assign(**{'Product Category': lambda df: trial.categorize_product_types(df['Product Type'], trial.PRODUCT_CATEGORY_RULES)})
+
+def bench_price_summary(rows, repeat=3):
+    df = make_price_rows(rows)
+    summary = trial.build_price_summary(df)
+    keys = ['Product Category', 'Source']
+    timings = {'rows': None, 'sketch': None}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        exact = df[df['Year'] == 2025].groupby(keys)['Amount'].quantile([0.1, 0.5, 0.9]).unstack()
+        elapsed = time.perf_counter() - start
+        timings['rows'] = elapsed if timings['rows'] is None else min(timings['rows'], elapsed)
+        start = time.perf_counter()
+        merged = trial.summarize_price_cells(summary[summary['Year'] == 2025], keys).set_index(keys)
+        elapsed = time.perf_counter() - start
+        timings['sketch'] = elapsed if timings['sketch'] is None else min(timings['sketch'], elapsed)
+    error = max((merged[name] / exact[q] - 1).abs().max() for name, q in [('P10', 0.1), ('Median', 0.5), ('P90', 0.9)])
+    print(f"price quantiles   rows={rows:>9,}  cells={len(summary):,}  rescan={timings['rows']:.3f}s  "
+          f"sketch-merge={timings['sketch']:.3f}s  max quantile error={error:.2%}")
+
+
+
+if __name__ == "__main__":
+    for rows in [10_000, 100_000, 500_000]:
+        bench_standardize_names(rows)
+    for rows in [10_000, 100_000, 1_000_000]:
+        bench_filter_by_date(rows)
+    for rows in [100_000, 1_000_000]:
+        bench_categorize_product_types(rows)
+    for stores, variants in [(100, 500), (300, 1_000)]:
+        bench_store_matching(stores, variants)
+    for rows in [100_000, 1_000_000]:
+        bench_price_summary(rows)
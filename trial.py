@@ -1,5 +1,6 @@
 import streamlit as st  
 import pandas as pd 
+import numpy as np
 import plotly.express as px 
 import plotly.graph_objects as go
 from datetime import datetime, date, timedelta
@@ -9,6 +10,19 @@ import os
 import logging
 import calendar
 import uuid
+import hashlib
+import glob
+import shutil
+import json
+import re
+import sys
+import sqlite3
+import threading
+import weakref
+from collections import Counter, OrderedDict
+from contextlib import closing
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
 
 # Configure logging
 logging.basicConfig(filename='debug.log', level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -17,12 +31,6 @@ logging.basicConfig(filename='debug.log', level=logging.INFO, format='%(asctime)
 st.set_page_config(page_title="Maple vs Cashify Analytics", layout="wide")
 
 # Initialize session state
-if 'maple_data' not in st.session_state:
-    st.session_state.maple_data = None
-if 'cashify_data' not in st.session_state:
-    st.session_state.cashify_data = None
-if 'spoc_data' not in st.session_state:
-    st.session_state.spoc_data = None
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 if 'username' not in st.session_state:
@@ -31,8 +39,6 @@ if 'column_mappings' not in st.session_state:
     st.session_state.column_mappings = {'Maple': {}, 'Cashify': {}, 'SPOC': {}}
 if 'spoc_mapping_complete' not in st.session_state:
     st.session_state.spoc_mapping_complete = False
-if 'spoc_ids' not in st.session_state:
-    st.session_state.spoc_ids = {}
 
 # User credentials
 users = {
@@ -56,6 +62,20 @@ CASHIFY_REQUIRED_COLUMNS = [
     'Old Device Name', 'New Device IMEI', 'New Device Name', 'Initial Device Amount'
 ]
 SPOC_REQUIRED_COLUMNS = ['Spoc Name', 'Store State', 'Zone', 'Weekoff Day', 'Store Name']
+SOURCE_REQUIRED_COLUMNS = {'Maple': MAPLE_REQUIRED_COLUMNS, 'Cashify': CASHIFY_REQUIRED_COLUMNS, 'SPOC': SPOC_REQUIRED_COLUMNS}
+# Used when present; SPOC monthly target columns are picked up by name. Everything else stays on disk.
+SOURCE_OPTIONAL_COLUMNS = {
+    'Maple': ['Store State', 'Zone', 'Spoc Name'],
+    'Cashify': ['Store State', 'Zone', 'Spoc Name', ' Partner Name'],
+    'SPOC': []
+}
+# Read as text so IDs and IMEIs are never parsed as numbers
+SOURCE_TEXT_COLUMNS = [
+    'Service Number', 'Status', 'Old IMEI No', 'Store Name', 'Vendor Name', 'Partner / Source',
+    'Product Category', 'Product Type', 'Old Product Name', 'New Product Name', 'Order Id',
+    'Order Status', 'Partner Name', ' Partner Name', 'Pickup Type', 'Old Device IMEI', 'Old Device Name',
+    'New Device IMEI', 'New Device Name', 'Spoc Name', 'Store State', 'Zone', 'Weekoff Day'
+]
 
 # Enhanced state name normalization
 STATE_MAPPING = {
@@ -69,20 +89,620 @@ STATE_MAPPING = {
     'py': 'Puducherry'
 }
 
-# File paths
-BASE_PATH = "/Users/maple/Desktop/SPOC Review file/"
-MAPLE_FILE_PATH = os.path.join(BASE_PATH, "Actual Data Sheet.xlsx")
-CASHIFY_FILE_PATH = os.path.join(BASE_PATH, "Cashify Trade-in Sept'24 to 12th May'25.xlsx")
-SPOC_FILE_PATH = os.path.join(BASE_PATH, "SPOC Master Data Sheet.xlsx")
+# Data sources: a workbook/CSV path, a directory of them or a glob pattern.
+# Multiple files (e.g. monthly drops) are concatenated in file name order.
+BASE_PATH = os.environ.get("TRADEIN_DATA_DIR", "/Users/maple/Desktop/SPOC Review file/")
+MAPLE_SOURCE = os.environ.get("MAPLE_SOURCE", os.path.join(BASE_PATH, "Actual Data Sheet.xlsx"))
+CASHIFY_SOURCE = os.environ.get("CASHIFY_SOURCE", os.path.join(BASE_PATH, "Cashify Trade-in Sept'24 to 12th May'25.xlsx"))
+SPOC_SOURCE = os.environ.get("SPOC_SOURCE", os.path.join(BASE_PATH, "SPOC Master Data Sheet.xlsx"))
+SOURCE_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# Columnar snapshots of the source workbooks
+SNAPSHOT_DIR = os.path.join(BASE_PATH, ".snapshots")
+SNAPSHOT_MANIFEST_PATH = os.path.join(SNAPSHOT_DIR, "manifest.json")
+try:
+    import pyarrow  # noqa: F401
+    SNAPSHOT_FORMAT = "parquet"
+except ImportError:
+    SNAPSHOT_FORMAT = "pickle"
+# Bump when the preprocessing pipeline changes so cached datasets are rebuilt
+PREPROCESSING_CACHE_VERSION = 13
+# Low-cardinality text columns stored as categoricals so filters and groupbys compare integer codes
+CATEGORICAL_COLUMNS = ['Store Name', 'Spoc Name', 'Store State', 'Zone', 'Month', 'Product Type',
+                       'Product Category', 'Product Type Category', 'Vendor Name', 'Partner Name', 'Order Status']
+# Processed Maple/Cashify rows are stored as year=YYYY/month=MM partitions of their date column
+DATASET_DATE_COLUMNS = {'maple': 'Created Date', 'cashify': 'Order Date'}
+DATASET_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# Date windows held in memory for all sessions; memory follows the windows, not the history
+DATASET_WINDOW_CACHE_ENTRIES = 8
+# Rows of each source kept in memory for column validation
+SOURCE_PREVIEW_ROWS = 100
+# .xlsx sources are streamed row by row and parsed in chunks of this many rows
+WORKBOOK_CHUNK_ROWS = int(os.environ.get("WORKBOOK_CHUNK_ROWS", "10000"))
+# "pandas" reads windows from the Parquet partitions; "sqlite" serves windows and row counts
+# from an indexed SQLite copy of the processed datasets
+QUERY_BACKEND = os.environ.get("QUERY_BACKEND", "pandas")
+QUERY_INDEX_COLUMNS = [['Year', 'Month'], ['Store Name'], ['Zone'], ['Store State'], ['SPOC_ID']]
+# Incremental ingest: workbook rows are matched against the stored dataset by these IDs
+INCREMENTAL_INGEST = os.environ.get("INCREMENTAL_INGEST", "1") != "0"
+INGEST_ID_COLUMNS = {'maple': 'Service Number', 'cashify': 'Order Id'}
+INGEST_STATE_PATH = os.path.join(SNAPSHOT_DIR, "ingest_state.json")
+
+# Dimensions of the pre-aggregated trade-in cube (Count and Amount are the measures)
+CUBE_DIMENSIONS = ['Source', 'Date', 'Year', 'Month', 'Store Name', 'Spoc Name', 'Store State', 'Zone', 'Product Category']
+
+# Price summary: exact count, sum and quantiles per cell plus a mergeable centroid sketch, so
+# month ranges and coarser groupings are answered by merging sketches instead of reading rows
+PRICE_SUMMARY_DIMENSIONS = ['Source', 'Year', 'Month', 'Store State', 'Product Category', 'Product Type']
+PRICE_QUANTILES = {'P10': 0.1, 'P25': 0.25, 'Median': 0.5, 'P75': 0.75, 'P90': 0.9}
+PRICE_SKETCH_SIZE = int(os.environ.get("PRICE_SKETCH_SIZE", "100"))
+PRICING_CATEGORIES = ['Mobile Phone', 'Laptop', 'Tablet', 'SmartWatch (Apple)', 'SmartWatch (Android)']
+
+# Device catalog: Maple and Cashify device names are reduced to brand + model tokens so the
+# same model gets one key whatever the vendor's naming; storage is kept as its own column
+DEVICE_NAME_COLUMNS = {'maple': 'Old Product Name', 'cashify': 'Old Device Name'}
+DEVICE_BRANDS = [
+    'apple', 'samsung', 'xiaomi', 'oneplus', 'vivo', 'iqoo', 'oppo', 'realme', 'motorola', 'google',
+    'nokia', 'honor', 'huawei', 'infinix', 'tecno', 'nothing', 'asus', 'hp', 'dell', 'lenovo', 'acer',
+    'lg', 'sony', 'micromax', 'lava', 'microsoft', 'msi'
+]
+DEVICE_BRAND_ALIASES = {
+    'iphone': 'apple', 'ipad': 'apple', 'macbook': 'apple', 'imac': 'apple', 'redmi': 'xiaomi',
+    'mi': 'xiaomi', 'poco': 'xiaomi', 'galaxy': 'samsung', 'moto': 'motorola', 'pixel': 'google'
+}
+# Dropped from model keys: network generation and series words one vendor includes and the other omits
+DEVICE_NOISE_TOKENS = {'5g', '4g', 'lte', 'dual', 'sim', 'galaxy', 'moto'}
+# Per-model price totals are kept per storage variant so each comparison is like-for-like
+MODEL_PRICE_KEYS = ['Source', 'Store State', 'Model Key', 'Storage (GB)']
+# Tables derived from the stored datasets at ingest, with the columns their builders read
+DERIVED_TABLES = ['devices', 'models', 'imei', 'prices']
+DERIVED_TABLE_COLUMNS = ['Store State', 'Store Name', 'Year', 'Month', 'Product Type', 'Product Type Category']
+
+# IMEI columns linked across feeds, with the role the device plays in the trade-in
+IMEI_COLUMNS = {
+    'maple': [('Old IMEI No', 'Old Device')],
+    'cashify': [('Old Device IMEI', 'Old Device'), ('New Device IMEI', 'New Device')]
+}
+DATASET_AMOUNT_COLUMNS = {'maple': 'Maple Bid', 'cashify': 'Initial Device Amount'}
+IMEI_INDEX_COLUMNS = ['IMEI Key', 'Source', 'Role', 'Date', 'Store Name', 'Store State', 'Device Name', 'Amount']
+
+# Grouping keys for each market share grain
+MARKET_SHARE_GRAINS = {
+    'store': ['Store Name', 'Store State', 'Zone'],
+    'spoc': ['Store Name', 'Spoc Name'],
+    'state': ['Store State'],
+    'zone': ['Zone']
+}
+
+SOUTH_STATES = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
+
+# Base analysis sections; only the selected one is computed per rerun
+BASE_SECTIONS = [
+    "1. Average Devices Acquired",
+    "1.1 Weekly Market Share",
+    "2. Monthly Market Share",
+    "2.1 South Zone Market Share",
+    "2.2 Zone-wise Market Share",
+    "2.3 Low Market Share Stores",
+    "2.4 State-wise Device Counts",
+    "2.5 Market Share Analysis",
+    "3. SPOC Performance",
+    "4. Category-wise Contribution",
+    "5. Weekoff Day Losses",
+    "6. Working Day Losses",
+    "7. Trade-in Losses",
+    "8. Pricing Comparison"
+]
+# Memory budget for memoized section results, shared by all sessions
+SECTION_CACHE_BUDGET_MB = int(os.environ.get("SECTION_CACHE_BUDGET_MB", 256))
+
+# Persistent SPOC identity registry
+SPOC_REGISTRY_PATH = os.path.join(BASE_PATH, "spoc_registry.db")
+SPOC_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "spoc.maple")
+# Store names missing from the SPOC master are matched to it by character n-grams; matches
+# scoring at least STORE_ALIAS_AUTO_ACCEPT with the same trailing store code (Jng1, Try3) are
+# applied straight away, the rest down to STORE_ALIAS_MIN_SCORE are kept as proposals. Both
+# are listed for review
+STORE_MATCH_NGRAM = 3
+STORE_ALIAS_MIN_SCORE = float(os.environ.get("STORE_ALIAS_MIN_SCORE", "0.5"))
+STORE_ALIAS_AUTO_ACCEPT = float(os.environ.get("STORE_ALIAS_AUTO_ACCEPT", "0.9"))
+# Product category rules, first match wins: a Product Type containing the keyword (and the
+# second keyword, when given) gets the category, anything unmatched is 'Other'. The rules are
+# edited from the sidebar into the product_category_rules table; these apply while it is empty
+PRODUCT_CATEGORY_RULES = [
+    ('mobile', '', 'Mobile Phone'),
+    ('phone', '', 'Mobile Phone'),
+    ('laptop', '', 'Laptop'),
+    ('tablet', '', 'Tablet'),
+    ('watch', 'apple', 'SmartWatch (Apple)'),
+    ('watch', '', 'SmartWatch (Android)')
+]
+
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_snapshot_manifest():
+    if not os.path.exists(SNAPSHOT_MANIFEST_PATH):
+        return {}
+    try:
+        with open(SNAPSHOT_MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not read snapshot manifest, rebuilding snapshots: {str(e)}")
+        return {}
+
+def save_snapshot_manifest(manifest):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = SNAPSHOT_MANIFEST_PATH + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, SNAPSHOT_MANIFEST_PATH)
+
+def prepare_snapshot_frame(df):
+    # Excel columns often mix ints/strings/datetimes, which columnar formats reject
+    df = df.copy()
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype != object or not pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            continue
+        # Array cells (price sketches) are stored as Parquet lists
+        if df[col].map(lambda x: isinstance(x, np.ndarray)).all():
+            continue
+        if df[col].map(lambda x: isinstance(x, (datetime, date))).any():
+            parsed = pd.to_datetime(df[col], errors='coerce', format='mixed')
+            if parsed.notna().sum() == df[col].notna().sum():
+                df[col] = parsed
+                continue
+        df[col] = df[col].map(lambda x: str(x) if pd.notna(x) else None)
+    return df
+
+def write_snapshot(df, snapshot_path):
+    tmp_path = snapshot_path + ".tmp"
+    if SNAPSHOT_FORMAT == "parquet":
+        prepare_snapshot_frame(df).to_parquet(tmp_path, index=False)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, snapshot_path)
+
+def read_snapshot(snapshot_path, columns=None):
+    if snapshot_path.endswith(".parquet"):
+        return pd.read_parquet(snapshot_path, columns=columns)
+    df = pd.read_pickle(snapshot_path)
+    return df[columns] if columns else df
+
+def resolve_source_files(source):
+    if os.path.isdir(source):
+        pattern = os.path.join(source, '*')
+    elif any(ch in source for ch in '*?['):
+        pattern = source
+    else:
+        return [source] if os.path.exists(source) else []
+    # Skip Excel lock files left behind by open workbooks
+    return sorted(
+        path for path in glob.glob(pattern)
+        if path.lower().endswith(SOURCE_EXTENSIONS) and not os.path.basename(path).startswith('~$')
+    )
+
+def get_source_fingerprints(source):
+    # Files not converted yet are hashed directly so the key does not change once they are
+    manifest = load_snapshot_manifest()
+    fingerprints = []
+    for path in resolve_source_files(source):
+        entry = manifest.get(os.path.abspath(path))
+        fingerprints.append(entry['sha256'] if is_snapshot_fresh(entry, os.stat(path)) else compute_file_hash(path))
+    return fingerprints
+
+def get_source_signatures(files):
+    signatures = []
+    for file_path in files:
+        stat = os.stat(file_path)
+        signatures.append((file_path, stat.st_mtime, stat.st_size))
+    return tuple(signatures)
+
+def load_source(signatures, columns=None, dtype=None):
+    # Every file keeps its own snapshot, so a new monthly file is the only one converted
+    frames = [read_source_cached(file_path, columns, dtype) for file_path, _, _ in signatures]
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+# Full raw rows are only read when the processed datasets are rebuilt
+@st.cache_resource(show_spinner=False, max_entries=6)
+def load_source_preview(signatures):
+    frames = [read_source_preview(file_path) for file_path, _, _ in signatures]
+    return pd.concat(frames, ignore_index=True)
+
+def get_source_columns(df_name, column_mapping, header):
+    # Source columns the app reads: required and optional columns under their mapped names
+    wanted = {column_mapping.get(col) or col for col in SOURCE_REQUIRED_COLUMNS[df_name] + SOURCE_OPTIONAL_COLUMNS[df_name]}
+    return [
+        col for col in header
+        if col in wanted or (df_name == 'SPOC' and parse_target_column(col))
+    ]
+
+def get_source_dtypes(column_mapping, columns):
+    dtypes = {column_mapping.get(col) or col: str for col in SOURCE_TEXT_COLUMNS}
+    return {col: dtype for col, dtype in dtypes.items() if col in columns}
+
+def read_source_file(file_path, columns=None, dtype=None, nrows=None, on_chunk=None):
+    # Columns outside `columns` are skipped by the parser and never materialized
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda col: col in wanted
+    if file_path.lower().endswith('.csv'):
+        return pd.read_csv(file_path, usecols=usecols, dtype=dtype, nrows=nrows)
+    if file_path.lower().endswith('.xlsx'):
+        return read_workbook(file_path, usecols, dtype, nrows, on_chunk)
+    return pd.read_excel(file_path, usecols=usecols, dtype=dtype, nrows=nrows)
+
+def convert_workbook_cell(cell):
+    # Same cell conversion as pd.read_excel's openpyxl reader
+    if cell.value is None:
+        return ""
+    if cell.data_type == 'e':
+        return np.nan
+    if cell.data_type == 'n':
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+def parse_workbook_chunk(header, rows, usecols, dtype):
+    rows = [row[:len(header)] + [""] * (len(header) - len(row)) for row in rows]
+    return TextParser([header] + rows, header=0, usecols=usecols, dtype=dtype, skip_blank_lines=False).read()
+
+def read_workbook(file_path, usecols=None, dtype=None, nrows=None, on_chunk=None):
+    # Streams the first sheet in read-only mode and parses fixed-size chunks into typed
+    # frames, so only one chunk of raw cell values is held in memory at a time
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total_rows = max((sheet.max_row or 1) - 1, 0)
+        sheet.reset_dimensions()
+        header = None
+        chunks = []
+        rows = []
+        blank_rows = []
+        rows_read = 0
+        for cells in sheet.iter_rows():
+            row = [convert_workbook_cell(cell) for cell in cells]
+            while row and row[-1] == "":
+                row.pop()
+            if header is None:
+                header = row
+                continue
+            # Blank rows are kept like pd.read_excel does, except trailing ones
+            if not row:
+                blank_rows.append(row)
+                continue
+            rows.extend(blank_rows + [row])
+            rows_read += len(blank_rows) + 1
+            blank_rows = []
+            if nrows is not None and rows_read >= nrows:
+                rows = rows[:len(rows) - (rows_read - nrows)]
+                break
+            if len(rows) >= WORKBOOK_CHUNK_ROWS:
+                chunks.append(parse_workbook_chunk(header, rows, usecols, dtype))
+                rows = []
+                if on_chunk:
+                    on_chunk(rows_read, total_rows)
+        if header is None:
+            return pd.DataFrame()
+        if rows or not chunks:
+            chunks.append(parse_workbook_chunk(header, rows, usecols, dtype))
+    finally:
+        workbook.close()
+    if on_chunk:
+        on_chunk(rows_read, rows_read)
+    if len(chunks) == 1:
+        return chunks[0]
+    # Columns that are entirely empty in a chunk come out as float; give them the type the
+    # column has elsewhere so concatenating does not fall back to object
+    for col in chunks[0].columns:
+        dtypes = {chunk[col].dtype for chunk in chunks if chunk[col].notna().any()}
+        if len(dtypes) == 1:
+            col_dtype = dtypes.pop()
+            for chunk in chunks:
+                if chunk[col].dtype != col_dtype and chunk[col].isna().all() and not pd.api.types.is_integer_dtype(col_dtype):
+                    chunk[col] = chunk[col].astype(col_dtype)
+    return pd.concat(chunks, ignore_index=True)
+
+def is_snapshot_fresh(entry, stat):
+    return entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size and os.path.exists(entry['snapshot'])
+
+def snapshot_has_columns(entry, columns):
+    # Entries without a column list hold every column of the workbook
+    return entry.get('columns') is None or (columns is not None and set(columns) <= set(entry['columns']))
+
+def select_source_columns(df, columns):
+    return df if columns is None else df[[col for col in df.columns if col in columns]]
+
+def read_source_preview(file_path):
+    # The first rows with every column, for validating and mapping column names
+    file_path = os.path.abspath(file_path)
+    entry = load_snapshot_manifest().get(file_path)
+    if is_snapshot_fresh(entry, os.stat(file_path)):
+        preview_path = entry.get('preview') or (entry['snapshot'] if entry.get('columns') is None else None)
+        if preview_path and os.path.exists(preview_path):
+            return read_snapshot(preview_path).head(SOURCE_PREVIEW_ROWS)
+    return read_source_file(file_path, nrows=SOURCE_PREVIEW_ROWS)
+
+def read_source_cached(file_path, columns=None, dtype=None):
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    manifest = load_snapshot_manifest()
+    entry = manifest.get(file_path)
+
+    # Unchanged mtime and size: trust the snapshot without hashing the workbook
+    if is_snapshot_fresh(entry, stat) and snapshot_has_columns(entry, columns):
+        return select_source_columns(read_snapshot(entry['snapshot']), columns)
+
+    content_hash = compute_file_hash(file_path)
+    if entry and entry['sha256'] == content_hash and os.path.exists(entry['snapshot']) and snapshot_has_columns(entry, columns):
+        entry.update({'mtime': stat.st_mtime, 'size': stat.st_size})
+        save_snapshot_manifest(manifest)
+        return select_source_columns(read_snapshot(entry['snapshot']), columns)
+
+    logging.info(f"Converting {file_path} to {SNAPSHOT_FORMAT} snapshot" + (f" ({len(columns)} columns)" if columns is not None else ""))
+    progress = st.progress(0.0, text=f"Reading {os.path.basename(file_path)}...")
+    def report_progress(rows_read, total_rows):
+        logging.info(f"Read {rows_read} of ~{total_rows} rows from {file_path}")
+        progress.progress(min(rows_read / total_rows, 1.0) if total_rows else 1.0,
+                          text=f"Reading {os.path.basename(file_path)}: {rows_read:,} of ~{max(total_rows, rows_read):,} rows")
+    try:
+        df = read_source_file(file_path, columns, dtype, on_chunk=report_progress)
+    finally:
+        progress.empty()
+    path_key = hashlib.sha256(file_path.encode('utf-8')).hexdigest()[:16]
+    extension = ".parquet" if SNAPSHOT_FORMAT == "parquet" else ".pkl"
+    snapshot_path = os.path.join(SNAPSHOT_DIR, f"{path_key}_{content_hash[:16]}{extension}")
+    preview_path = os.path.join(SNAPSHOT_DIR, f"{path_key}_{content_hash[:16]}_preview{extension}")
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        write_snapshot(df, snapshot_path)
+        if columns is not None:
+            write_snapshot(read_source_file(file_path, nrows=SOURCE_PREVIEW_ROWS), preview_path)
+    except Exception as e:
+        logging.warning(f"Could not write snapshot for {file_path}: {str(e)}")
+        return df
+
+    if entry:
+        for key in ['snapshot', 'preview']:
+            if entry.get(key) and entry[key] not in (snapshot_path, preview_path) and os.path.exists(entry[key]):
+                os.remove(entry[key])
+    manifest[file_path] = {
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'sha256': content_hash,
+        'snapshot': snapshot_path,
+        'preview': preview_path if columns is not None else None,
+        'columns': sorted(columns) if columns is not None else None
+    }
+    save_snapshot_manifest(manifest)
+    # Read back from the snapshot so the first run sees the same dtypes as later runs
+    return read_snapshot(snapshot_path)
+
+def get_dataset_dir(cache_key, name):
+    return os.path.join(SNAPSHOT_DIR, f"processed_{cache_key[:16]}_{name}")
+
+def get_dataset_schema_path(dataset_dir):
+    extension = ".parquet" if SNAPSHOT_FORMAT == "parquet" else ".pkl"
+    return os.path.join(dataset_dir, f"_schema{extension}")
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def write_dataset(df, dataset_dir, date_col, base_dir=None):
+    # df must be sorted by date_col. With base_dir, untouched partitions are linked from it
+    # and only months with new rows are rewritten.
+    extension = ".parquet" if SNAPSHOT_FORMAT == "parquet" else ".pkl"
+    tmp_dir = dataset_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    if base_dir:
+        shutil.copytree(base_dir, tmp_dir, copy_function=link_or_copy)
+    else:
+        os.makedirs(tmp_dir)
+        write_snapshot(df.iloc[0:0], get_dataset_schema_path(tmp_dir))
+    null_key = f"year={DATASET_NULL_PARTITION}/month={DATASET_NULL_PARTITION}"
+    keys = df[date_col].dt.strftime('year=%Y/month=%m').fillna(null_key)
+    for key, part in df.groupby(keys, sort=False):
+        partition_dir = os.path.join(tmp_dir, *key.split('/'))
+        partition_path = os.path.join(partition_dir, f"part-0{extension}")
+        if os.path.exists(partition_path):
+            part = sort_by_date(concat_frames([read_snapshot(partition_path), part]), date_col)
+        os.makedirs(partition_dir, exist_ok=True)
+        write_snapshot(part.reset_index(drop=True), partition_path)
+    # Swapped in whole so readers never see a partially written dataset
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+    os.replace(tmp_dir, dataset_dir)
+
+def list_dataset_partitions(dataset_dir):
+    # [(first day of the partition's month, path)] in date order; undated rows come last with None
+    partitions = []
+    for path in glob.glob(os.path.join(glob.escape(dataset_dir), 'year=*', 'month=*', 'part-0.*')):
+        year = os.path.basename(os.path.dirname(os.path.dirname(path))).split('=', 1)[1]
+        month = os.path.basename(os.path.dirname(path)).split('=', 1)[1]
+        start = None if year == DATASET_NULL_PARTITION else pd.Timestamp(int(year), int(month), 1)
+        partitions.append((start, path))
+    return sorted(partitions, key=lambda partition: (partition[0] is None, partition[0] or pd.Timestamp.min))
+
+def read_dataset(dataset_dir, columns=None, partitions=None):
+    if partitions is None:
+        partitions = list_dataset_partitions(dataset_dir)
+    if not partitions:
+        return read_snapshot(get_dataset_schema_path(dataset_dir), columns)
+    frames = [read_snapshot(path, columns) for _, path in partitions]
+    if len(frames) == 1:
+        return frames[0]
+    return concat_frames(frames)
+
+def concat_frames(frames):
+    # pd.concat falls back to object when categories differ between frames, e.g. partitions
+    # written by different ingests, so those columns are rebuilt from the union of categories
+    df = pd.concat(frames, ignore_index=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        columns = [frame[col] for frame in frames if col in frame.columns]
+        if len(columns) == len(frames) and all(isinstance(column.dtype, pd.CategoricalDtype) for column in columns):
+            df[col] = pd.api.types.union_categoricals(columns, sort_categories=True)
+    return df
+
+@st.cache_resource(show_spinner=False)
+def get_dataset_windows():
+    # Size of every window read_dataset_window has loaded; a window stops counting once
+    # st.cache_resource evicts it and no session holds it
+    return {'frames': [], 'lock': threading.Lock()}
+
+def track_dataset_window(df):
+    windows = get_dataset_windows()
+    with windows['lock']:
+        windows['frames'].append((weakref.ref(df), get_frame_memory(df)))
+    return df
+
+def get_dataset_window_memory():
+    windows = get_dataset_windows()
+    with windows['lock']:
+        windows['frames'] = [(ref, size) for ref, size in windows['frames'] if ref() is not None]
+        return len(windows['frames']), sum(size for _, size in windows['frames'])
+
+@st.cache_resource(show_spinner=False, max_entries=DATASET_WINDOW_CACHE_ENTRIES)
+def read_dataset_window(dataset_dir, date_col, start=None, end=None, include_end=False, columns=None):
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    if QUERY_BACKEND == "sqlite":
+        return track_dataset_window(query_dataset_window(dataset_dir, date_col, start, end, include_end, columns))
+    # Partition pruning: only months overlapping the window are read from disk
+    partitions = [
+        (partition_start, path) for partition_start, path in list_dataset_partitions(dataset_dir)
+        if partition_start is not None
+        and (start is None or partition_start + pd.offsets.MonthBegin(1) > start)
+        and (end is None or partition_start < end or (include_end and partition_start == end))
+    ]
+    df = read_dataset(dataset_dir, list(columns) if columns else None, partitions)
+    return track_dataset_window(slice_by_date(df, date_col, start, end, include_end))
+
+def count_dataset_rows(dataset_dir, date_col, by, start=None, end=None, equals=None, months=None):
+    # Row counts per `by` group (null keys dropped like pandas groupby) within an optional date
+    # window, column == value filters and (month, year) pairs; undated rows count only without a window
+    equals = equals or {}
+    if QUERY_BACKEND == "sqlite":
+        return query_dataset_counts(dataset_dir, date_col, by, start, end, equals, months)
+    columns = list(dict.fromkeys([date_col, *by, *equals, *(['Month', 'Year'] if months else [])]))
+    if start is None and end is None:
+        df = read_dataset(dataset_dir, columns)
+    else:
+        df = read_dataset_window(dataset_dir, date_col, start, end, columns=tuple(columns))
+    for col, value in equals.items():
+        df = df[df[col] == value]
+    if months:
+        df = df.merge(pd.DataFrame(months, columns=['Month', 'Year']), on=['Month', 'Year'], how='inner')
+    return df.groupby(by, observed=True).size().reset_index(name='Count')
+
+def get_query_table(dataset_dir):
+    # processed_<key>_<name> is table <name> of processed_<key>_query.sqlite
+    prefix, table = dataset_dir.rsplit('_', 1)
+    return prefix + "_query.sqlite", table
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def connect_query_database(db_path):
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+def build_query_database(db_path, tables):
+    # Loaded one partition at a time so memory stays flat regardless of history length
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        for table, frames, date_col in tables:
+            for df in frames:
+                df.to_sql(table, conn, if_exists='append', index=False)
+            columns = set(pd.read_sql_query(f"SELECT * FROM {table} LIMIT 0", conn).columns)
+            for index_columns in QUERY_INDEX_COLUMNS + ([[date_col]] if date_col else []):
+                if set(index_columns) <= columns:
+                    index_name = quote_identifier(f"{table}_{'_'.join(index_columns)}")
+                    conn.execute(f"CREATE INDEX {index_name} ON {table} ({', '.join(map(quote_identifier, index_columns))})")
+        conn.commit()
+    os.replace(tmp_path, db_path)
+
+# Builds the SQLite copy of the processed datasets once per cache key
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_query_database(cache_key, _dataset_dirs, _spoc_df):
+    db_path = get_query_table(_dataset_dirs[0])[0]
+    if not os.path.exists(db_path):
+        logging.info(f"Building query database for cache {cache_key[:16]}")
+        tables = [
+            (get_query_table(dataset_dir)[1], (read_snapshot(path) for _, path in list_dataset_partitions(dataset_dir)), date_col)
+            for dataset_dir, date_col in zip(_dataset_dirs, DATASET_DATE_COLUMNS.values())
+        ]
+        build_query_database(db_path, tables + [('spoc', [_spoc_df], None)])
+    return db_path
+
+def get_window_clauses(date_col, start=None, end=None, include_end=False):
+    # Dates are stored as ISO text, so string comparison follows time order
+    clauses, params = [f"{quote_identifier(date_col)} IS NOT NULL"], []
+    if start is not None:
+        clauses.append(f"{quote_identifier(date_col)} >= ?")
+        params.append(str(pd.Timestamp(start)))
+    if end is not None:
+        clauses.append(f"{quote_identifier(date_col)} {'<=' if include_end else '<'} ?")
+        params.append(str(pd.Timestamp(end)))
+    return clauses, params
+
+def query_dataset_window(dataset_dir, date_col, start, end, include_end, columns):
+    db_path, table = get_query_table(dataset_dir)
+    clauses, params = get_window_clauses(date_col, start, end, include_end)
+    select = ', '.join(map(quote_identifier, columns)) if columns else '*'
+    sql = f"SELECT {select} FROM {table} WHERE {' AND '.join(clauses)} ORDER BY {quote_identifier(date_col)}, rowid"
+    with closing(connect_query_database(db_path)) as conn:
+        df = pd.read_sql_query(sql, conn, params=params, parse_dates=[date_col])
+    if df.empty:
+        # Keep the stored dtypes for empty windows
+        return read_dataset(dataset_dir, list(columns) if columns else None, partitions=[])
+    return df
+
+def query_dataset_counts(dataset_dir, date_col, by, start, end, equals, months):
+    db_path, table = get_query_table(dataset_dir)
+    clauses, params = get_window_clauses(date_col, start, end) if start is not None or end is not None else ([], [])
+    for col, value in equals.items():
+        clauses.append(f"{quote_identifier(col)} = ?")
+        params.append(value)
+    if months:
+        clauses.append('(' + ' OR '.join(['("Month" = ? AND "Year" = ?)'] * len(months)) + ')')
+        params.extend(value for month, year in months for value in (month, int(year)))
+    clauses.extend(f"{quote_identifier(col)} IS NOT NULL" for col in by)
+    group = ', '.join(map(quote_identifier, by))
+    sql = f"SELECT {group}, COUNT(*) AS \"Count\" FROM {table} WHERE {' AND '.join(clauses)} GROUP BY {group} ORDER BY {group}"
+    with closing(connect_query_database(db_path)) as conn:
+        return pd.read_sql_query(sql, conn, params=params, parse_dates=[date_col] if date_col in by else None)
+
+def map_unique_values(series, func):
+    # Normalize each distinct value once and broadcast back through the factorized codes
+    codes, uniques = pd.factorize(series)
+    normalized = np.array([func(value) for value in uniques] + [np.nan], dtype=object)
+    return pd.Series(normalized[codes], index=series.index, name=series.name)
+
+def normalize_name_value(value):
+    return str(value).strip().title()
+
+def normalize_state_value(value):
+    value = str(value).strip().title()
+    if value == 'Pondicherry':
+        value = 'Puducherry'
+    return STATE_MAPPING.get(value.lower(), value)
 
 def standardize_state_names(df, state_col='Store State'):
     if state_col in df.columns:
-        df[state_col] = df[state_col].str.strip().str.title()
-        df[state_col] = df[state_col].replace({
-            'Pondicherry': 'Puducherry',
-            'Puducherry': 'Puducherry'
-        })
-        df[state_col] = df[state_col].map(lambda x: STATE_MAPPING.get(x.lower(), x) if pd.notna(x) else x)
+        df[state_col] = map_unique_values(df[state_col], normalize_state_value)
     return df
 
 def find_similar_columns(df_columns, expected_col):
@@ -138,9 +758,7 @@ def validate_and_map_columns(df, required_columns, df_name):
         
         st.session_state.column_mappings[df_name] = column_mapping
     
-    rename_dict = {v: k for k, v in column_mapping.items() if v and v != "None"}
-    if rename_dict:
-        df = df.rename(columns=rename_dict)
+    df = apply_column_mapping(df, column_mapping, df_name)
     
     critical_cols = ['Store Name']
     if df_name == "SPOC":
@@ -150,13 +768,18 @@ def validate_and_map_columns(df, required_columns, df_name):
         st.error(f"Critical columns missing in {df_name} after mapping: {', '.join(missing_critical)}.")
         return None, column_mapping
     
-    if df_name == "Cashify" and 'Spoc Name' not in df.columns and ' Partner Name' in df.columns:
-        df['Spoc Name'] = df[' Partner Name']
-
     logging.info(f"{df_name} Columns After Mapping: {', '.join(df.columns.tolist())}")
     
     return df, column_mapping
 
+def apply_column_mapping(df, column_mapping, df_name):
+    rename_dict = {v: k for k, v in column_mapping.items() if v and v != "None"}
+    if rename_dict:
+        df = df.rename(columns=rename_dict)
+    if df_name == "Cashify" and 'Spoc Name' not in df.columns and ' Partner Name' in df.columns:
+        df = df.assign(**{'Spoc Name': df[' Partner Name']})
+    return df
+
 def standardize_month(df, month_col='Month'):
     if month_col not in df.columns:
         logging.warning(f"'{month_col}' column not found in dataset. Skipping month standardization.")
@@ -177,13 +800,13 @@ def standardize_month(df, month_col='Month'):
         except (ValueError, TypeError):
             return month_mapping.get(x_str, x_str.title())
     
-    df[month_col] = df[month_col].apply(parse_month)
+    df[month_col] = map_unique_values(df[month_col], parse_month)
     return df
 
 def standardize_names(df, store_col='Store Name', spoc_col='Spoc Name', state_col='Store State', product_col=None):
     for col in [store_col, spoc_col, state_col, product_col]:
         if col and col in df.columns:
-            df[col] = df[col].apply(lambda x: str(x).strip().title() if pd.notna(x) else x)
+            df[col] = map_unique_values(df[col], normalize_name_value)
     df = standardize_state_names(df, state_col)
     return df
 
@@ -200,9 +823,7 @@ def map_store_names_and_states(df, spoc_data, is_maple=True):
     store_mapping = spoc_data[required_spoc_cols + optional_spoc_cols].drop_duplicates()
     
     for col in required_spoc_cols + optional_spoc_cols:
-        store_mapping[col] = store_mapping[col].apply(lambda x: str(x).strip().title() if pd.notna(x) else x)
-        if col == 'Store State':
-            store_mapping[col] = store_mapping[col].map(lambda x: STATE_MAPPING.get(x.lower(), x) if pd.notna(x) else x)
+        store_mapping[col] = map_unique_values(store_mapping[col], normalize_state_value if col == 'Store State' else normalize_name_value)
     
     if 'Store Name' not in df.columns:
         st.error(f"Store Name column missing in {'Maple' if is_maple else 'Cashify'} dataset.")
@@ -210,9 +831,15 @@ def map_store_names_and_states(df, spoc_data, is_maple=True):
         df['Zone'] = 'Unknown'
         return df
     
-    df['Store Name'] = df['Store Name'].apply(lambda x: str(x).strip().title() if pd.notna(x) else x)
+    df['Store Name'] = map_unique_values(df['Store Name'], normalize_name_value)
     
-    unmatched_stores = set(df['Store Name'].dropna()) - set(store_mapping['Store Name'].dropna())
+    store_names = set(store_mapping['Store Name'].dropna().unique())
+    unmatched_stores = set(df['Store Name'].dropna().unique()) - store_names
+    if unmatched_stores:
+        aliases = reconcile_store_names(sorted(unmatched_stores), store_names)
+        if aliases:
+            df['Store Name'] = df['Store Name'].map(aliases).fillna(df['Store Name'])
+            unmatched_stores -= set(aliases)
     if unmatched_stores:
         logging.warning(f"Unmatched Store Names in {'Maple' if is_maple else 'Cashify'}: {', '.join(unmatched_stores)}")
     
@@ -232,8 +859,13 @@ def map_store_names_and_states(df, spoc_data, is_maple=True):
 
     return df
 
-def filter_by_date(df, year, month, day=None, is_maple=True):
+def filter_by_date(dataset_dir, year, month, day=None, is_maple=True):
     date_column = 'Created Date' if is_maple else 'Order Date'
+    try:
+        df = read_dataset_window(dataset_dir, date_column, *get_date_window(year, month, day))
+    except Exception as e:
+        st.error(f"Error reading {'Maple' if is_maple else 'Cashify'} data: {str(e)}")
+        return pd.DataFrame()
     if date_column not in df.columns:
         st.error(f"Column '{date_column}' not found in {'Maple' if is_maple else 'Cashify'} data.")
         return pd.DataFrame()
@@ -250,31 +882,87 @@ def filter_by_date(df, year, month, day=None, is_maple=True):
             st.error(f"Missing required columns in {'Maple' if is_maple else 'Cashify'} data: {', '.join(missing_cols)}")
             return pd.DataFrame()
         
-        df[date_column] = pd.to_datetime(df[date_column], errors='coerce', dayfirst=True)
-        df = df[df['Year'] == year]
-        if month and month != "All":
-            df = df[df['Month'] == month]
-        if day and day != "All":
-            df = df[df[date_column].dt.day == day]
         return df
     except Exception as e:
         st.error(f"Error processing dates in {'Maple' if is_maple else 'Cashify'} data: {str(e)}")
         return pd.DataFrame()
 
+def sort_by_date(df, date_col):
+    # Frames stay ordered by their parsed date so every date window is a searchsorted slice
+    return df.sort_values(date_col, kind='stable', na_position='last').reset_index(drop=True)
+
+def slice_by_date(df, date_col, start=None, end=None, include_end=False):
+    # df must be sorted by date_col; NaT rows sort last and fall outside every window
+    dates = df[date_col].values
+    lo = dates.searchsorted(np.datetime64(pd.Timestamp(start)), 'left') if start is not None else 0
+    if end is not None:
+        hi = dates.searchsorted(np.datetime64(pd.Timestamp(end)), 'right' if include_end else 'left')
+    else:
+        hi = dates.searchsorted(np.datetime64('NaT'), 'left')
+    return df.iloc[lo:hi]
+
+def get_date_window(year, month=None, day=None):
+    # Half-open [start, end) window for a year, a month or a single day
+    if not month or month == "All":
+        start = pd.Timestamp(int(year), 1, 1)
+        return start, start + pd.DateOffset(years=1)
+    start = pd.Timestamp(int(year), list(calendar.month_name).index(month), 1)
+    if day and day != "All":
+        start = start.replace(day=int(day))
+        return start, start + pd.Timedelta(days=1)
+    return start, start + pd.offsets.MonthBegin(1)
+
 def calculate_market_share(spoc_achievement, total_trade_ins):
+    if isinstance(total_trade_ins, pd.Series):
+        return (spoc_achievement / total_trade_ins * 100).where(total_trade_ins > 0, 0)
     return (spoc_achievement / total_trade_ins * 100) if total_trade_ins > 0 else 0
 
 def calculate_target_achievement(spoc_achievement, target):
+    if isinstance(target, pd.Series):
+        return (spoc_achievement / target * 100).where(target > 0, 0)
     return (spoc_achievement / target * 100) if target > 0 else 0
 
-def get_weekoffs(year, month, weekoff_day):
-    if weekoff_day == "Vacant" or pd.isna(weekoff_day):
-        return []
-    month_num = {"January": 1, "February": 2, "March": 3, "April": 4, "May": 5, "June": 6,
-                 "July": 7, "August": 8, "September": 9, "October": 10, "November": 11, "December": 12}
-    first_day = date(year, month_num[month], 1)
-    last_day = (first_day + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-    return [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1) if (first_day + timedelta(days=i)).strftime('%A') == weekoff_day]
+def build_weekoff_calendar(spoc_df, start, end):
+    # One row per SPOC with a weekoff day, store and calendar day of the [start, end) window,
+    # the same window the Cashify orders were filtered by
+    if not {'Spoc Name', 'Store Name', 'Weekoff Day'}.issubset(spoc_df.columns):
+        return pd.DataFrame(columns=['Spoc Name', 'Store Name', 'Date', 'Is Weekoff'])
+    days = pd.DataFrame({'Date': pd.date_range(start, end, inclusive='left')})
+    spocs = spoc_df.loc[spoc_df['Spoc Name'].notna(), ['Spoc Name', 'Store Name', 'Weekoff Day']].drop_duplicates(['Spoc Name', 'Store Name'], keep='last')
+    # "Vacant" and missing weekoff days never match a day name
+    spocs = spocs[spocs['Weekoff Day'].astype(str).str.strip().isin(list(calendar.day_name))]
+    weekoff_calendar = spocs.merge(days, how='cross')
+    weekoff_calendar['Is Weekoff'] = weekoff_calendar['Date'].dt.day_name() == weekoff_calendar['Weekoff Day'].astype(str).str.strip()
+    return weekoff_calendar.drop(columns=['Weekoff Day'])
+
+def compute_weekoff_losses(weekoff_calendar, cashify_orders):
+    # Cashify orders per store and day joined onto every SPOC's calendar in one pass
+    orders = cashify_orders[cashify_orders['Order Date'].notna()]
+    daily_orders = orders.groupby(
+        [orders['Store Name'], orders['Order Date'].dt.normalize().rename('Date'), orders['Product Category']],
+        observed=True
+    ).size().reset_index(name='Count')
+    losses = weekoff_calendar.merge(daily_orders, on=['Store Name', 'Date'], how='inner')
+    return losses.groupby(['Spoc Name', 'Is Weekoff', 'Store Name', 'Product Category'], sort=False, observed=True)['Count'].sum().reset_index()
+
+def calculate_loss_rate(losses, days):
+    return (losses / days.where(days > 0)).fillna(0).round(2)
+
+def summarize_weekoff_losses(weekoff_calendar, weekoff_losses):
+    keys = ['Spoc Name', 'Store Name']
+    days = weekoff_calendar.groupby(keys + ['Is Weekoff'], observed=True)['Date'].nunique().unstack(fill_value=0)
+    days = days.reindex(columns=[True, False], fill_value=0)
+    losses = weekoff_losses.groupby(keys + ['Is Weekoff'], observed=True)['Count'].sum().unstack(fill_value=0)
+    losses = losses.reindex(index=days.index, columns=[True, False], fill_value=0)
+    summary = pd.DataFrame({
+        'Weekoff Days': days[True],
+        'Weekoff Day Losses': losses[True],
+        'Working Day Losses': losses[False]
+    })
+    summary['Losses per Weekoff Day'] = calculate_loss_rate(summary['Weekoff Day Losses'], days[True])
+    summary['Losses per Working Day'] = calculate_loss_rate(summary['Working Day Losses'], days[False])
+    summary = summary[summary['Weekoff Days'] > 0].reset_index()
+    return summary.sort_values('Weekoff Day Losses', ascending=False)
 
 def create_excel_buffer(df, sheet_name):
     buffer = io.BytesIO()
@@ -343,38 +1031,637 @@ def get_last_n_weeks(selected_month, selected_year, spoc, n=4):
         week_num += 1
     return weeks[-n:] if n <= len(weeks) else weeks
 
-def categorize_product_type(product_type):
-    if pd.isna(product_type):
-        return 'Other'
-    
-    product_type = str(product_type).lower().strip()
-    
-    if any(x in product_type for x in ['mobile', 'phone']):
-        return 'Mobile Phone'
-    elif 'laptop' in product_type:
-        return 'Laptop'
-    elif 'tablet' in product_type:
-        return 'Tablet'
-    elif any(x in product_type for x in ['smartwatch', 'watch']):
-        if 'apple' in product_type:
-            return 'SmartWatch (Apple)'
-        return 'SmartWatch (Android)'
-    return 'Other'
+def categorize_product_types(product_types, rules):
+    # The rules run once over the distinct product types; rows get their category through
+    # the factorized codes as a categorical
+    codes, uniques = pd.factorize(product_types)
+    text = pd.Series(uniques, dtype=object).astype(str).str.lower().str.strip()
+    categories = pd.Series('Other', index=text.index, dtype=object)
+    matched = pd.Series(False, index=text.index)
+    for keyword, also_keyword, category in rules:
+        hit = ~matched & text.str.contains(keyword, regex=False)
+        if also_keyword:
+            hit &= text.str.contains(also_keyword, regex=False)
+        categories[hit] = category
+        matched |= hit
+    lookup = np.append(categories.to_numpy(dtype=object), 'Other')
+    return pd.Series(pd.Categorical(lookup[codes]), index=product_types.index, name='Product Type Category')
 
 def generate_spoc_id(spoc_name, store_name, store_state):
-    spoc_key = f"{spoc_name}_{store_state}"
-    if spoc_key not in st.session_state.spoc_ids:
-        st.session_state.spoc_ids[spoc_key] = str(uuid.uuid4())
-    return st.session_state.spoc_ids[spoc_key]
+    # Deterministic so every session and every rebuild agrees on the same ID
+    return str(uuid.uuid5(SPOC_ID_NAMESPACE, f"{spoc_name}_{store_state}"))
+
+def get_spoc_registry_connection():
+    conn = sqlite3.connect(SPOC_REGISTRY_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS spoc_registry (
+            spoc_key TEXT PRIMARY KEY,
+            spoc_id TEXT NOT NULL,
+            spoc_name TEXT,
+            store_name TEXT,
+            store_state TEXT,
+            updated_at TEXT
+        )
+    """)
+    return conn
+
+def sync_spoc_registry(spoc_pairs):
+    keys = spoc_pairs['Spoc Name'].astype(str) + '_' + spoc_pairs['Store State'].astype(str)
+    spoc_ids = {}
+    try:
+        with closing(get_spoc_registry_connection()) as conn, conn:
+            spoc_ids = dict(conn.execute("SELECT spoc_key, spoc_id FROM spoc_registry").fetchall())
+            now = datetime.now().isoformat(timespec='seconds')
+            new_rows = [
+                (key, generate_spoc_id(spoc_name, store_name, store_state), spoc_name, store_name, store_state, now)
+                for key, spoc_name, store_name, store_state in zip(keys, spoc_pairs['Spoc Name'], spoc_pairs['Store Name'], spoc_pairs['Store State'])
+                if key not in spoc_ids
+            ]
+            conn.executemany("INSERT OR IGNORE INTO spoc_registry VALUES (?, ?, ?, ?, ?, ?)", new_rows)
+            spoc_ids.update({row[0]: row[1] for row in new_rows})
+            if new_rows:
+                logging.info(f"Registered {len(new_rows)} new SPOC IDs")
+    except sqlite3.Error as e:
+        logging.warning(f"SPOC registry unavailable, using derived IDs only: {str(e)}")
+    return keys.map(lambda key: spoc_ids.get(key) or str(uuid.uuid5(SPOC_ID_NAMESPACE, key)))
+
+def assign_spoc_ids(df):
+    id_cols = ['Spoc Name', 'Store Name', 'Store State']
+    if not all(col in df.columns for col in id_cols):
+        return df
+    valid = df[id_cols].notna().all(axis=1)
+    spoc_pairs = df.loc[valid, id_cols].groupby(['Spoc Name', 'Store State'], sort=False, observed=True)['Store Name'].first().reset_index()
+    spoc_pairs['SPOC_ID'] = sync_spoc_registry(spoc_pairs).values
+    df = df.drop(columns=['SPOC_ID'], errors='ignore').merge(
+        spoc_pairs[['Spoc Name', 'Store State', 'SPOC_ID']],
+        on=['Spoc Name', 'Store State'],
+        how='left'
+    )
+    df['SPOC_ID'] = df['SPOC_ID'].where(valid.values, 'Unknown')
+    return df
 
 def update_spoc_id(spoc_name, old_store, new_store, store_state):
-    old_key = f"{spoc_name}_{store_state}"
-    new_key = f"{spoc_name}_{store_state}"
-    if old_key in st.session_state.spoc_ids:
-        spoc_id = st.session_state.spoc_ids[old_key]
-        st.session_state.spoc_ids[new_key] = spoc_id
-        if old_key != new_key:
-            del st.session_state.spoc_ids[old_key]
+    # The key is name + state, so a store transfer keeps the SPOC's ID
+    spoc_key = f"{spoc_name}_{store_state}"
+    with closing(get_spoc_registry_connection()) as conn, conn:
+        row = conn.execute("SELECT spoc_id FROM spoc_registry WHERE spoc_key = ?", (spoc_key,)).fetchone()
+        spoc_id = row[0] if row else generate_spoc_id(spoc_name, new_store, store_state)
+        conn.execute(
+            "INSERT OR REPLACE INTO spoc_registry VALUES (?, ?, ?, ?, ?, ?)",
+            (spoc_key, spoc_id, spoc_name, new_store, store_state, datetime.now().isoformat(timespec='seconds'))
+        )
+    logging.info(f"SPOC {spoc_name} moved from {old_store} to {new_store}, keeping ID {spoc_id}")
+    return spoc_id
+
+def get_store_match_grams(name):
+    # Character n-grams of the name without spaces or punctuation, plus its whole words
+    words = re.sub(r'[^a-z0-9]+', ' ', str(name).lower()).split()
+    compact = ''.join(words)
+    grams = {compact[i:i + STORE_MATCH_NGRAM] for i in range(max(len(compact) - STORE_MATCH_NGRAM + 1, 1))}
+    grams.update(f"#{word}" for word in words)
+    return grams
+
+def build_store_match_index(store_names):
+    index = {}
+    sizes = []
+    for i, store_name in enumerate(store_names):
+        grams = get_store_match_grams(store_name)
+        sizes.append(len(grams))
+        for gram in grams:
+            index.setdefault(gram, []).append(i)
+    return index, sizes
+
+def match_store_names(names, store_names):
+    # Best SPOC master store per name by Dice similarity of n-gram sets; only stores sharing
+    # at least one n-gram with the name are scored
+    index, sizes = build_store_match_index(store_names)
+    matches = []
+    for name in names:
+        grams = get_store_match_grams(name)
+        shared = Counter()
+        for gram in grams:
+            shared.update(index.get(gram, ()))
+        if not shared:
+            continue
+        scores = {i: 2 * count / (len(grams) + sizes[i]) for i, count in shared.items()}
+        best = max(scores, key=lambda i: (scores[i], -i))
+        matches.append((name, store_names[best], round(scores[best], 3)))
+    return pd.DataFrame(matches, columns=['Alias', 'Store Name', 'Score'])
+
+def get_store_alias_connection():
+    conn = sqlite3.connect(SPOC_REGISTRY_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS store_aliases (
+            alias TEXT PRIMARY KEY,
+            store_name TEXT NOT NULL,
+            score REAL,
+            status TEXT NOT NULL,
+            updated_at TEXT
+        )
+    """)
+    return conn
+
+def load_store_aliases(statuses=None):
+    query = "SELECT alias, store_name, score, status FROM store_aliases"
+    try:
+        with closing(get_store_alias_connection()) as conn:
+            if statuses:
+                placeholders = ', '.join('?' * len(statuses))
+                return pd.read_sql_query(query + f" WHERE status IN ({placeholders}) ORDER BY alias", conn, params=tuple(statuses))
+            return pd.read_sql_query(query + " ORDER BY alias", conn)
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        logging.warning(f"Store alias table unavailable: {str(e)}")
+        return pd.DataFrame(columns=['alias', 'store_name', 'score', 'status'])
+
+def save_store_aliases(rows):
+    # rows: [(alias, store_name, score, status)]
+    now = datetime.now().isoformat(timespec='seconds')
+    try:
+        with closing(get_store_alias_connection()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO store_aliases VALUES (?, ?, ?, ?, ?)", [(*row, now) for row in rows])
+    except sqlite3.Error as e:
+        logging.warning(f"Could not save store aliases: {str(e)}")
+
+def get_store_code(name):
+    words = re.sub(r'[^a-z0-9]+', ' ', str(name).lower()).split()
+    return words[-1] if words else ''
+
+def reconcile_store_names(names, store_names):
+    # Returns {name: SPOC master store} for the names with an accepted or auto-accepted alias,
+    # proposing matches for names seen for the first time
+    aliases = load_store_aliases()
+    aliases = aliases[aliases['store_name'].isin(set(store_names))]
+    # Auto matches saved before the store code check go back to review
+    stale = (aliases['status'] == 'auto') & (aliases['alias'].map(get_store_code) != aliases['store_name'].map(get_store_code))
+    if stale.any():
+        aliases.loc[stale, 'status'] = 'proposed'
+        save_store_aliases(aliases.loc[stale, ['alias', 'store_name', 'score', 'status']].itertuples(index=False, name=None))
+        logging.info(f"Store reconciliation: {stale.sum()} automatic matches with a different store code returned to review")
+    resolved = dict(zip(
+        aliases.loc[aliases['status'].isin(['accepted', 'auto']), 'alias'],
+        aliases.loc[aliases['status'].isin(['accepted', 'auto']), 'store_name']
+    ))
+    known = set(aliases['alias'])
+    proposals = match_store_names([name for name in names if name not in known], sorted(store_names))
+    proposals = proposals[proposals['Score'] >= STORE_ALIAS_MIN_SCORE]
+    if not proposals.empty:
+        # A different store code means a different branch, however close the rest of the name is
+        same_code = proposals['Alias'].map(get_store_code) == proposals['Store Name'].map(get_store_code)
+        proposals['Status'] = np.where((proposals['Score'] >= STORE_ALIAS_AUTO_ACCEPT) & same_code, 'auto', 'proposed')
+        save_store_aliases(proposals[['Alias', 'Store Name', 'Score', 'Status']].itertuples(index=False, name=None))
+        auto = proposals[proposals['Status'] == 'auto']
+        resolved.update(zip(auto['Alias'], auto['Store Name']))
+        logging.info(f"Store reconciliation: {len(auto)} names matched automatically, {len(proposals) - len(auto)} proposed for review")
+    return {name: resolved[name] for name in names if name in resolved}
+
+def get_reviewed_store_aliases():
+    # Automatic matches follow from the workbooks and SPOC master already in the cache keys and
+    # are saved during the build; only reviewer decisions change which aliases a build applies
+    reviewed = load_store_aliases(['accepted', 'rejected'])
+    return [list(row) for row in zip(reviewed['alias'], reviewed['store_name'], reviewed['status'])]
+
+def get_product_category_connection():
+    conn = sqlite3.connect(SPOC_REGISTRY_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS product_category_rules (
+            position INTEGER PRIMARY KEY,
+            keyword TEXT NOT NULL,
+            also_keyword TEXT NOT NULL DEFAULT '',
+            category TEXT NOT NULL,
+            updated_at TEXT
+        )
+    """)
+    return conn
+
+def save_product_category_rules(rules):
+    # rules: [(keyword, also_keyword, category)] in match order; replaces the whole table
+    now = datetime.now().isoformat(timespec='seconds')
+    try:
+        with closing(get_product_category_connection()) as conn, conn:
+            conn.execute("DELETE FROM product_category_rules")
+            conn.executemany(
+                "INSERT INTO product_category_rules VALUES (?, ?, ?, ?, ?)",
+                [(position, *rule, now) for position, rule in enumerate(rules)]
+            )
+    except sqlite3.Error as e:
+        logging.warning(f"Could not save product category rules: {str(e)}")
+
+def get_product_category_rules():
+    # Rule keywords are matched against lower-cased product types
+    try:
+        with closing(get_product_category_connection()) as conn:
+            rules = conn.execute(
+                "SELECT keyword, also_keyword, category FROM product_category_rules ORDER BY position"
+            ).fetchall()
+    except sqlite3.Error as e:
+        logging.warning(f"Product category rules unavailable, using defaults: {str(e)}")
+        rules = []
+    if not rules:
+        return [list(rule) for rule in PRODUCT_CATEGORY_RULES]
+    return [[keyword.lower(), (also_keyword or '').lower(), category] for keyword, also_keyword, category in rules]
+
+def build_tradein_cube(maple_df, cashify_df):
+    parts = []
+    for source, df, date_col, amount_col in [
+        ('Maple', maple_df, 'Created Date', 'Maple Bid'),
+        ('Cashify', cashify_df, 'Order Date', 'Initial Device Amount')
+    ]:
+        part = pd.DataFrame(index=df.index)
+        part['Source'] = source
+        part['Date'] = pd.to_datetime(df[date_col], errors='coerce').dt.normalize() if date_col in df.columns else pd.NaT
+        for col in CUBE_DIMENSIONS[2:-1]:
+            part[col] = df[col] if col in df.columns else np.nan
+        part['Product Category'] = df['Product Type Category'] if 'Product Type Category' in df.columns else 'Other'
+        part['Amount'] = pd.to_numeric(df[amount_col], errors='coerce') if amount_col in df.columns else np.nan
+        parts.append(part)
+    rows = pd.concat(parts, ignore_index=True)
+    cube = rows.groupby(CUBE_DIMENSIONS, dropna=False, sort=False, observed=True).agg(
+        Count=('Source', 'size'),
+        Amount=('Amount', 'sum')
+    ).reset_index()
+    return sort_by_date(cube, 'Date')
+
+def merge_tradein_cubes(cube, delta_cube):
+    merged = pd.concat([cube, delta_cube], ignore_index=True).groupby(CUBE_DIMENSIONS, dropna=False, sort=False, observed=True).agg(
+        Count=('Count', 'sum'),
+        Amount=('Amount', 'sum')
+    ).reset_index()
+    return sort_by_date(merged, 'Date')
+
+def parse_target_column(column):
+    # "<Month> Target" or "<Month> <Year> Target"; returns (month, year or None)
+    parts = str(column).split()
+    if len(parts) < 2 or parts[-1] != 'Target' or parts[0] not in calendar.month_name[1:]:
+        return None
+    if len(parts) == 2:
+        return parts[0], None
+    if len(parts) == 3 and parts[1].isdigit():
+        return parts[0], int(parts[1])
+    return None
+
+def build_target_table(spoc_df, years):
+    target_columns = {col: parse_target_column(col) for col in spoc_df.columns}
+    target_columns = {col: parsed for col, parsed in target_columns.items() if parsed}
+    if not target_columns or 'SPOC_ID' not in spoc_df.columns:
+        return pd.DataFrame(columns=['SPOC_ID', 'Year', 'Month', 'Target'])
+
+    targets = spoc_df.dropna(subset=['SPOC_ID']).melt(
+        id_vars='SPOC_ID', value_vars=list(target_columns), var_name='Target Column', value_name='Target'
+    )
+    targets['Month'] = targets['Target Column'].map({col: month for col, (month, _) in target_columns.items()})
+    targets['Year'] = targets['Target Column'].map({col: year for col, (_, year) in target_columns.items()})
+    # Month-only columns apply to every year; a dated column wins for its own year
+    undated = targets[targets['Year'].isna()].drop(columns=['Year']).merge(pd.DataFrame({'Year': years}), how='cross')
+    targets = pd.concat([targets[targets['Year'].notna()], undated], ignore_index=True)
+    targets = targets.drop_duplicates(['SPOC_ID', 'Year', 'Month'], keep='first')
+    targets['Year'] = targets['Year'].astype(int)
+    targets['Target'] = pd.to_numeric(targets['Target'], errors='coerce').fillna(0)
+    return targets[['SPOC_ID', 'Year', 'Month', 'Target']].reset_index(drop=True)
+
+def build_target_achievement(achieved, spoc_df, years):
+    # achieved holds Maple trade-in counts per SPOC_ID, Year and Month
+    targets = build_target_table(spoc_df, years)
+    achieved = achieved.assign(Year=achieved['Year'].astype(int)).rename(columns={'Count': 'Achieved'})
+    achievement = targets.merge(achieved, on=['SPOC_ID', 'Year', 'Month'], how='left').fillna({'Achieved': 0})
+    achievement['Achieved'] = achievement['Achieved'].astype(int)
+    achievement['% Achieved'] = calculate_target_achievement(achievement['Achieved'], achievement['Target'])
+    return achievement
+
+# Query with filter_cube_months for any month list
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_target_achievement(cache_key, _maple_dataset, _spoc_df):
+    achieved = count_dataset_rows(_maple_dataset, 'Created Date', ['SPOC_ID', 'Year', 'Month'])
+    years = sorted(set(achieved['Year'].astype(int)) | {date.today().year})
+    achievement = build_target_achievement(achieved, _spoc_df, years)
+    logging.info(f"Built target table with {len(achievement)} SPOC-month rows for years {years}")
+    return achievement
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_tradein_cube(cache_key):
+    # Built and persisted alongside the processed datasets
+    cube = read_snapshot(get_processed_paths(cache_key, ['cube'])[0])
+    logging.info(f"Loaded trade-in cube with {len(cube)} cells from cache {cache_key[:16]}")
+    return cube
+
+def compress_price_sketch(means, weights):
+    # t-digest style: sorted centroids merge along an arcsine scale, so the tails keep finer
+    # centroids than the middle; at most PRICE_SKETCH_SIZE centroids survive
+    order = np.argsort(means, kind='stable')
+    means, weights = means[order], weights[order]
+    quantiles = (np.cumsum(weights) - weights / 2) / weights.sum()
+    buckets = np.floor(PRICE_SKETCH_SIZE * (np.arcsin(2 * quantiles - 1) / np.pi + 0.5))
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    bucket_weights = np.add.reduceat(weights, starts)
+    return np.add.reduceat(means * weights, starts) / bucket_weights, bucket_weights
+
+def estimate_price_quantiles(means, weights):
+    # Centroids sit at the middle of their weight; with single-value centroids this is the
+    # same linear interpolation as np.quantile
+    positions = np.cumsum(weights) - weights / 2
+    return {name: float(np.interp(0.5 + q * (weights.sum() - 1), positions, means)) for name, q in PRICE_QUANTILES.items()}
+
+def get_price_rows(name, df):
+    amount_col = DATASET_AMOUNT_COLUMNS[name]
+    rows = pd.DataFrame({'Source': 'Maple' if name == 'maple' else 'Cashify'}, index=df.index)
+    for col in ['Year', 'Month', 'Store State', 'Product Type']:
+        rows[col] = (df[col] if col == 'Year' else df[col].astype(object)) if col in df.columns else np.nan
+    rows['Product Category'] = df['Product Type Category'].astype(object) if 'Product Type Category' in df.columns else 'Other'
+    rows['Amount'] = pd.to_numeric(df[amount_col], errors='coerce') if amount_col in df.columns else np.nan
+    return rows
+
+def build_price_summary(rows):
+    columns = PRICE_SUMMARY_DIMENSIONS + ['Count', 'Sum'] + list(PRICE_QUANTILES) + ['Sketch Means', 'Sketch Weights']
+    rows = rows.dropna(subset=['Amount'])
+    if rows.empty:
+        return pd.DataFrame(columns=columns)
+    grouped = rows.groupby(PRICE_SUMMARY_DIMENSIONS, dropna=False, sort=True)['Amount']
+    summary = grouped.agg(Count='size', Sum='sum').reset_index()
+    quantiles, means, weights = [], [], []
+    for _, amounts in grouped:
+        amounts = amounts.to_numpy(dtype=float)
+        quantiles.append(np.quantile(amounts, list(PRICE_QUANTILES.values())))
+        sketch_means, sketch_weights = compress_price_sketch(amounts, np.ones(len(amounts)))
+        means.append(sketch_means)
+        weights.append(sketch_weights)
+    summary[list(PRICE_QUANTILES)] = np.array(quantiles)
+    summary['Sketch Means'] = means
+    summary['Sketch Weights'] = weights
+    return summary[columns]
+
+def merge_price_sketches(cells):
+    return compress_price_sketch(np.concatenate(cells['Sketch Means'].tolist()), np.concatenate(cells['Sketch Weights'].tolist()))
+
+def merge_price_summaries(price_summary, delta):
+    # Cells present on both sides add their counts and sums and merge their sketches; their
+    # quantiles are then read from the merged sketch
+    if price_summary.empty or delta.empty:
+        return delta if price_summary.empty else price_summary
+    merged = pd.concat([price_summary, delta], ignore_index=True)
+    touched = merged.duplicated(PRICE_SUMMARY_DIMENSIONS, keep=False)
+    if not touched.any():
+        return merged
+    cells = []
+    for key, group in merged[touched].groupby(PRICE_SUMMARY_DIMENSIONS, dropna=False, sort=False):
+        means, weights = merge_price_sketches(group)
+        cells.append({
+            **dict(zip(PRICE_SUMMARY_DIMENSIONS, key)), 'Count': group['Count'].sum(), 'Sum': group['Sum'].sum(),
+            **estimate_price_quantiles(means, weights), 'Sketch Means': means, 'Sketch Weights': weights
+        })
+    return pd.concat([merged[~touched], pd.DataFrame(cells, columns=merged.columns)], ignore_index=True)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_price_summary(cache_key):
+    price_summary = read_snapshot(get_processed_paths(cache_key, ['prices'])[0])
+    logging.info(f"Loaded price summary with {len(price_summary)} cells from cache {cache_key[:16]}")
+    return price_summary
+
+def summarize_price_cells(cells, keys):
+    # A group of one cell keeps its exact quantiles; larger groups (several months, states or
+    # program types) merge their sketches, so no query goes back to the rows
+    records = []
+    for key, group in cells.groupby(keys, sort=True):
+        if len(group) == 1:
+            quantiles = group.iloc[0][list(PRICE_QUANTILES)].astype(float).to_dict()
+        else:
+            quantiles = estimate_price_quantiles(*merge_price_sketches(group))
+        count = group['Count'].sum()
+        records.append({**dict(zip(keys, key)), 'Count': int(count), 'Mean': group['Sum'].sum() / count, **quantiles})
+    return pd.DataFrame(records, columns=keys + ['Count', 'Mean'] + list(PRICE_QUANTILES))
+
+def parse_device_name(name):
+    # "Samsung Galaxy S22 Plus 5G (8 GB/128 GB)" -> ('samsung', 's22 plus', 128)
+    text = str(name).lower().replace('+', ' plus ').replace('wi-fi', 'wifi')
+    sizes = [int(value) * (1024 if unit == 'tb' else 1) for value, unit in re.findall(r'(\d+)\s*(gb|tb)\b', text)]
+    text = re.sub(r'\d+\s*(gb|tb)\b', ' ', text)
+    tokens = re.findall(r'[a-z0-9]+(?:\.[0-9]+)?', text)
+    brand = next((token for token in tokens if token in DEVICE_BRANDS), None)
+    if brand is None:
+        brand = next((DEVICE_BRAND_ALIASES[token] for token in tokens if token in DEVICE_BRAND_ALIASES), tokens[0] if tokens else 'unknown')
+    model = [token for token in dict.fromkeys(tokens) if token not in DEVICE_NOISE_TOKENS and token not in DEVICE_BRANDS and token != brand]
+    # The largest size is the storage; the smaller one in "(8 GB/128 GB)" is RAM
+    return brand, ' '.join(model), max(sizes) if sizes else None
+
+def build_device_catalog(names):
+    # One row per distinct device name; the model key sorts the model tokens so word order
+    # does not matter and every name of a model resolves through a single dict lookup
+    names = pd.Series(names).dropna().astype(str).drop_duplicates().sort_values(ignore_index=True)
+    parsed = [parse_device_name(name) for name in names]
+    catalog = pd.DataFrame({
+        'Device Name': names,
+        'Brand': [brand.title() for brand, _, _ in parsed],
+        'Model Key': [f"{brand} {' '.join(sorted(model.split()))}".strip() for brand, model, _ in parsed],
+        'Model': [f"{brand.title()} {model.title()}".strip() for brand, model, _ in parsed],
+        'Storage (GB)': pd.array([storage for _, _, storage in parsed], dtype='Int64')
+    })
+    # One display name per model key
+    catalog['Model'] = catalog.groupby('Model Key')['Model'].transform('first')
+    return catalog
+
+def get_device_names(frames):
+    names = [df[DEVICE_NAME_COLUMNS[name]].astype(object) for name, df in frames.items() if DEVICE_NAME_COLUMNS[name] in df.columns]
+    return pd.concat(names, ignore_index=True) if names else pd.Series(dtype=object)
+
+def update_device_catalog(catalog, names):
+    # Only names missing from the stored catalog are parsed
+    names = pd.Series(names, dtype=object).dropna().astype(str)
+    if catalog is None:
+        return build_device_catalog(names)
+    names = names[~names.isin(catalog['Device Name'])]
+    if names.empty:
+        return catalog
+    merged = pd.concat([catalog, build_device_catalog(names)], ignore_index=True).sort_values('Device Name', ignore_index=True)
+    # Each side already shows its first name per model; the first across both wins
+    merged['Model'] = merged.groupby('Model Key')['Model'].transform('first')
+    return merged
+
+def build_model_prices(frames, catalog):
+    # Priced trade-ins and their amount per source, store state and model
+    parts = []
+    for name, df in frames.items():
+        name_col, amount_col = DEVICE_NAME_COLUMNS[name], DATASET_AMOUNT_COLUMNS[name]
+        if name_col not in df.columns or amount_col not in df.columns:
+            continue
+        parts.append(pd.DataFrame({
+            'Source': 'Maple' if name == 'maple' else 'Cashify',
+            'Store State': df['Store State'].astype(object) if 'Store State' in df.columns else np.nan,
+            'Device Name': df[name_col].astype(object),
+            'Amount': pd.to_numeric(df[amount_col], errors='coerce')
+        }))
+    if not parts:
+        return pd.DataFrame(columns=MODEL_PRICE_KEYS + ['Count', 'Amount'])
+    rows = pd.concat(parts, ignore_index=True).merge(catalog[['Device Name', 'Model Key', 'Storage (GB)']], on='Device Name', how='inner')
+    return rows.groupby(MODEL_PRICE_KEYS, dropna=False).agg(
+        Count=('Amount', 'count'),
+        Amount=('Amount', 'sum')
+    ).reset_index()
+
+def merge_model_prices(model_prices, delta):
+    return pd.concat([model_prices, delta], ignore_index=True).groupby(MODEL_PRICE_KEYS, dropna=False).agg(
+        Count=('Count', 'sum'),
+        Amount=('Amount', 'sum')
+    ).reset_index()
+
+def update_derived_tables(tables, frames):
+    # Folds Maple/Cashify rows ({'maple': df, 'cashify': df}, either may be missing) into the
+    # tables persisted next to the cube
+    tables = dict(tables)
+    tables['devices'] = update_device_catalog(tables.get('devices'), get_device_names(frames))
+    delta = build_model_prices(frames, tables['devices'])
+    tables['models'] = merge_model_prices(tables['models'], delta) if 'models' in tables else delta
+    delta = build_imei_index(frames)
+    tables['imei'] = merge_imei_indexes(tables['imei'], delta) if 'imei' in tables else delta
+    delta = build_price_summary(pd.concat([get_price_rows(name, df) for name, df in frames.items()], ignore_index=True))
+    tables['prices'] = merge_price_summaries(tables['prices'], delta) if 'prices' in tables else delta
+    return tables
+
+def build_derived_tables(dataset_dirs):
+    # Full builds read the stored datasets one partition at a time
+    tables = {}
+    for name, dataset_dir in zip(DATASET_DATE_COLUMNS, dataset_dirs):
+        available = read_dataset(dataset_dir, partitions=[]).columns
+        columns = DERIVED_TABLE_COLUMNS + [DEVICE_NAME_COLUMNS[name], DATASET_AMOUNT_COLUMNS[name], DATASET_DATE_COLUMNS[name]]
+        columns = [col for col in columns + [imei_col for imei_col, _ in IMEI_COLUMNS[name]] if col in available]
+        tables = update_derived_tables(tables, {name: read_dataset(dataset_dir, columns=columns, partitions=[])})
+        for partition in list_dataset_partitions(dataset_dir):
+            tables = update_derived_tables(tables, {name: read_dataset(dataset_dir, columns=columns, partitions=[partition])})
+    return tables
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_device_catalog(cache_key):
+    catalog = read_snapshot(get_processed_paths(cache_key, ['devices'])[0])
+    logging.info(f"Loaded device catalog with {len(catalog)} names and {catalog['Model Key'].nunique()} models from cache {cache_key[:16]}")
+    return catalog
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_model_prices(cache_key):
+    model_prices = read_snapshot(get_processed_paths(cache_key, ['models'])[0])
+    logging.info(f"Loaded model prices with {len(model_prices)} cells from cache {cache_key[:16]}")
+    return model_prices
+
+def normalize_imei(imeis):
+    # 14-digit IMEI body: digits only, the Luhn check digit dropped so 14- and 15-digit
+    # entries agree; placeholders such as 000000000000000 are discarded
+    digits = imeis.astype(str).fillna('').str.replace(r'\.0$', '', regex=True).str.replace(r'\D', '', regex=True)
+    # map keeps the str dtype on an empty series, so its result is cast before combining masks
+    distinct = digits.map(lambda value: len(set(value)) > 1).astype(bool)
+    valid = imeis.notna() & digits.str.len().isin([14, 15]) & distinct
+    return digits.str[:14].where(valid)
+
+def build_imei_index(frames):
+    # One row per device, feed and role with a 64-bit hash of the IMEI as the join key;
+    # the raw IMEIs are not kept
+    parts = []
+    for name, df in frames.items():
+        date_col, amount_col, name_col = DATASET_DATE_COLUMNS[name], DATASET_AMOUNT_COLUMNS[name], DEVICE_NAME_COLUMNS[name]
+        for imei_col, role in IMEI_COLUMNS[name]:
+            if imei_col not in df.columns:
+                continue
+            imeis = normalize_imei(df[imei_col])
+            rows = df[imeis.notna()]
+            parts.append(pd.DataFrame({
+                'IMEI Key': pd.util.hash_pandas_object(imeis.dropna(), index=False).values,
+                'Source': 'Maple' if name == 'maple' else 'Cashify',
+                'Role': role,
+                'Date': rows[date_col].values if date_col in rows.columns else pd.NaT,
+                'Store Name': rows['Store Name'].astype(object).values if 'Store Name' in rows.columns else None,
+                'Store State': rows['Store State'].astype(object).values if 'Store State' in rows.columns else None,
+                'Device Name': rows[name_col].astype(object).values if name_col in rows.columns else None,
+                'Amount': pd.to_numeric(rows[amount_col], errors='coerce').values if amount_col in rows.columns else np.nan
+            }))
+    if not parts:
+        return pd.DataFrame(columns=IMEI_INDEX_COLUMNS)
+    return merge_imei_indexes(pd.concat(parts, ignore_index=True))
+
+def merge_imei_indexes(*indexes):
+    # Requotes of the same device keep the latest record
+    indexes = [index for index in indexes if not index.empty]
+    if not indexes:
+        return pd.DataFrame(columns=IMEI_INDEX_COLUMNS)
+    index = sort_by_date(pd.concat(indexes, ignore_index=True), 'Date')
+    return index.drop_duplicates(['IMEI Key', 'Source', 'Role'], keep='last').reset_index(drop=True)[IMEI_INDEX_COLUMNS]
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_imei_index(cache_key):
+    imei_index = read_snapshot(get_processed_paths(cache_key, ['imei'])[0])
+    logging.info(f"Loaded IMEI index with {len(imei_index)} devices from cache {cache_key[:16]}")
+    return imei_index
+
+def match_imei_index(imei_index):
+    # Devices in both feeds: a single hash join of Maple records onto Cashify records
+    maple = imei_index[imei_index['Source'] == 'Maple'].drop(columns=['Source', 'Role'])
+    cashify = imei_index[imei_index['Source'] == 'Cashify'].drop(columns=['Source'])
+    matches = maple.merge(cashify, on='IMEI Key', suffixes=(' (Maple)', ' (Cashify)'))
+    matches['Gap (Days)'] = (matches['Date (Cashify)'] - matches['Date (Maple)']).dt.days
+    matches['Price Difference (₹)'] = matches['Amount (Cashify)'] - matches['Amount (Maple)']
+    return matches
+
+def compute_shopped_around(imei_index):
+    matches = match_imei_index(imei_index)
+    # Quoted by Maple first, then traded in with Cashify
+    lost = matches[(matches['Role'] == 'Old Device') & (matches['Gap (Days)'] >= 0)]
+    leaderboard = lost.groupby('Store Name (Maple)').agg(
+        **{
+            'Devices Lost': ('IMEI Key', 'size'),
+            'Avg Gap (Days)': ('Gap (Days)', 'mean'),
+            'Avg Maple Quote (₹)': ('Amount (Maple)', 'mean'),
+            'Avg Cashify Price (₹)': ('Amount (Cashify)', 'mean'),
+            'Avg Price Difference (₹)': ('Price Difference (₹)', 'mean'),
+            'Value Lost (₹)': ('Amount (Cashify)', 'sum')
+        }
+    ).reset_index().rename(columns={'Store Name (Maple)': 'Store Name'})
+    leaderboard = leaderboard.sort_values(['Devices Lost', 'Value Lost (₹)'], ascending=False).reset_index(drop=True).round(2)
+    return matches.drop(columns=['IMEI Key']), lost.drop(columns=['IMEI Key']), leaderboard
+
+def filter_cube(cube, year=None, month=None, day=None, source=None):
+    # Same date window as filter_by_date, so cube sections and row sections count the same rows
+    if year is not None:
+        cube = slice_by_date(cube, 'Date', *get_date_window(year, month, day))
+    if source:
+        cube = cube[cube['Source'] == source]
+    return cube
+
+def filter_cube_months(cube, months):
+    # Inner join on (Month, Year); 'Period' keeps the position of each month in the requested list
+    periods = pd.DataFrame(months, columns=['Month', 'Year']).reset_index().rename(columns={'index': 'Period'})
+    return cube.merge(periods, on=['Month', 'Year'], how='inner')
+
+def cube_source_counts(cells, by):
+    counts = cells.groupby(by + ['Source'], observed=True)['Count'].sum().unstack('Source', fill_value=0)
+    counts = counts.reindex(columns=['Maple', 'Cashify'], fill_value=0)
+    counts.columns = ['Maple Count', 'Cashify Count']
+    return counts.reset_index()
+
+def compute_market_share(cells, grain, period=None, start=None, end=None):
+    # One grouped pass over cube cells: Maple vs Cashify counts and share per grain and period
+    # Cube cells keep the cube's date order through masks and month merges
+    if start is not None or end is not None:
+        cells = slice_by_date(cells, 'Date', start, end, include_end=True)
+
+    if period == 'day':
+        period_keys = ['Date']
+    elif period == 'week':
+        # Same 7-day blocks starting on the 1st as get_weeks_in_month
+        cells = cells[cells['Date'].notna()]
+        cells = cells.assign(Week='Week ' + ((cells['Date'].dt.day - 1) // 7 + 1).astype(int).astype(str))
+        period_keys = ['Week']
+    elif period == 'month':
+        period_keys = (['Period'] if 'Period' in cells.columns else []) + ['Year', 'Month']
+    else:
+        period_keys = []
+
+    keys = period_keys + MARKET_SHARE_GRAINS[grain]
+    if grain == 'spoc':
+        # A SPOC's share is measured against every Cashify trade-in at their store
+        store_keys = period_keys + ['Store Name']
+        shares = cells[cells['Source'] == 'Maple'].groupby(keys, dropna=False, observed=True)['Count'].sum().reset_index(name='Maple Count')
+        cashify_counts = cells[cells['Source'] == 'Cashify'].groupby(store_keys, observed=True)['Count'].sum().reset_index(name='Cashify Count')
+        shares = shares.merge(cashify_counts, on=store_keys, how='left').fillna({'Cashify Count': 0})
+    else:
+        shares = cube_source_counts(cells, keys)
+
+    shares['Total Trade-ins'] = shares['Maple Count'] + shares['Cashify Count']
+    shares['Market Share (%)'] = calculate_market_share(shares['Maple Count'], shares['Total Trade-ins'])
+    return shares
 
 def login():
     st.sidebar.header("Login")
@@ -395,9 +1682,50 @@ def logout():
         st.session_state.username = None
         st.session_state.column_mappings = {'Maple': {}, 'Cashify': {}, 'SPOC': {}}
         st.session_state.spoc_mapping_complete = False
-        st.session_state.spoc_ids = {}
         st.sidebar.success("Logged out successfully")
 
+def review_store_aliases():
+    proposals = load_store_aliases(['proposed', 'auto'])
+    if proposals.empty:
+        return
+    pending = (proposals['status'] == 'proposed').sum()
+    with st.sidebar.expander(f"Store name matches to review ({pending} proposed, {len(proposals) - pending} applied)"):
+        st.caption("Store names not found in the SPOC master. Applied matches are already in use; accepting or rejecting a match rebuilds the datasets.")
+        review = pd.DataFrame({
+            'Store Name': proposals['alias'],
+            'SPOC Master Store': proposals['store_name'],
+            'Score': proposals['score'],
+            'Status': proposals['status'].map({'proposed': 'Proposed', 'auto': 'Applied'}),
+            'Action': ""
+        })
+        edited = st.data_editor(
+            review,
+            column_config={'Action': st.column_config.SelectboxColumn("Action", options=["", "Accept", "Reject"])},
+            disabled=['Store Name', 'SPOC Master Store', 'Score', 'Status'],
+            hide_index=True,
+            key="store_alias_review"
+        )
+        if st.button("Save store matches", key="save_store_aliases"):
+            decided = edited[edited['Action'].isin(["Accept", "Reject"])]
+            save_store_aliases(
+                (alias, store_name, score, 'accepted' if action == "Accept" else 'rejected')
+                for alias, store_name, score, _, action in decided.itertuples(index=False, name=None)
+            )
+            logging.info(f"Store aliases reviewed: {(decided['Action'] == 'Accept').sum()} accepted, {(decided['Action'] == 'Reject').sum()} rejected")
+            st.rerun()
+
+def edit_product_category_rules():
+    rules = pd.DataFrame(get_product_category_rules(), columns=['Keyword', 'Also Contains', 'Category'])
+    with st.sidebar.expander("Product category rules"):
+        st.caption("Product types are matched top to bottom; the first matching rule sets the category. Saving rebuilds the datasets.")
+        edited = st.data_editor(rules, num_rows="dynamic", hide_index=True, key="product_category_rules")
+        if st.button("Save category rules", key="save_product_category_rules"):
+            edited = edited.fillna('').astype(str).apply(lambda col: col.str.strip())
+            edited = edited[(edited['Keyword'] != '') & (edited['Category'] != '')]
+            save_product_category_rules(edited.itertuples(index=False, name=None))
+            logging.info(f"Product category rules saved: {len(edited)} rules")
+            st.rerun()
+
 def get_last_n_months_for_page(n):
     current_date = date.today()
     months = []
@@ -410,349 +1738,1173 @@ def get_last_n_months_for_page(n):
         months.append((calendar.month_name[month], year))
     return sorted(months, key=lambda x: (x[1], list(calendar.month_name).index(x[0])))
 
-def process_spoc_weekoffs(spoc_df, selected_year, selected_month):
-    if 'Weekoff Day' not in spoc_df.columns or selected_month == "All":
-        return {}
-    
-    spoc_weekoffs = {}
-    for _, row in spoc_df.iterrows():
-        if pd.notna(row['Weekoff Day']) and row['Weekoff Day'] != "Vacant":
-            spoc_weekoffs[row['Spoc Name']] = get_weekoffs(selected_year, selected_month, row['Weekoff Day'])
-    
-    logging.info(f"Processed weekoffs for {len(spoc_weekoffs)} SPOCs")
-    return spoc_weekoffs
+@st.cache_resource(show_spinner=False)
+def get_section_cache():
+    return {
+        'entries': OrderedDict(), 'sizes': {}, 'bytes': 0,
+        'hits': 0, 'misses': 0, 'evictions': 0, 'lock': threading.Lock()
+    }
 
-def process_devices_lost_section(maple_filtered, cashify_filtered, spoc_df, selected_year, selected_month, selected_day):
-    st.header("5. Devices Lost on SPOC Weekoff Days")
-    
+def estimate_result_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_result_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_result_size(k) + estimate_result_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+def normalize_filter_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, str):
+        value = value.strip()
+    if isinstance(value, (date, pd.Timestamp)):
+        value = pd.Timestamp(value).isoformat()
+    if isinstance(value, (tuple, list)):
+        value = tuple(normalize_filter_value(item) for item in value)
+    return value
+
+# Section results are memoized per dataset fingerprint and normalized filter tuple in an
+# LRU cache with a memory budget
+def get_section_result(cache_key, section_key, compute):
+    cache = get_section_cache()
+    # Results for an older data drop or another session's column mapping are never hit again
+    # and age out through LRU eviction
+    key = (cache_key, normalize_filter_value(section_key))
+    with cache['lock']:
+        if key in cache['entries']:
+            cache['entries'].move_to_end(key)
+            cache['hits'] += 1
+            return cache['entries'][key]
+        cache['misses'] += 1
+
+    result = compute()
+    size = estimate_result_size(result)
+    budget = SECTION_CACHE_BUDGET_MB * 1024 ** 2
+    with cache['lock']:
+        if size > budget or key in cache['entries']:
+            return result
+        cache['entries'][key] = result
+        cache['sizes'][key] = size
+        cache['bytes'] += size
+        while cache['bytes'] > budget:
+            evicted_key, _ = cache['entries'].popitem(last=False)
+            cache['bytes'] -= cache['sizes'].pop(evicted_key)
+            cache['evictions'] += 1
+            logging.info(f"Evicted section result {evicted_key[1]} for cache {evicted_key[0][:16]} to stay within {SECTION_CACHE_BUDGET_MB} MB")
+    return result
+
+def get_section_cache_stats():
+    cache = get_section_cache()
+    with cache['lock']:
+        return {
+            'hits': cache['hits'], 'misses': cache['misses'], 'evictions': cache['evictions'],
+            'entries': len(cache['entries']), 'bytes': cache['bytes']
+        }
+
+def add_product_category(df):
+    # Category sections group by the rule-based category of the Product Type stored at load
+    return df.assign(**{'Product Category': df['Product Type Category']})
+
+def summarize_device_counts(cells, selected_month, loose_zones=False):
+    if loose_zones:
+        # Zone labels vary in the Cashify feed ("South", "S Zone", "South Zone"), so match loosely
+        zone_labels = cells['Zone'].str.strip().str.title()
+        south = zone_labels.str.contains('South|S Zone', case=False, na=False)
+        west = zone_labels.str.contains('West|W Zone', case=False, na=False)
+    else:
+        south = cells['Zone'] == 'South'
+        west = cells['Zone'] == 'West'
+    return {
+        'daily': cells.groupby('Date')['Count'].sum().mean() if not cells.empty else 0,
+        'weekly': cells.groupby(cells['Date'].dt.isocalendar().week)['Count'].sum().mean() if not cells.empty else 0,
+        'monthly': int(cells['Count'].sum()) if selected_month != "All" else 0,
+        'south': int(cells.loc[south, 'Count'].sum()),
+        'west': int(cells.loc[west, 'Count'].sum())
+    }
+
+def process_device_averages(cache_key, cube_filtered, selected_year, selected_month, selected_day):
+    st.header("1. Average Devices Acquired")
+    summaries = get_section_result(
+        cache_key, ('device_averages', selected_year, selected_month, selected_day),
+        lambda: {
+            source: summarize_device_counts(cube_filtered[cube_filtered['Source'] == source], selected_month, loose_zones=source == 'Cashify')
+            for source in ['Maple', 'Cashify']
+        }
+    )
+    for col, source in zip(st.columns(2), ['Maple', 'Cashify']):
+        with col:
+            summary = summaries[source]
+            st.subheader(source)
+            st.write(f"Daily Avg: {summary['daily']:.2f}")
+            st.write(f"Weekly Avg: {summary['weekly']:.2f}")
+            st.write(f"Monthly Total: {summary['monthly']}")
+            st.write(f"South Zone Total: {summary['south']}")
+            st.write(f"West Zone Total: {summary['west']}")
+
+def compute_weekly_market_share(cube_filtered, selected_year, selected_month):
+    weeks = get_weeks_in_month(selected_year, selected_month)
+    weekly_shares = compute_market_share(
+        cube_filtered[cube_filtered['Store State'].isin(SOUTH_STATES)], 'state', period='week',
+        start=weeks[0][1], end=weeks[-1][2]
+    )
+    weekly_ms_df = pd.DataFrame(
+        [(state, week_name) for state in SOUTH_STATES for week_name, _, _ in weeks],
+        columns=['Store State', 'Week']
+    ).merge(weekly_shares[['Store State', 'Week', 'Market Share (%)']], on=['Store State', 'Week'], how='left').fillna({'Market Share (%)': 0})
+    weekly_ms_df['Market Share (%)'] = weekly_ms_df['Market Share (%)'].round(2)
+    return weekly_ms_df.pivot(index='Store State', columns='Week', values='Market Share (%)').fillna(0)
+
+def process_weekly_market_share(cache_key, cube_filtered, selected_year, selected_month, selected_day):
+    st.header("1.1 Weekly Market Share Overview")
     if selected_month == "All":
-        st.warning("Please select a specific month for weekoff analysis")
-        return
-    
-    spoc_weekoffs = process_spoc_weekoffs(spoc_df, selected_year, selected_month)
-    
-    if not spoc_weekoffs:
-        st.info("No devices lost on weekoff days (no weekoff data available)")
-        return
-    
-    # Get all SPOCs with weekoff data
-    spoc_list = list(spoc_weekoffs.keys())
-    selected_spoc = st.selectbox("Select SPOC", spoc_list, key="spoc_weekoff_select")
-    
-    if selected_spoc not in spoc_weekoffs:
-        st.info("No weekoff days for selected SPOC")
-        return
-    
-    weekoff_dates = spoc_weekoffs[selected_spoc]
-    if not weekoff_dates:
-        st.info(f"No weekoff days for {selected_spoc} in {selected_month}")
-        return
-    
-    # Get stores for this SPOC
-    spoc_stores = maple_filtered[maple_filtered['Spoc Name'] == selected_spoc]['Store Name'].unique()
-    if not spoc_stores:
-        st.info(f"No stores found for SPOC {selected_spoc}")
+        st.warning("Please select a specific month for weekly market share analysis.")
         return
-    
-    store = spoc_stores[0]  # Assuming one store per SPOC
-    
-    # Get Cashify devices lost on weekoff days
-    cashify_losses = cashify_filtered[
-        (cashify_filtered['Store Name'] == store) &
-        (cashify_filtered['Order Date'].dt.date.isin(weekoff_dates))
-    ]
-    
-    if cashify_losses.empty:
-        st.info(f"No devices lost on weekoff days for {selected_spoc} at {store}")
+
+    weekly_ms_pivot = get_section_result(
+        cache_key, ('weekly_market_share', selected_year, selected_month, selected_day),
+        lambda: compute_weekly_market_share(cube_filtered, selected_year, selected_month)
+    )
+    if weekly_ms_pivot.empty:
+        st.warning("No data available for weekly market share analysis.")
         return
-    
-    # Group by product category
-    losses_by_category = cashify_losses.groupby('Product Category').size().reset_index(name='Count')
-    
-    st.write(f"**Devices lost on {selected_spoc}'s weekoff days at {store}:**")
-    st.dataframe(losses_by_category)
-    
-    if not losses_by_category.empty:
-        fig = px.bar(
-            losses_by_category,
-            x='Product Category',
-            y='Count',
-            text='Count',
-            title=f"Devices Lost on {selected_spoc}'s Weekoff Days"
-        )
-        st.plotly_chart(fig, use_container_width=True)
 
-def process_working_day_losses(maple_filtered, cashify_filtered, spoc_df, selected_year, selected_month):
-    st.header("6. Working Day Losses")
-    
+    st.write("**Weekly Market Share by State:**")
+    st.dataframe(weekly_ms_pivot)
+
+    st.download_button(
+        label="Download Weekly Market Share as Excel",
+        data=create_excel_buffer(weekly_ms_pivot.reset_index(), 'Weekly Market Share'),
+        file_name="weekly_market_share.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+def compute_monthly_market_share(cube, selected_year, selected_month):
+    last_n_months = get_last_n_months(selected_month, selected_year, 3)
+    month_cells = filter_cube_months(
+        cube[(cube['Zone'] == 'South') & (cube['Store State'].isin(SOUTH_STATES))],
+        last_n_months
+    )
+    monthly_ms_df = compute_market_share(month_cells, 'state', period='month')
+    monthly_ms_df['Market Share (%)'] = monthly_ms_df['Market Share (%)'].round(2)
+    return monthly_ms_df[['Store State', 'Month', 'Market Share (%)']]
+
+def process_monthly_market_share(cache_key, cube, selected_year, selected_month):
+    st.header("2. Monthly Market Share Overview for South Zone")
     if selected_month == "All":
-        st.warning("Please select a specific month for working day analysis")
-        return
-    
-    spoc_weekoffs = process_spoc_weekoffs(spoc_df, selected_year, selected_month)
-    
-    if not spoc_weekoffs:
-        st.info("No working day losses data available (no weekoff data for comparison)")
-        return
-    
-    spoc_list = list(spoc_weekoffs.keys())
-    selected_spoc = st.selectbox("Select SPOC", spoc_list, key="spoc_working_select")
-    
-    if selected_spoc not in spoc_weekoffs:
-        st.info("No data for selected SPOC")
-        return
-    
-    weekoff_dates = spoc_weekoffs[selected_spoc]
-    spoc_stores = maple_filtered[maple_filtered['Spoc Name'] == selected_spoc]['Store Name'].unique()
-    
-    if not spoc_stores:
-        st.info(f"No stores found for SPOC {selected_spoc}")
+        st.warning("Please select a specific month to view current and last 3 months' market share.")
         return
-    
-    store = spoc_stores[0]
-    
-    # Get all dates in the month that aren't weekoff days
-    month_num = {"January": 1, "February": 2, "March": 3, "April": 4, "May": 5, "June": 6,
-                 "July": 7, "August": 8, "September": 9, "October": 10, "November": 11, "December": 12}
-    first_day = date(selected_year, month_num[selected_month], 1)
-    last_day = (first_day + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-    
-    all_dates = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
-    working_dates = [d for d in all_dates if d not in weekoff_dates]
-    
-    # Get Cashify devices lost on working days
-    cashify_losses = cashify_filtered[
-        (cashify_filtered['Store Name'] == store) &
-        (cashify_filtered['Order Date'].dt.date.isin(working_dates))
-    ]
-    
-    if cashify_losses.empty:
-        st.info(f"No working day losses for {selected_spoc} at {store}")
+
+    monthly_ms_df = get_section_result(
+        cache_key, ('monthly_market_share', selected_year, selected_month),
+        lambda: compute_monthly_market_share(cube, selected_year, selected_month)
+    )
+    monthly_ms_pivot = monthly_ms_df.pivot(index='Store State', columns='Month', values='Market Share (%)').fillna(0)
+
+    st.write("**Monthly Market Share by State:**")
+    st.dataframe(monthly_ms_pivot)
+
+    fig_ms = px.bar(
+        monthly_ms_df,
+        x='Store State',
+        y='Market Share (%)',
+        color='Month',
+        title=f"Monthly Market Share by South Zone States (Current and Last 3 Months)",
+        text='Market Share (%)',
+        height=600,
+        barmode='group'
+    )
+    fig_ms.update_traces(texttemplate='%{text:.1f}', textposition='auto', textfont=dict(size=14, weight='bold'))
+    fig_ms.update_layout(
+        showlegend=True,
+        xaxis_tickangle=45,
+        margin=dict(t=150)
+    )
+    st.plotly_chart(fig_ms, use_container_width=True)
+
+    st.download_button(
+        label="Download Monthly Market Share as Excel",
+        data=create_excel_buffer(monthly_ms_pivot.reset_index(), 'Monthly Market Share'),
+        file_name="monthly_market_share.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+def compute_south_zone_market_share(cube, cube_filtered, selected_year, selected_month, state):
+    south_zone = "South"
+    south_stores = cube_filtered.loc[(cube_filtered['Source'] == 'Maple') & (cube_filtered['Zone'] == south_zone), 'Store Name'].unique()
+    if len(south_stores) == 0:
+        return pd.DataFrame()
+
+    last_n_months = get_last_n_months(selected_month, selected_year, 2) if selected_month != "All" else [(selected_month, selected_year)]
+    last_n_months = [(selected_month, selected_year)] + last_n_months
+    month_cells = filter_cube_months(
+        cube[(cube['Zone'] == south_zone) & (cube['Store State'] == state)],
+        list(dict.fromkeys(last_n_months))
+    )
+    store_ms = compute_market_share(month_cells[month_cells['Store Name'].isin(south_stores)], 'spoc', period='month')
+    store_ms = store_ms[store_ms['Spoc Name'].notna() & (store_ms['Market Share (%)'] > 50)]
+    south_ms_df = store_ms.assign(
+        **{'Zone': south_zone, 'Store State': state, 'Market Share (%)': store_ms['Market Share (%)'].round(2)}
+    )[['Zone', 'Store State', 'Store Name', 'Spoc Name', 'Month', 'Market Share (%)']].reset_index(drop=True)
+    south_ms_df['Store_SPOC'] = south_ms_df['Store Name'] + ' (' + south_ms_df['Spoc Name'] + ')'
+    return south_ms_df
+
+# Sections with their own widgets run as fragments, so changing one of those widgets
+# reruns only that section against the shared dataset instead of the whole script
+@st.fragment
+def process_south_zone_market_share(cache_key, cube, cube_filtered, selected_year, selected_month, selected_day):
+    st.header("2.1 Overall Market Share of South Zone (>50%)")
+    state_dropdown = st.selectbox("Select South Zone State", SOUTH_STATES, key="state_select_2_1")
+    south_ms_df = get_section_result(
+        cache_key, ('south_zone_market_share', selected_year, selected_month, selected_day, state_dropdown),
+        lambda: compute_south_zone_market_share(cube, cube_filtered, selected_year, selected_month, state_dropdown)
+    )
+
+    if south_ms_df.empty:
+        st.write(f"No data available for {state_dropdown} with market share above 50%.")
         return
-    
-    # Group by product category
-    losses_by_category = cashify_losses.groupby('Product Category').size().reset_index(name='Count')
-    
-    st.write(f"**Working day losses for {selected_spoc} at {store}:**")
-    st.dataframe(losses_by_category)
-    
-    if not losses_by_category.empty:
-        fig = px.bar(
-            losses_by_category,
-            x='Product Category',
-            y='Count',
-            text='Count',
-            title=f"Working Day Losses for {selected_spoc}"
-        )
-        st.plotly_chart(fig, use_container_width=True)
 
-def process_tradein_losses(cashify_filtered, selected_year, selected_month):
-    st.header("7. Trade-ins Lost to Cashify by State")
-    
-    south_states = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
-    
+    fig_south_ms = px.bar(
+        south_ms_df,
+        x='Store_SPOC',
+        y='Market Share (%)',
+        color='Month',
+        text='Market Share (%)',
+        title=f"Market Share (>50%) in {state_dropdown} by Store and SPOC",
+        height=600,
+        barmode='group'
+    )
+    fig_south_ms.update_traces(texttemplate='%{text:.1f}%', textposition='auto')
+    fig_south_ms.update_layout(
+        showlegend=True,
+        xaxis_title="Store Name (SPOC)",
+        xaxis_tickangle=45
+    )
+    st.plotly_chart(fig_south_ms, use_container_width=True)
+
+def compute_zone_market_share(cube, selected_year, selected_month):
+    last_n_months = get_last_n_months(selected_month, selected_year, 4)
+    all_zones = sorted(set(cube.loc[cube['Source'] == 'Maple', 'Zone'].dropna()))
+    ms_zones = [zn for zn in all_zones if zn in ['South', 'West']]
+    zone_shares = compute_market_share(filter_cube_months(cube[cube['Zone'].isin(ms_zones)], last_n_months), 'zone', period='month')
+    zone_ms_df = pd.DataFrame(
+        [(period, month, zn) for period, (month, _) in enumerate(last_n_months) for zn in ms_zones],
+        columns=['Period', 'Month', 'Zone']
+    ).merge(zone_shares[['Period', 'Zone', 'Market Share (%)']], on=['Period', 'Zone'], how='left').fillna({'Market Share (%)': 0})
+    zone_ms_df['Market Share (%)'] = zone_ms_df['Market Share (%)'].round(2)
+    return zone_ms_df[['Zone', 'Month', 'Market Share (%)']]
+
+def process_zone_market_share(cache_key, cube, selected_year, selected_month):
+    st.header("2.2 Zone-wise Market Share")
     if selected_month == "All":
-        st.warning("Please select a specific month for trade-in analysis")
+        st.write("Please select a specific month to view current and last 3 months.")
         return
-    
-    # Standardize state names
-    cashify_filtered = standardize_state_names(cashify_filtered)
-    
-    # Filter for south states and completed orders
-    status_filter = cashify_filtered['Order Status'] == 'Completed' if 'Order Status' in cashify_filtered.columns else pd.Series([True] * len(cashify_filtered))
-    
-    tradein_losses = cashify_filtered[
-        (cashify_filtered['Store State'].isin(south_states)) &
-        (cashify_filtered['Month'] == selected_month) &
-        (cashify_filtered['Year'] == selected_year) &
-        status_filter
-    ]
-    
-    if tradein_losses.empty:
-        st.info("No trade-in losses data available for selected period")
+
+    zone_ms_df = get_section_result(
+        cache_key, ('zone_market_share', selected_year, selected_month),
+        lambda: compute_zone_market_share(cube, selected_year, selected_month)
+    )
+    if zone_ms_df.empty:
+        st.write("No zone-wise market share data available.")
         return
-    
-    # Enhanced product categorization
-    tradein_losses['Product Category'] = tradein_losses['Product Type'].apply(categorize_product_type)
-    
-    # 1. Trade-in Losses by State
-    losses_by_state = tradein_losses.groupby('Store State').size().reset_index(name='Count')
-    
-    if not losses_by_state.empty:
-        st.subheader("Trade-in Losses by State")
-        fig_state = px.bar(
-            losses_by_state,
-            x='Store State',
-            y='Count',
-            text='Count',
-            title=f"Trade-ins Lost to Cashify by State ({selected_month} {selected_year})"
-        )
-        st.plotly_chart(fig_state, use_container_width=True)
-    
-    # 2. Trade-in Losses by Category
-    losses_by_category = tradein_losses.groupby('Product Category').size().reset_index(name='Count')
-    
-    if not losses_by_category.empty:
-        st.subheader("Trade-in Losses by Product Category")
-        fig_category = px.bar(
-            losses_by_category,
-            x='Product Category',
-            y='Count',
-            color='Product Category',
-            text='Count',
-            title=f"Trade-ins Lost by Product Category ({selected_month} {selected_year})"
-        )
-        st.plotly_chart(fig_category, use_container_width=True)
-    
-    # 3. Combined view
-    losses_by_state_category = tradein_losses.groupby(['Store State', 'Product Category']).size().reset_index(name='Count')
-    
-    if not losses_by_state_category.empty:
-        st.subheader("Trade-in Losses by State and Category")
-        fig_combined = px.bar(
-            losses_by_state_category,
-            x='Store State',
-            y='Count',
-            color='Product Category',
-            barmode='stack',
-            text='Count',
-            title=f"Trade-ins Lost by State and Category ({selected_month} {selected_year})"
-        )
-        st.plotly_chart(fig_combined, use_container_width=True)
 
-def process_pricing_comparison(maple_filtered, cashify_filtered, selected_year, selected_month):
-    st.header("8. Device Loss to Cashify with Pricing Comparison")
-    
-    if selected_month == "All":
-        st.warning("Please select a specific month for pricing comparison")
+    st.write("**Market Share by Zone (South and West):**")
+    st.dataframe(zone_ms_df)
+
+    fig_zone_ms = px.bar(
+        zone_ms_df,
+        x='Zone',
+        y='Market Share (%)',
+        color='Month',
+        text='Market Share (%)',
+        title=f"Zone-wise Market Share (Current and Last Month)",
+        barmode='group'
+    )
+    fig_zone_ms.update_traces(texttemplate='%{text:.1f}', textposition='auto')
+    fig_zone_ms.update_layout(showlegend=True)
+    st.plotly_chart(fig_zone_ms, use_container_width=True)
+
+def compute_low_market_share_stores(cube_filtered, zone):
+    stores_in_zone = cube_filtered.loc[(cube_filtered['Source'] == 'Maple') & (cube_filtered['Zone'] == zone), 'Store Name'].unique()
+    store_counts = compute_market_share(cube_filtered[cube_filtered['Store Name'].isin(stores_in_zone)], 'spoc')
+    store_counts = store_counts.rename(columns={'Maple Count': 'Maple Devices'})
+    return store_counts.loc[
+        store_counts['Market Share (%)'] < 50, ['Store Name', 'Spoc Name', 'Maple Devices', 'Market Share (%)']
+    ].reset_index(drop=True)
+
+@st.fragment
+def process_low_market_share_stores(cache_key, cube, cube_filtered, selected_year, selected_month, selected_day):
+    st.header("2.3 Stores with Market Share Below 50% in Selected Zone")
+    zones = sorted(set(cube.loc[cube['Source'] == 'Maple', 'Zone'].dropna()))
+    zone = st.selectbox("Select Zone", zones, key="zone_select_2_3")
+    low_ms_df = get_section_result(
+        cache_key, ('low_market_share_stores', selected_year, selected_month, selected_day, zone),
+        lambda: compute_low_market_share_stores(cube_filtered, zone)
+    )
+
+    if low_ms_df.empty:
+        st.write(f"No stores in {zone} have a market share below 50%.")
         return
-    
-    south_states = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
-    
-    # Standardize state names
-    cashify_filtered = standardize_state_names(cashify_filtered)
-    maple_filtered = standardize_state_names(maple_filtered)
-    
-    # Filter for south states and current month
-    cashify_prices = cashify_filtered[
-        (cashify_filtered['Store State'].isin(south_states)) &
-        (cashify_filtered['Month'] == selected_month) &
-        (cashify_filtered['Year'] == selected_year)
-    ]
-    
-    maple_prices = maple_filtered[
-        (maple_filtered['Store State'].isin(south_states)) &
-        (maple_filtered['Month'] == selected_month) &
-        (maple_filtered['Year'] == selected_year)
-    ]
-    
-    if cashify_prices.empty or maple_prices.empty:
-        st.warning("Insufficient data for pricing comparison")
+
+    st.write("**Stores with Market Share Below 50%**")
+    st.dataframe(low_ms_df)
+
+    fig = px.bar(
+        low_ms_df,
+        x='Market Share (%)',
+        y='Store Name',
+        color='Spoc Name',
+        text='Maple Devices',
+        title=f"Stores in {zone} with Market Share Below 50%",
+        orientation='h'
+    )
+    fig.update_traces(textposition='inside')
+    st.plotly_chart(fig)
+
+    st.download_button(
+        label="Download Low Market Share Stores as Excel",
+        data=create_excel_buffer(low_ms_df, 'Low Market Share Stores'),
+        file_name="low_ms_stores.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+def compute_state_device_counts(cube_filtered):
+    state_counts = cube_source_counts(cube_filtered[cube_filtered['Store State'].isin(SOUTH_STATES)], ['Store State'])
+    state_counts.columns = ['Store State', 'Maple Device Count', 'Cashify Device Count']
+    logging.info(f"State-wise Device Counts: {state_counts[['Store State', 'Maple Device Count', 'Cashify Device Count']].to_dict('records')}")
+    return pd.melt(
+        state_counts,
+        id_vars=['Store State'],
+        value_vars=['Maple Device Count', 'Cashify Device Count'],
+        var_name='Source',
+        value_name='Device Count'
+    )
+
+def process_state_device_counts(cache_key, cube_filtered, selected_year, selected_month, selected_day):
+    st.header("2.4 State-wise Device Counts and Top Performer SPOCs")
+    st.write("**Device Counts per State (South Zone)**")
+    state_counts_melted = get_section_result(
+        cache_key, ('state_device_counts', selected_year, selected_month, selected_day),
+        lambda: compute_state_device_counts(cube_filtered)
+    )
+
+    if state_counts_melted.empty:
+        st.write("No device data available for state-wise analysis in South Zone.")
         return
-    
-    # Enhanced product categorization
-    cashify_prices['Product Category'] = cashify_prices['Product Type'].apply(categorize_product_type)
-    maple_prices['Product Category'] = maple_prices['Product Type'].apply(categorize_product_type)
-    
-    # Filter for valid categories
+
+    fig_state = px.bar(
+        state_counts_melted,
+        x='Store State',
+        y='Device Count',
+        color='Source',
+        text='Device Count',
+        title=f"Device Counts per State (South Zone, Year: {selected_year}, Month: {selected_month})",
+        barmode='group',
+        color_discrete_map={'Maple Device Count': '#636EFA', 'Cashify Device Count': '#EF553B'}
+    )
+    fig_state.update_traces(texttemplate='%{text:.0f}', textposition='auto')
+    fig_state.update_layout(showlegend=True)
+    st.plotly_chart(fig_state, use_container_width=True)
+
+def select_store_and_spoc(cube, maple_filtered):
+    maple_cube = cube[cube['Source'] == 'Maple']
+    zones = sorted(set(maple_cube['Zone'].dropna()))
+    zone = st.selectbox("Select Zone", zones, key="zone_select_2_5")
+    store_states = sorted(set(maple_cube.loc[maple_cube['Zone'] == zone, 'Store State'].dropna()) | set(SOUTH_STATES))
+    store_state = st.selectbox("Select Store State", store_states, key="state_select_2_5")
+    store_names = sorted(set(maple_filtered[maple_filtered['Store State'] == store_state]['Store Name'].dropna()))
+    if not store_names:
+        st.warning("No store names available for the selected store state.")
+        st.stop()
+    store_name = st.selectbox("Select Store Name", store_names, key="store_select_2_5")
+    spocs = sorted(set(maple_filtered[maple_filtered['Store Name'] == store_name]['Spoc Name'].dropna()))
+    if not spocs:
+        st.info("No SPOCs available for the selected store. Using store-level data.")
+        spoc = "No Spoc"
+    else:
+        spoc = st.selectbox("Select SPOC", spocs, key="spoc_select_2_5")
+    return zone, store_state, store_name, spoc
+
+def compute_spoc_market_share(maple_filtered, cashify_filtered, spoc_df, period_targets, store_state, store_name, spoc):
+    if spoc == "No Spoc":
+        spoc_achievement = len(maple_filtered[maple_filtered['Store Name'] == store_name])
+    else:
+        spoc_achievement = len(maple_filtered[(maple_filtered['Store Name'] == store_name) & (maple_filtered['Spoc Name'] == spoc)])
+    total_trades = spoc_achievement + len(cashify_filtered[cashify_filtered['Store Name'] == store_name])
+    cashify_count = len(cashify_filtered[(cashify_filtered['Store State'] == store_state) & (cashify_filtered['Store Name'] == store_name)])
+
+    spoc_ids = spoc_df.loc[spoc_df['Spoc Name'] == spoc, 'SPOC_ID'] if spoc != "No Spoc" else pd.Series(dtype=object)
+    target = int(period_targets.loc[period_targets['SPOC_ID'] == spoc_ids.iloc[0], 'Target'].sum()) if not spoc_ids.empty else 0
+    return {
+        'market_share': calculate_market_share(spoc_achievement, total_trades),
+        'target': target,
+        'achievement': spoc_achievement,
+        'target_achievement': calculate_target_achievement(spoc_achievement, target),
+        'shortfall': target - spoc_achievement,
+        'total_trades': total_trades,
+        'cashify_count': cashify_count
+    }
+
+@st.fragment
+def process_market_share_analysis(cache_key, cube, maple_filtered, cashify_filtered, spoc_df, period_targets, selected_year, selected_month, selected_day):
+    st.header("2.5 Market Share Analysis")
+    _, store_state, store_name, spoc = select_store_and_spoc(cube, maple_filtered)
+    metrics = get_section_result(
+        cache_key, ('spoc_market_share', selected_year, selected_month, selected_day, store_state, store_name, spoc),
+        lambda: compute_spoc_market_share(maple_filtered, cashify_filtered, spoc_df, period_targets, store_state, store_name, spoc)
+    )
+
+    st.write(f"Market Share: {metrics['market_share']:.2f}%")
+    st.markdown(f"SPOC Target ({selected_month}): {metrics['target']}")
+    st.write(f"SPOC Achievement: {metrics['achievement']}")
+    st.write(f"Target Achieved MTD: {metrics['target_achievement']:.2f}%")
+    st.markdown(f"SPOC Shortfall: {metrics['shortfall']}")
+    st.write(f"Total Trade-ins at Store (Maple + Cashify): {metrics['total_trades']}")
+    st.write(f"Total Trade-ins in Cashify (Selected State and Store): {metrics['cashify_count']}")
+
+def compute_spoc_performance(maple_dataset, maple_filtered, selected_year, selected_month, store_name, spoc):
+    spoc_count = len(maple_filtered[maple_filtered['Spoc Name'] == spoc]) if spoc != 'No Spoc' else 0
+    spoc_perf_data = []
+    for month, year in get_last_n_months(selected_month, selected_year, 2):
+        equals = {'Spoc Name': spoc} if spoc != 'No Spoc' else {'Store Name': store_name}
+        spoc_cat = count_dataset_rows(maple_dataset, 'Created Date', ['Product Category'], *get_date_window(year, month), equals=equals)
+        spoc_cat['Month'] = month
+        spoc_perf_data.append(spoc_cat)
+
+    spoc_perf_df = pd.concat(spoc_perf_data, ignore_index=True)
     valid_categories = ['Mobile Phone', 'Laptop', 'Tablet', 'SmartWatch (Apple)', 'SmartWatch (Android)']
-    cashify_prices = cashify_prices[cashify_prices['Product Category'].isin(valid_categories)]
-    maple_prices = maple_prices[maple_prices['Product Category'].isin(valid_categories)]
-    
-    if cashify_prices.empty or maple_prices.empty:
-        st.warning("No valid product categories for pricing comparison")
+    return spoc_count, spoc_perf_df[spoc_perf_df['Product Category'].isin(valid_categories)]
+
+@st.fragment
+def process_spoc_performance(cache_key, cube, maple_dataset, maple_filtered, selected_year, selected_month, selected_day):
+    st.header("3. SPOC Performance in Selected Month")
+    if selected_month == "All":
+        st.write("Please select a specific month to view spoc performance.")
         return
-    
-    # Calculate average prices
-    cashify_avg = cashify_prices.groupby('Product Category')['Initial Device Amount'].mean().reset_index()
-    maple_avg = maple_prices.groupby('Product Category')['Maple Bid'].mean().reset_index()
-    
-    pricing_comparison = pd.merge(
-        cashify_avg,
-        maple_avg,
-        on='Product Category',
-        how='outer'
+
+    _, _, store_name, spoc = select_store_and_spoc(cube, maple_filtered)
+    spoc_count, spoc_perf_df = get_section_result(
+        cache_key, ('spoc_performance', selected_year, selected_month, selected_day, store_name, spoc),
+        lambda: compute_spoc_performance(maple_dataset, maple_filtered, selected_year, selected_month, store_name, spoc)
+    )
+    st.subheader(f"{spoc}'s Performance in {selected_month} {selected_year}")
+    st.write(f"Devices Acquired: {spoc_count}")
+
+    if spoc_perf_df.empty:
+        st.write("No spoc-wise performance data available for spoc.")
+        return
+
+    fig_spoc_perf = px.bar(
+        spoc_perf_df,
+        x='Product Category',
+        y='Count',
+        color='Month',
+        text='Count',
+        title=f"{spoc}'s Devices Acquired by Category (Current and Last Month)",
+        barmode='group'
+    )
+    fig_spoc_perf.update_traces(texttemplate='%{text:.0f}', textposition='auto')
+    fig_spoc_perf.update_layout(showlegend=True)
+    st.plotly_chart(fig_spoc_perf)
+
+def compute_category_contribution(cube_filtered, zone):
+    maple_cells = cube_filtered[cube_filtered['Source'] == 'Maple']
+    cashify_cells = cube_filtered[cube_filtered['Source'] == 'Cashify']
+    maple_zone = maple_cells[maple_cells['Zone'] == zone] if zone in maple_cells['Zone'].values else maple_cells
+    cashify_zone = cashify_cells[cashify_cells['Zone'] == zone] if zone in cashify_cells['Zone'].values else cashify_cells
+
+    # Get counts by category
+    maple_cat = maple_zone.groupby('Product Category', observed=True)['Count'].sum().reset_index(name='Maple Device Count')
+    cashify_cat = cashify_zone.groupby('Product Category', observed=True)['Count'].sum().reset_index(name='Cashify Device Count')
+    return pd.merge(maple_cat, cashify_cat, on='Product Category', how='outer').fillna(0)
+
+@st.fragment
+def process_category_contribution(cache_key, cube, cube_filtered, selected_year, selected_month, selected_day):
+    st.header("4. Category-wise Contribution in Selected Zone")
+    zones = sorted(set(cube.loc[cube['Source'] == 'Maple', 'Zone'].dropna()))
+    zone = st.selectbox("Select Zone", zones, key="zone_select_4")
+    cat_df = get_section_result(
+        cache_key, ('category_contribution', selected_year, selected_month, selected_day, zone),
+        lambda: compute_category_contribution(cube_filtered, zone)
+    )
+
+    if cat_df.empty:
+        st.warning(f"No category data available for {zone} zone.")
+        return
+
+    # Prepare data for visualization
+    cat_df_melted = pd.melt(
+        cat_df,
+        id_vars=['Product Category'],
+        value_vars=['Maple Device Count', 'Cashify Device Count'],
+        var_name='Source',
+        value_name='Device Count'
+    )
+    # Define our valid categories (including 'Other' for visualization)
+    valid_categories = ['Mobile Phone', 'Laptop', 'Tablet',
+                        'SmartWatch (Apple)', 'SmartWatch (Android)', 'Other']
+
+    # Filter and sort categories
+    cat_df_melted = cat_df_melted[cat_df_melted['Product Category'].isin(valid_categories)]
+    cat_df_melted['Product Category'] = pd.Categorical(
+        cat_df_melted['Product Category'],
+        categories=valid_categories,
+        ordered=True
+    )
+    cat_df_melted = cat_df_melted.sort_values('Product Category')
+
+    if cat_df_melted.empty:
+        st.warning(f"No valid category data for {zone}. Available categories: {cat_df['Product Category'].unique().tolist()}")
+        return
+
+    fig = px.bar(
+        cat_df_melted,
+        x='Product Category',
+        y='Device Count',
+        color='Source',
+        text='Device Count',
+        title=f"Category-wise Device Counts in {zone} Zone",
+        category_orders={"Product Category": valid_categories}
+    )
+    fig.update_traces(texttemplate='%{text:.0f}', textposition='auto')
+    fig.update_layout(
+        barmode='group',
+        showlegend=True,
+        xaxis_title="Product Category",
+        yaxis_title="Number of Devices"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Show raw data as well
+    st.subheader("Detailed Category Breakdown")
+    st.dataframe(cat_df.sort_values('Maple Device Count', ascending=False))
+
+def get_weekoff_losses(cache_key, spoc_df, cashify_filtered, selected_year, selected_month, selected_day):
+    # Shared by the weekoff and working day sections
+    def compute():
+        weekoff_calendar = build_weekoff_calendar(spoc_df, *get_date_window(selected_year, selected_month, selected_day))
+        weekoff_losses = compute_weekoff_losses(weekoff_calendar, add_product_category(cashify_filtered))
+        return weekoff_calendar, weekoff_losses
+    return get_section_result(cache_key, ('weekoff_losses', selected_year, selected_month, selected_day), compute)
+
+@st.fragment
+def process_devices_lost_section(cache_key, cashify_filtered, spoc_df, selected_year, selected_month, selected_day):
+    st.header("5. Devices Lost on SPOC Weekoff Days at Their Store")
+
+    if selected_month == "All":
+        st.warning("Please select a specific month for weekoff analysis")
+        return
+
+    weekoff_calendar, weekoff_losses = get_weekoff_losses(cache_key, spoc_df, cashify_filtered, selected_year, selected_month, selected_day)
+    spoc_list = list(weekoff_calendar.loc[weekoff_calendar['Is Weekoff'], 'Spoc Name'].unique())
+
+    if not spoc_list:
+        st.info("No SPOCs with weekoff days in the selected period" if selected_day != "All" else "No SPOCs with weekoff days found")
+        return
+
+    # Weekoff and working day losses for every SPOC at once
+    st.subheader("Weekoff vs Working Day Losses by SPOC")
+    st.dataframe(summarize_weekoff_losses(weekoff_calendar, weekoff_losses))
+
+    selected_spoc = st.selectbox("Select SPOC", spoc_list, key="spoc_weekoff_select")
+    losses_by_store = weekoff_losses.loc[
+        (weekoff_losses['Spoc Name'] == selected_spoc) & weekoff_losses['Is Weekoff'],
+        ['Store Name', 'Product Category', 'Count']
+    ]
+
+    if losses_by_store.empty:
+        st.info(f"No devices lost on weekoff days for {selected_spoc}")
+        return
+
+    st.write(f"**Devices lost on {selected_spoc}'s weekoff days:**")
+    st.dataframe(losses_by_store)
+
+    fig = px.bar(
+        losses_by_store,
+        x='Store Name',
+        y='Count',
+        color='Product Category',
+        text='Count',
+        title=f"Devices Lost on {selected_spoc}'s Weekoff Days by Store",
+        barmode='group'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def process_working_day_losses(cache_key, cashify_filtered, spoc_df, selected_year, selected_month, selected_day):
+    st.header("6. Working Day Losses")
+
+    if selected_month == "All":
+        st.warning("Please select a specific month for working day analysis")
+        return
+
+    weekoff_calendar, weekoff_losses = get_weekoff_losses(cache_key, spoc_df, cashify_filtered, selected_year, selected_month, selected_day)
+    # Every SPOC with a weekoff day, whether or not it falls in the selected period
+    spoc_list = list(weekoff_calendar['Spoc Name'].unique())
+
+    if not spoc_list:
+        st.info("No SPOCs with weekoff days found")
+        return
+
+    selected_spoc = st.selectbox("Select SPOC", spoc_list, key="spoc_working_select")
+
+    # Get Cashify devices lost on working days
+    losses_by_store = weekoff_losses.loc[
+        (weekoff_losses['Spoc Name'] == selected_spoc) & ~weekoff_losses['Is Weekoff'],
+        ['Store Name', 'Product Category', 'Count']
+    ]
+
+    if losses_by_store.empty:
+        st.info(f"No working day losses for {selected_spoc}")
+        return
+
+    st.write(f"**Working day losses for {selected_spoc}:**")
+    st.dataframe(losses_by_store)
+
+    fig = px.bar(
+        losses_by_store,
+        x='Store Name',
+        y='Count',
+        color='Product Category',
+        text='Count',
+        title=f"Working Day Losses for {selected_spoc} by Store",
+        barmode='group'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+def compute_tradein_losses(cashify_filtered, selected_year, selected_month):
+    # Filter for south states and completed orders
+    status_filter = cashify_filtered['Order Status'] == 'Completed' if 'Order Status' in cashify_filtered.columns else pd.Series(True, index=cashify_filtered.index)
+    tradein_losses = cashify_filtered[
+        (cashify_filtered['Store State'].isin(SOUTH_STATES)) &
+        (cashify_filtered['Month'] == selected_month) &
+        (cashify_filtered['Year'] == selected_year) &
+        status_filter
+    ]
+    if tradein_losses.empty:
+        return None, None
+
+    # Get required columns (check if they exist first)
+    required_cols = ['Store State', 'Store Name', 'Spoc Name', 'Product Category',
+                     'Product Type', 'Old Device Name', 'Initial Device Amount']
+    detailed_losses = add_product_category(tradein_losses)[[col for col in required_cols if col in tradein_losses.columns]]
+    detailed_losses = detailed_losses.assign(Count=1)
+
+    pivot_data = detailed_losses.groupby(['Store State', 'Store Name', 'Spoc Name', 'Product Category'], observed=True).agg({
+        'Count': 'sum',
+        'Initial Device Amount': 'mean'
+    }).reset_index()
+    return detailed_losses, pivot_data
+
+@st.fragment
+def process_tradein_losses(cache_key, cashify_filtered, selected_year, selected_month, selected_day):
+    st.header("7. Trade-ins Lost to Cashify by State and Store")
+
+    if selected_month == "All":
+        st.warning("Please select a specific month for trade-in analysis")
+        return
+
+    detailed_losses, pivot_data = get_section_result(
+        cache_key, ('tradein_losses', selected_year, selected_month, selected_day),
+        lambda: compute_tradein_losses(cashify_filtered, selected_year, selected_month)
+    )
+    if detailed_losses is None:
+        st.info("No trade-in losses data available for selected period")
+        return
+
+    # Display the detailed data
+    st.subheader("Detailed Trade-in Losses by State, Store and SPOC")
+    st.dataframe(detailed_losses)
+
+    # Visualization 1: State-wise losses
+    st.subheader("Trade-in Losses by State")
+    state_losses = detailed_losses.groupby('Store State', observed=True)['Count'].sum().reset_index()
+    fig_state = px.bar(
+        state_losses,
+        x='Store State',
+        y='Count',
+        text='Count',
+        title=f"Total Trade-ins Lost to Cashify by State ({selected_month} {selected_year})",
+        color='Store State'
+    )
+    st.plotly_chart(fig_state, use_container_width=True)
+
+    # Visualization 2: Store-wise losses within each state
+    st.subheader("Trade-in Losses by Store (Within Each State)")
+    selected_state = st.selectbox(
+        "Select State to View Store-wise Losses",
+        sorted(detailed_losses['Store State'].unique()),
+        key="state_select_tradein"
+    )
+
+    state_store_losses = detailed_losses[detailed_losses['Store State'] == selected_state]
+    store_summary = state_store_losses.groupby(['Store Name', 'Spoc Name'], observed=True)['Count'].sum().reset_index()
+
+    fig_store = px.bar(
+        store_summary,
+        x='Store Name',
+        y='Count',
+        color='Spoc Name',
+        text='Count',
+        title=f"Trade-in Losses by Store in {selected_state}",
+        barmode='group'
+    )
+    fig_store.update_layout(xaxis_tickangle=45)
+    st.plotly_chart(fig_store, use_container_width=True)
+
+    # Visualization 3: Product category distribution for selected state
+    st.subheader(f"Product Category Distribution in {selected_state}")
+    state_category_losses = state_store_losses.groupby('Product Category', observed=True)['Count'].sum().reset_index()
+
+    fig_category = px.pie(
+        state_category_losses,
+        names='Product Category',
+        values='Count',
+        title=f"Product Categories Lost in {selected_state}"
+    )
+    st.plotly_chart(fig_category, use_container_width=True)
+
+    # Download buttons
+    st.download_button(
+        label="Download Detailed Trade-in Losses as CSV",
+        data=create_csv_buffer(detailed_losses, 'Trade-in Losses'),
+        file_name=f"tradein_losses_{selected_month}_{selected_year}.csv",
+        mime="text/csv"
+    )
+
+    st.download_button(
+        label="Download Summary Data as CSV",
+        data=create_csv_buffer(pivot_data, 'Trade-in Summary'),
+        file_name=f"tradein_summary_{selected_month}_{selected_year}.csv",
+        mime="text/csv"
+    )
+
+def compute_pricing_comparison(price_summary, selected_year, selected_month):
+    # Filter for south states and current month
+    cells = price_summary[
+        (price_summary['Store State'].isin(SOUTH_STATES)) &
+        (price_summary['Month'] == selected_month) &
+        (price_summary['Year'] == selected_year)
+    ]
+    if not {'Maple', 'Cashify'}.issubset(cells['Source'].unique()):
+        return "Insufficient data for pricing comparison"
+
+    # Filter for valid categories
+    cells = cells[cells['Product Category'].isin(PRICING_CATEGORIES)]
+    if not {'Maple', 'Cashify'}.issubset(cells['Source'].unique()):
+        return "No valid product categories for pricing comparison"
+
+    # Average and median prices by category and program type, merged from the summary cells
+    prices = summarize_price_cells(cells, ['Product Category', 'Product Type', 'Source']).pivot(
+        index=['Product Category', 'Product Type'], columns='Source', values=['Mean', 'Median']
     ).fillna(0)
-    
-    pricing_comparison['Price Difference'] = pricing_comparison['Initial Device Amount'] - pricing_comparison['Maple Bid']
-    pricing_comparison['Price Difference %'] = (pricing_comparison['Price Difference'] / pricing_comparison['Maple Bid']) * 100
-    
+
+    pricing_comparison = pd.DataFrame({
+        'Product Category': prices.index.get_level_values('Product Category'),
+        'Program Type': prices.index.get_level_values('Product Type'),
+        'Avg Cashify Price (₹)': prices[('Mean', 'Cashify')].values,
+        'Avg Maple Price (₹)': prices[('Mean', 'Maple')].values
+    })
+    pricing_comparison['Price Difference (₹)'] = pricing_comparison['Avg Cashify Price (₹)'] - pricing_comparison['Avg Maple Price (₹)']
+    pricing_comparison['Price Difference (%)'] = (pricing_comparison['Price Difference (₹)'] / pricing_comparison['Avg Maple Price (₹)']) * 100
+    pricing_comparison['Median Cashify Price (₹)'] = prices[('Median', 'Cashify')].values
+    pricing_comparison['Median Maple Price (₹)'] = prices[('Median', 'Maple')].values
+
     # Format for display
-    pricing_comparison = pricing_comparison.round(2)
-    pricing_comparison.columns = [
-        'Product Category', 
-        'Avg Cashify Price (₹)', 
-        'Avg Maple Price (₹)', 
-        'Price Difference (₹)', 
-        'Price Difference (%)'
-    ]
-    
+    return pricing_comparison.round(2)
+
+def process_pricing_comparison(cache_key, maple_filtered, cashify_filtered, selected_year, selected_month, selected_day):
+    st.header("8. Device Loss to Cashify with Pricing Comparison")
+
+    if selected_month == "All":
+        st.warning("Please select a specific month for pricing comparison")
+        return
+
+    def compute():
+        if selected_day == "All":
+            price_summary = get_price_summary(cache_key)
+        else:
+            # The summary is monthly; a single day is summarized from its rows
+            price_summary = build_price_summary(pd.concat([
+                get_price_rows('maple', maple_filtered), get_price_rows('cashify', cashify_filtered)
+            ], ignore_index=True))
+        return compute_pricing_comparison(price_summary, selected_year, selected_month)
+
+    pricing_comparison = get_section_result(
+        cache_key, ('pricing_comparison', selected_year, selected_month, selected_day), compute
+    )
+    if isinstance(pricing_comparison, str):
+        st.warning(pricing_comparison)
+        return
+
     st.write(f"**Pricing Comparison for {selected_month} {selected_year}**")
     st.dataframe(pricing_comparison)
-    
-    # Visualization
+
+    # Visualization - Price Difference by Category and Program Type
     fig = px.bar(
-        pricing_comparison.melt(id_vars=['Product Category'], 
-                              value_vars=['Avg Cashify Price (₹)', 'Avg Maple Price (₹)']),
+        pricing_comparison,
+        x='Product Category',
+        y='Price Difference (₹)',
+        color='Program Type',
+        barmode='group',
+        text='Price Difference (₹)',
+        title=f"Price Difference (Cashify - Maple) by Category ({selected_month} {selected_year})",
+        labels={'value': 'Price Difference (₹)', 'variable': 'Price Source'}
+    )
+    fig.update_traces(texttemplate='%{text:.2f}', textposition='outside')
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Visualization - Average Prices Comparison
+    fig_prices = px.bar(
+        pricing_comparison.melt(id_vars=['Product Category', 'Program Type'],
+                                value_vars=['Avg Cashify Price (₹)', 'Avg Maple Price (₹)']),
         x='Product Category',
         y='value',
         color='variable',
-        barmode='group',
+        facet_col='Program Type',
         text='value',
-        title=f"Average Pricing Comparison ({selected_month} {selected_year})",
+        title=f"Average Pricing Comparison by Program Type ({selected_month} {selected_year})",
         labels={'value': 'Price (₹)', 'variable': 'Price Source'}
     )
-    st.plotly_chart(fig, use_container_width=True)
+    fig_prices.update_traces(texttemplate='%{text:.2f}', textposition='outside')
+    fig_prices.update_layout(showlegend=True)
+    st.plotly_chart(fig_prices, use_container_width=True)
 
-def base_analysis(maple_df, cashify_df, spoc_df):
-    st.title("Maple vs Cashify Analytics Dashboard")
+@st.fragment
+def process_price_distribution(cache_key):
+    st.subheader("Price Distribution (South)")
+    price_summary = get_price_summary(cache_key)
+    cells = price_summary[price_summary['Store State'].isin(SOUTH_STATES)]
+    month_numbers = cells['Month'].map({name: number for number, name in enumerate(calendar.month_name) if name})
+    cells = cells[month_numbers.notna() & cells['Year'].notna()]
+    if cells.empty:
+        st.warning("No priced trade-ins for South states")
+        return
 
-    st.header("Filters")
-    col1, col2, col3 = st.columns(3)
+    # Month ranges are answered by merging the monthly cells' sketches
+    periods = cells['Year'].astype(int) * 12 + month_numbers[cells.index].astype(int) - 1
+    labels = {int(period): f"{calendar.month_abbr[period % 12 + 1]} {period // 12}" for period in sorted(periods.unique())}
+    options = list(labels)
+    start, end = st.select_slider(
+        "Months", options=options, value=(options[0], options[-1]), format_func=labels.get, key="price_distribution_months"
+    ) if len(options) > 1 else (options[0], options[0])
+    group_col = st.radio(
+        "Group by", ['Product Category', 'Product Type'], horizontal=True,
+        format_func=lambda col: 'Program Type' if col == 'Product Type' else col, key="price_distribution_group"
+    )
+    distribution = get_section_result(
+        cache_key, ('price_distribution', start, end, group_col),
+        lambda: summarize_price_cells(cells[periods.between(start, end)], [group_col, 'Source'])
+    )
 
-    with col1:
-        years = sorted(set(maple_df['Year'].dropna()) & set(cashify_df['Year'].dropna()))
-        years = [int(year) for year in years]
-        selected_year = st.selectbox("Select Year", years if years else [2025], key="year_filter")
+    # Box statistics come straight from the summary; whiskers mark P10 and P90
+    fig = go.Figure()
+    for source in ['Maple', 'Cashify']:
+        prices = distribution[distribution['Source'] == source]
+        fig.add_trace(go.Box(
+            x=prices[group_col], q1=prices['P25'], median=prices['Median'], q3=prices['P75'],
+            lowerfence=prices['P10'], upperfence=prices['P90'], mean=prices['Mean'], name=source
+        ))
+    fig.update_layout(
+        boxmode='group',
+        title=f"Trade-in Price Distribution ({labels[start]} to {labels[end]}, whiskers at P10/P90)",
+        xaxis_title='Program Type' if group_col == 'Product Type' else group_col,
+        yaxis_title="Price (₹)"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(distribution.round(2))
+
+def compute_model_pricing(model_prices, catalog):
+    # Full-history average price per model and storage variant for South stores from the
+    # per-model totals kept at ingest
+    south = model_prices[model_prices['Store State'].isin(SOUTH_STATES)]
+    totals = south.groupby(['Model Key', 'Storage (GB)', 'Source'], dropna=False)[['Count', 'Amount']].sum()
+    prices = pd.DataFrame({'count': totals['Count'], 'mean': totals['Amount'] / totals['Count']}).unstack('Source')
+    if 'Maple' not in prices['count'] or 'Cashify' not in prices['count']:
+        return "No models traded in with both Maple and Cashify"
+    prices = prices.dropna(subset=[('mean', 'Maple'), ('mean', 'Cashify')])
+    if prices.empty:
+        return "No models traded in with both Maple and Cashify"
+    models = catalog.drop_duplicates('Model Key').set_index('Model Key')
+    model_keys = prices.index.get_level_values('Model Key')
+    model_pricing = pd.DataFrame({
+        'Brand': models.loc[model_keys, 'Brand'].values,
+        'Model': models.loc[model_keys, 'Model'].values,
+        'Storage (GB)': prices.index.get_level_values('Storage (GB)'),
+        'Maple Devices': prices[('count', 'Maple')].astype(int),
+        'Cashify Devices': prices[('count', 'Cashify')].astype(int),
+        'Avg Maple Bid (₹)': prices[('mean', 'Maple')],
+        'Avg Cashify Price (₹)': prices[('mean', 'Cashify')]
+    }, index=prices.index).reset_index(drop=True)
+    model_pricing['Price Difference (₹)'] = model_pricing['Avg Cashify Price (₹)'] - model_pricing['Avg Maple Bid (₹)']
+    model_pricing['Price Difference (%)'] = model_pricing['Price Difference (₹)'] / model_pricing['Avg Maple Bid (₹)'] * 100
+    model_pricing = model_pricing.assign(Volume=model_pricing['Maple Devices'] + model_pricing['Cashify Devices'])
+    model_pricing = model_pricing.sort_values(['Volume', 'Model', 'Storage (GB)'], ascending=[False, True, True]).drop(columns=['Volume'])
+    return model_pricing.reset_index(drop=True).round(2)
+
+def process_model_pricing(cache_key):
+    st.subheader("Like-for-like Pricing by Device Model (Full History, South)")
+    model_pricing = get_section_result(
+        cache_key, ('model_pricing',),
+        lambda: compute_model_pricing(get_model_prices(cache_key), get_device_catalog(cache_key))
+    )
+    if isinstance(model_pricing, str):
+        st.warning(model_pricing)
+        return
 
-    with col2:
-        maple_months = set(maple_df['Month'].dropna())
-        cashify_months = set(cashify_df['Month'].dropna())
-        common_months = sorted(maple_months & cashify_months)
-        selected_month = st.selectbox("Select Month", ["All"] + common_months, key="month_filter")
+    st.write(f"**{len(model_pricing)} model variants traded in with both Maple and Cashify**")
+    st.dataframe(model_pricing)
 
-    with col3:
-        if selected_month != "All":
-            days = []
-            if not maple_df.empty and 'Created Date' in maple_df.columns:
-                maple_days = maple_df[maple_df['Month'] == selected_month]['Created Date'].dt.day.dropna()
-                days.extend(maple_days)
-            if not cashify_df.empty and 'Order Date' in cashify_df.columns:
-                cashify_days = cashify_df[cashify_df['Month'] == selected_month]['Order Date'].dt.day.dropna()
-                days.extend(cashify_days)
-            days = sorted(set(map(int, days)))
-            selected_day = st.selectbox("Select Day", ["All"] + list(days), key="day_filter")
-        else:
-            selected_day = "All"
+    top_models = model_pricing.head(15).copy()
+    top_models['Variant'] = top_models['Model'] + top_models['Storage (GB)'].map(lambda gb: f" {gb} GB" if pd.notna(gb) else "")
+    fig = px.bar(
+        top_models,
+        x='Variant',
+        y='Price Difference (₹)',
+        color='Brand',
+        text='Price Difference (₹)',
+        title="Price Difference (Cashify - Maple) for the 15 Most Traded Model Variants",
+        labels={'Price Difference (₹)': 'Price Difference (₹)'}
+    )
+    fig.update_traces(texttemplate='%{text:.0f}', textposition='outside')
+    st.plotly_chart(fig, use_container_width=True)
 
-    # Filter data
-    maple_filtered = filter_by_date(maple_df, selected_year, selected_month, selected_day)
-    cashify_filtered = filter_by_date(cashify_df, selected_year, selected_month, selected_day, is_maple=False)
+    st.download_button(
+        label="Download Model Pricing CSV",
+        data=create_csv_buffer(model_pricing, 'Model Pricing'),
+        file_name="model_pricing.csv",
+        mime="text/csv"
+    )
 
-    if maple_filtered.empty or cashify_filtered.empty:
-        st.warning("No data available after applying filters. Please check your data or adjust the filters.")
-        return
+def preprocess_datasets(maple_df, cashify_df, spoc_df):
+    # Standardize data
+    maple_df = standardize_month(maple_df)
+    cashify_df = standardize_month(cashify_df)
+    
+    maple_df = standardize_names(maple_df, product_col='Old Product Name')
+    cashify_df = standardize_names(cashify_df, product_col='Old Device Name')
+    spoc_df = standardize_names(spoc_df)
+
+    maple_df = map_store_names_and_states(maple_df, spoc_df, is_maple=True)
+    cashify_df = map_store_names_and_states(cashify_df, spoc_df, is_maple=False)
+
+    # Categorized once here and stored; sections read Product Type Category instead of
+    # re-running the rules
+    rules = get_product_category_rules()
+    for df in (maple_df, cashify_df):
+        df['Product Type Category'] = categorize_product_types(df['Product Type'], rules) if 'Product Type' in df.columns else 'Other'
+
+    maple_df['Created Date'] = pd.to_datetime(maple_df['Created Date'], errors='coerce')
+    cashify_df['Order Date'] = pd.to_datetime(cashify_df['Order Date'], errors='coerce')
+    maple_df = sort_by_date(maple_df, 'Created Date')
+    cashify_df = sort_by_date(cashify_df, 'Order Date')
+
+    # Join SPOC IDs from the persistent registry
+    maple_df = assign_spoc_ids(maple_df)
+    cashify_df = assign_spoc_ids(cashify_df)
+    spoc_df = assign_spoc_ids(spoc_df)
+
+    return maple_df, cashify_df, spoc_df
+
+def get_frame_memory(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def compact_dtypes(df):
+    # Categoricals hold each distinct name once with integer codes per row; integer columns
+    # (Year, whole-rupee amounts) shrink to the smallest type that fits. Float amounts keep float64.
+    df = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+def compact_datasets(maple_df, cashify_df):
+    memory = {}
+    frames = []
+    for name, df in zip(DATASET_DATE_COLUMNS, (maple_df, cashify_df)):
+        before = get_frame_memory(df)
+        df = compact_dtypes(df)
+        memory[name] = [before, get_frame_memory(df)]
+        logging.info(f"Compacted {name} dtypes: {before / 1024 ** 2:.2f} MB -> {memory[name][1] / 1024 ** 2:.2f} MB")
+        frames.append(df)
+    return (*frames, memory)
+
+def get_preprocessing_cache_key(column_mappings):
+    payload = {
+        'version': PREPROCESSING_CACHE_VERSION,
+        'raw': [get_source_fingerprints(source) for source in (MAPLE_SOURCE, CASHIFY_SOURCE, SPOC_SOURCE)],
+        'mappings': column_mappings,
+        'store_aliases': get_reviewed_store_aliases(),
+        'product_category_rules': get_product_category_rules()
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def get_ingest_base_key(column_mappings):
+    # Everything the stored dataset depends on except the Maple and Cashify workbooks
+    payload = {
+        'version': PREPROCESSING_CACHE_VERSION,
+        'spoc': get_source_fingerprints(SPOC_SOURCE),
+        'mappings': column_mappings,
+        'store_aliases': get_reviewed_store_aliases(),
+        'product_category_rules': get_product_category_rules()
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
 
-    # Apply product categorization
-    maple_filtered['Product Category'] = maple_filtered['Product Type'].apply(categorize_product_type)
-    cashify_filtered['Product Category'] = cashify_filtered['Product Type'].apply(categorize_product_type)
+def get_processed_paths(cache_key, names):
+    extension = ".parquet" if SNAPSHOT_FORMAT == "parquet" else ".pkl"
+    return [os.path.join(SNAPSHOT_DIR, f"processed_{cache_key[:16]}_{name}{extension}") for name in names]
 
-    # Process each section
-    process_devices_lost_section(maple_filtered, cashify_filtered, spoc_df, selected_year, selected_month)
-    process_working_day_losses(maple_filtered, cashify_filtered, spoc_df, selected_year, selected_month)
-    process_tradein_losses(cashify_filtered, selected_year, selected_month)
-    process_pricing_comparison(maple_filtered, cashify_filtered, selected_year, selected_month)
+def load_ingest_state():
+    if not os.path.exists(INGEST_STATE_PATH):
+        return {}
+    try:
+        with open(INGEST_STATE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not read ingest state, rebuilding datasets: {str(e)}")
+        return {}
 
+def save_ingest_state(state):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = INGEST_STATE_PATH + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, INGEST_STATE_PATH)
+
+def find_new_rows(raw_df, stored_df, id_col, previous_rows):
+    # Returns the workbook rows whose ID is not stored yet, or None if the feed was not simply appended to
+    if id_col not in raw_df.columns or id_col not in stored_df.columns:
+        return None
+    ids = raw_df[id_col].astype(str).where(raw_df[id_col].notna())
+    stored_ids = pd.Index(stored_df[id_col].dropna().astype(str).unique())
+    new_rows = ids.notna() & ~ids.isin(stored_ids)
+    if len(raw_df) - int(new_rows.sum()) != previous_rows or not stored_ids.isin(ids).all():
+        return None
+    return raw_df[new_rows]
+
+def ingest_new_rows(state, cache_key, maple_df, cashify_df, spoc_df):
+    stored_dirs = [get_dataset_dir(state['cache_key'], name) for name in DATASET_DATE_COLUMNS]
+    stored_spoc_path, stored_cube_path = get_processed_paths(state['cache_key'], ['spoc', 'cube'])
+    if not all(os.path.isdir(path) for path in stored_dirs) or not os.path.exists(stored_spoc_path):
+        return None
+    # An empty partition list reads just the stored schema
+    stored_columns = [read_dataset(path, partitions=[]).columns for path in stored_dirs]
+    new_rows = []
+    for name, raw_df, stored_dir, columns in zip(DATASET_DATE_COLUMNS, (maple_df, cashify_df), stored_dirs, stored_columns):
+        id_col = INGEST_ID_COLUMNS[name]
+        # Only the ID column of the stored rows is read
+        stored_ids = read_dataset(stored_dir, columns=[id_col]) if id_col in columns else pd.DataFrame()
+        new_rows.append(find_new_rows(raw_df, stored_ids, id_col, state['rows'][name]))
+    maple_new, cashify_new = new_rows
+    if maple_new is None or cashify_new is None:
+        logging.info("Workbooks changed beyond appended rows, falling back to a full rebuild")
+        return None
+
+    logging.info(f"Appending {len(maple_new)} Maple and {len(cashify_new)} Cashify rows to cache {state['cache_key'][:16]}")
+    maple_new, cashify_new, _ = preprocess_datasets(maple_new.copy(), cashify_new.copy(), spoc_df.copy())
+    maple_new, cashify_new, memory = compact_datasets(maple_new, cashify_new)
+    if set(maple_new.columns) != set(stored_columns[0]) or set(cashify_new.columns) != set(stored_columns[1]):
+        logging.info("Appended rows have different columns than the stored dataset, falling back to a full rebuild")
+        return None
+    for df, stored_dir, (name, date_col) in zip((maple_new, cashify_new), stored_dirs, DATASET_DATE_COLUMNS.items()):
+        write_dataset(df, get_dataset_dir(cache_key, name), date_col, base_dir=stored_dir)
+
+    # Fold the new rows into the stored cube and derived tables instead of aggregating the full history again
+    cube = None
+    if os.path.exists(stored_cube_path):
+        cube = merge_tradein_cubes(read_snapshot(stored_cube_path), build_tradein_cube(maple_new, cashify_new))
+    tables = None
+    stored_table_paths = get_processed_paths(state['cache_key'], DERIVED_TABLES)
+    if all(os.path.exists(path) for path in stored_table_paths):
+        stored_tables = {name: read_snapshot(path) for name, path in zip(DERIVED_TABLES, stored_table_paths)}
+        tables = update_derived_tables(stored_tables, {'maple': maple_new, 'cashify': cashify_new})
+    ingest = {'mode': 'append', 'maple': len(maple_new), 'cashify': len(cashify_new), 'memory': memory}
+    return read_snapshot(stored_spoc_path), cube, tables, ingest
+
+# Returns the Maple and Cashify dataset directories and the processed SPOC frame. Like
+# everything returned by st.cache_resource or get_section_result, it is shared by every
+# session and must never be modified in place
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_preprocessed_datasets(cache_key, base_key, _sources, _column_mappings):
+    dataset_dirs = [get_dataset_dir(cache_key, name) for name in DATASET_DATE_COLUMNS]
+    spoc_path, cube_path = get_processed_paths(cache_key, ['spoc', 'cube'])
+    if all(os.path.isdir(path) for path in dataset_dirs) and os.path.exists(spoc_path):
+        logging.info(f"Loading preprocessed datasets from cache {cache_key[:16]}")
+        return (*dataset_dirs, read_snapshot(spoc_path))
+
+    raw_frames = []
+    for name in ['Maple', 'Cashify', 'SPOC']:
+        columns = get_source_columns(name, _column_mappings[name], load_source_preview(_sources[name]).columns)
+        dtype = get_source_dtypes(_column_mappings[name], columns)
+        raw_frames.append(apply_column_mapping(load_source(_sources[name], columns, dtype), _column_mappings[name], name))
+    maple_df, cashify_df, spoc_df = raw_frames
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    appended = None
+    state = load_ingest_state()
+    if INCREMENTAL_INGEST and state.get('base_key') == base_key:
+        appended = ingest_new_rows(state, cache_key, maple_df, cashify_df, spoc_df)
+    if appended:
+        spoc_df, cube, tables, ingest = appended
+    else:
+        logging.info(f"Preprocessing datasets for cache {cache_key[:16]}")
+        ingest = {'mode': 'full', 'maple': len(maple_df), 'cashify': len(cashify_df)}
+        maple_processed, cashify_processed, spoc_df = preprocess_datasets(maple_df, cashify_df, spoc_df)
+        maple_processed, cashify_processed, ingest['memory'] = compact_datasets(maple_processed, cashify_processed)
+        for df, dataset_dir, date_col in zip((maple_processed, cashify_processed), dataset_dirs, DATASET_DATE_COLUMNS.values()):
+            write_dataset(df, dataset_dir, date_col)
+        cube = build_tradein_cube(maple_processed, cashify_processed)
+        tables = None
+    if cube is None:
+        cube = build_tradein_cube(*(read_dataset(path) for path in dataset_dirs))
+    write_snapshot(cube, cube_path)
+    if tables is None:
+        tables = build_derived_tables(dataset_dirs)
+    for name, path in zip(DERIVED_TABLES, get_processed_paths(cache_key, DERIVED_TABLES)):
+        write_snapshot(tables[name], path)
+    # Written last: its presence marks the datasets for this cache key as complete
+    write_snapshot(spoc_df, spoc_path)
+    for file_name in os.listdir(SNAPSHOT_DIR):
+        if file_name.startswith("processed_") and not file_name.startswith(f"processed_{cache_key[:16]}_"):
+            path = os.path.join(SNAPSHOT_DIR, file_name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    save_ingest_state({
+        'cache_key': cache_key,
+        'base_key': base_key,
+        'rows': {'maple': len(maple_df), 'cashify': len(cashify_df)},
+        'last_ingest': dict(ingest, at=datetime.now().isoformat(timespec='seconds'))
+    })
+    return (*dataset_dirs, read_snapshot(spoc_path))
+
+def get_dataset_footprint(dataset_dirs, resident):
+    # Measured on every render: the cached windows and section results change between reruns
+    partitions = [path for dataset_dir in dataset_dirs for _, path in list_dataset_partitions(dataset_dir)]
+    windows, window_bytes = get_dataset_window_memory()
+    return {
+        'resident': sum(get_frame_memory(df) for df in resident),
+        'windows': windows,
+        'window_bytes': window_bytes,
+        'section_bytes': get_section_cache_stats()['bytes'],
+        'partitions': len(partitions),
+        'disk': sum(os.path.getsize(path) for path in partitions)
+    }
+
+def show_dataset_footprint(status, dataset_dirs, resident):
+    footprint = get_dataset_footprint(dataset_dirs, resident)
+    total = footprint['resident'] + footprint['window_bytes'] + footprint['section_bytes']
+    status.caption(
+        f"Shared dataset memory: {total / 1024 ** 2:.1f} MB ({footprint['resident'] / 1024 ** 2:.1f} MB cube, targets and SPOC sheet, "
+        f"{footprint['window_bytes'] / 1024 ** 2:.1f} MB in {footprint['windows']} cached date windows, "
+        f"{footprint['section_bytes'] / 1024 ** 2:.1f} MB of section results); "
+        f"rows are read per date window from {footprint['partitions']} monthly partitions ({footprint['disk'] / 1024 ** 2:.1f} MB on disk)"
+    )
 def main():
     if not st.session_state.authenticated:
         login()
@@ -768,28 +2920,34 @@ def main():
         st.session_state.spoc_mapping_complete = False
         st.sidebar.success("Column mappings reset. Please reload the app to re-map columns.")
 
-    # Load data from fixed paths
+    # Load data from the configured sources
     try:
-        if os.path.exists(MAPLE_FILE_PATH):
-            st.session_state.maple_data = pd.read_excel(MAPLE_FILE_PATH)
+        maple_files = resolve_source_files(MAPLE_SOURCE)
+        if maple_files:
+            maple_signatures = get_source_signatures(maple_files)
+            maple_raw = load_source_preview(maple_signatures)
             st.session_state.column_mappings['Maple'] = {}
         else:
-            st.error(f"Maple file not found at {MAPLE_FILE_PATH}. Please ensure the file exists.")
+            st.error(f"No Maple files found at {MAPLE_SOURCE}. Please ensure the files exist.")
             raise FileNotFoundError
         
-        if os.path.exists(CASHIFY_FILE_PATH):
-            st.session_state.cashify_data = pd.read_excel(CASHIFY_FILE_PATH)
+        cashify_files = resolve_source_files(CASHIFY_SOURCE)
+        if cashify_files:
+            cashify_signatures = get_source_signatures(cashify_files)
+            cashify_raw = load_source_preview(cashify_signatures)
             st.session_state.column_mappings['Cashify'] = {}
         else:
-            st.error(f"Cashify file not found at {CASHIFY_FILE_PATH}. Please ensure the file exists.")
+            st.error(f"No Cashify files found at {CASHIFY_SOURCE}. Please ensure the files exist.")
             raise FileNotFoundError
         
-        if os.path.exists(SPOC_FILE_PATH):
-            st.session_state.spoc_data = pd.read_excel(SPOC_FILE_PATH)
+        spoc_files = resolve_source_files(SPOC_SOURCE)
+        if spoc_files:
+            spoc_signatures = get_source_signatures(spoc_files)
+            spoc_raw = load_source_preview(spoc_signatures)
             st.session_state.column_mappings['SPOC'] = {}
             st.session_state.spoc_mapping_complete = False
         else:
-            st.error(f"SPOC file not found at {SPOC_FILE_PATH}. Please ensure the file exists.")
+            st.error(f"No SPOC files found at {SPOC_SOURCE}. Please ensure the files exist.")
             raise FileNotFoundError
     except Exception as e:
         st.error(f"Error loading files: {str(e)}. Please check the Excel files at {BASE_PATH}.")
@@ -797,10 +2955,10 @@ def main():
 
     # Validate and process data
     with st.spinner("Processing data..."):
-        if st.session_state.maple_data is not None and st.session_state.cashify_data is not None and st.session_state.spoc_data is not None:
-            maple_df, maple_mapping = validate_and_map_columns(st.session_state.maple_data.copy(), MAPLE_REQUIRED_COLUMNS, "Maple")
-            cashify_df, cashify_mapping = validate_and_map_columns(st.session_state.cashify_data.copy(), CASHIFY_REQUIRED_COLUMNS, "Cashify")
-            spoc_df, spoc_mapping = validate_and_map_columns(st.session_state.spoc_data.copy(), SPOC_REQUIRED_COLUMNS, "SPOC")
+        if maple_raw is not None and cashify_raw is not None and spoc_raw is not None:
+            maple_df, maple_mapping = validate_and_map_columns(maple_raw, MAPLE_REQUIRED_COLUMNS, "Maple")
+            cashify_df, cashify_mapping = validate_and_map_columns(cashify_raw, CASHIFY_REQUIRED_COLUMNS, "Cashify")
+            spoc_df, spoc_mapping = validate_and_map_columns(spoc_raw, SPOC_REQUIRED_COLUMNS, "SPOC")
             
             if maple_df is None or cashify_df is None or spoc_df is None:
                 st.error("Please complete column mappings for all datasets. Ensure SPOC 'Store Name' and 'Spoc Name' are mapped to valid columns.")
@@ -811,1122 +2969,301 @@ def main():
                 st.stop()
             st.session_state.spoc_mapping_complete = True
 
-            # Standardize data
-            maple_df = standardize_month(maple_df)
-            cashify_df = standardize_month(cashify_df)
-            
-            maple_df = standardize_names(maple_df, product_col='Old Product Name')
-            cashify_df = standardize_names(cashify_df, product_col='Old Device Name')
-            spoc_df = standardize_names(spoc_df)
-
-            maple_df = map_store_names_and_states(maple_df, spoc_df, is_maple=True)
-            cashify_df = map_store_names_and_states(cashify_df, spoc_df, is_maple=False)
-
-            maple_df['Created Date'] = pd.to_datetime(maple_df['Created Date'], errors='coerce')
-            cashify_df['Order Date'] = pd.to_datetime(cashify_df['Order Date'], errors='coerce')
-
-            # Generate SPOC IDs
-            if 'Spoc Name' in maple_df.columns and 'Store Name' in maple_df.columns and 'Store State' in maple_df.columns:
-                maple_df['SPOC_ID'] = maple_df.apply(
-                    lambda x: generate_spoc_id(x['Spoc Name'], x['Store Name'], x['Store State']) 
-                    if pd.notna(x['Spoc Name']) and pd.notna(x['Store Name']) and pd.notna(x['Store State']) else 'Unknown', 
-                    axis=1
-                )
-            if 'Spoc Name' in cashify_df.columns and 'Store Name' in cashify_df.columns and 'Store State' in cashify_df.columns:
-                cashify_df['SPOC_ID'] = cashify_df.apply(
-                    lambda x: generate_spoc_id(x['Spoc Name'], x['Store Name'], x['Store State']) 
-                    if pd.notna(x['Spoc Name']) and pd.notna(x['Store Name']) and pd.notna(x['Store State']) else 'Unknown', 
-                    axis=1
-                )
-            if 'Spoc Name' in spoc_df.columns and 'Store Name' in spoc_df.columns and 'Store State' in spoc_df.columns:
-                spoc_df['SPOC_ID'] = spoc_df.apply(
-                    lambda x: generate_spoc_id(x['Spoc Name'], x['Store Name'], x['Store State']) 
-                    if pd.notna(x['Spoc Name']) and pd.notna(x['Store Name']) and pd.notna(x['Store State']) else 'Unknown', 
-                    axis=1
-                )
+            column_mappings = {'Maple': maple_mapping, 'Cashify': cashify_mapping, 'SPOC': spoc_mapping}
+            cache_key = get_preprocessing_cache_key(column_mappings)
+            base_key = get_ingest_base_key(column_mappings)
+            sources = {'Maple': maple_signatures, 'Cashify': cashify_signatures, 'SPOC': spoc_signatures}
+            try:
+                maple_dataset, cashify_dataset, spoc_df = load_preprocessed_datasets(cache_key, base_key, sources, column_mappings)
+            except Exception as e:
+                st.error(f"Error processing data: {str(e)}. Please check the files at {BASE_PATH}.")
+                st.stop()
+
+    if QUERY_BACKEND == "sqlite":
+        get_query_database(cache_key, (maple_dataset, cashify_dataset), spoc_df)
+    cube = get_tradein_cube(cache_key)
+    target_achievement = get_target_achievement(cache_key, maple_dataset, spoc_df)
+
+    footprint_status = st.sidebar.empty()
+    show_dataset_footprint(footprint_status, (maple_dataset, cashify_dataset), (cube, target_achievement, spoc_df))
+    st.sidebar.caption(f"Trade-in cube: {len(cube):,} cells from {int(cube['Count'].sum()):,} rows")
+    ingest_state = load_ingest_state()
+    if ingest_state.get('cache_key') == cache_key:
+        last_ingest = ingest_state['last_ingest']
+        action = "appended" if last_ingest['mode'] == 'append' else "full rebuild of"
+        st.sidebar.caption(f"Last ingest ({last_ingest['at']}): {action} {last_ingest['maple']:,} Maple and {last_ingest['cashify']:,} Cashify rows")
+        if 'memory' in last_ingest:
+            memory = ", ".join(
+                f"{name.title()} {before / 1024 ** 2:.1f} → {after / 1024 ** 2:.1f} MB"
+                for name, (before, after) in last_ingest['memory'].items()
+            )
+            st.sidebar.caption(f"Ingested rows after dtype compaction: {memory}")
+    review_store_aliases()
+    edit_product_category_rules()
+
+    section_cache_status = st.sidebar.empty()
 
     # Navigation
     page = st.sidebar.radio("Select Page", ["Base Analysis", "Advanced Analytics"])
 
     if page == "Base Analysis":
-        base_analysis(maple_df, cashify_df, spoc_df)
+        base_analysis(maple_dataset, cashify_dataset, spoc_df, cube, target_achievement, cache_key)
     elif page == "Advanced Analytics":
-        advanced_analytics(maple_df, cashify_df, spoc_df)
+        advanced_analytics(maple_dataset, cashify_dataset, spoc_df, cube, target_achievement, cache_key)
+
+    # Measured again after the sections ran so windows and results loaded on this rerun are included
+    show_dataset_footprint(footprint_status, (maple_dataset, cashify_dataset), (cube, target_achievement, spoc_df))
+    stats = get_section_cache_stats()
+    section_cache_status.caption(
+        f"Section cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+        f"{stats['entries']} results in {stats['bytes'] / 1024 ** 2:.1f} of {SECTION_CACHE_BUDGET_MB} MB"
+    )
 
-def base_analysis(maple_df, cashify_df, spoc_df):
+def base_analysis(maple_dataset, cashify_dataset, spoc_df, cube, target_achievement, cache_key):
     st.title("Maple vs Cashify Analytics Dashboard")
 
     st.header("Filters")
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        years = sorted(set(maple_df['Year'].dropna()) & set(cashify_df['Year'].dropna()))
+        years = sorted(set(cube.loc[cube['Source'] == 'Maple', 'Year'].dropna()) & set(cube.loc[cube['Source'] == 'Cashify', 'Year'].dropna()))
         years = [int(year) for year in years]
         selected_year = st.selectbox("Select Year", years if years else [2025], key="year_filter")
 
     with col2:
-        maple_months = set(maple_df['Month'].dropna())
-        cashify_months = set(cashify_df['Month'].dropna())
+        maple_months = set(cube.loc[cube['Source'] == 'Maple', 'Month'].dropna())
+        cashify_months = set(cube.loc[cube['Source'] == 'Cashify', 'Month'].dropna())
         common_months = sorted(maple_months & cashify_months)
         selected_month = st.selectbox("Select Month", ["All"] + common_months, key="month_filter")
 
     with col3:
         if selected_month != "All":
-            days = []
-            if not maple_df.empty and 'Created Date' in maple_df.columns:
-                maple_days = maple_df[maple_df['Month'] == selected_month]['Created Date'].dt.day.dropna()
-                days.extend(maple_days)
-            if not cashify_df.empty and 'Order Date' in cashify_df.columns:
-                cashify_days = cashify_df[cashify_df['Month'] == selected_month]['Order Date'].dt.day.dropna()
-                days.extend(cashify_days)
-            days = sorted(set(map(int, days)))
+            days = sorted(set(map(int, cube.loc[cube['Month'] == selected_month, 'Date'].dt.day.dropna())))
             selected_day = st.selectbox("Select Day", ["All"] + list(days), key="day_filter")
         else:
             selected_day = "All"
 
-    # Dynamically determine target column based on selected month
-    target_column = f"{selected_month} Target" if selected_month != "All" else "May Target"
-    if selected_month != "All" and target_column not in spoc_df.columns:
-        st.error(f"Target column '{target_column}' not found in SPOC data. Please ensure the SPOC Master Data Sheet includes this column.")
+    # Targets for the selected month, or every month of the year with Maple data for "All"
+    if selected_month != "All":
+        target_months = [(selected_month, selected_year)]
+    else:
+        target_months = [(month, selected_year) for month in sorted(set(cube.loc[(cube['Source'] == 'Maple') & (cube['Year'] == selected_year), 'Month'].dropna()))]
+    period_targets = filter_cube_months(target_achievement, target_months)
+    if selected_month != "All" and period_targets.empty:
+        st.error(f"Target column '{selected_month} Target' not found in SPOC data. Please ensure the SPOC Master Data Sheet includes this column.")
         st.stop()
 
-    # Define spoc_weekoffs
-    if 'Spoc Name' in spoc_df.columns and 'Weekoff Day' in spoc_df.columns and selected_month != "All":
-        spoc_weekoffs = {row['Spoc Name']: get_weekoffs(selected_year, selected_month, row['Weekoff Day']) for _, row in spoc_df.iterrows()}
-    else:
+    if 'Spoc Name' not in spoc_df.columns or 'Weekoff Day' not in spoc_df.columns or selected_month == "All":
         st.warning("Spoc Name, Weekoff Day, or specific month selection missing in SPOC data. Weekoff analysis will be skipped.")
-        spoc_weekoffs = {}
 
-    maple_filtered = filter_by_date(maple_df, selected_year, selected_month, selected_day)
-    cashify_filtered = filter_by_date(cashify_df, selected_year, selected_month, selected_day, is_maple=False)
+    maple_filtered = filter_by_date(maple_dataset, selected_year, selected_month, selected_day)
+    cashify_filtered = filter_by_date(cashify_dataset, selected_year, selected_month, selected_day, is_maple=False)
 
     if maple_filtered.empty or cashify_filtered.empty:
         st.warning("No data available after applying filters. Please check your data or adjust the filters.")
         st.stop()
 
-    # Apply product category standardization
-    maple_filtered['Product Category'] = maple_filtered['Product Type'].apply(categorize_product_type)
-    cashify_filtered['Product Category'] = cashify_filtered['Product Type'].apply(categorize_product_type)
-
-    # 1. Average Devices Acquired
-    st.header("1. Average Devices Acquired")
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader("Maple")
-        maple_daily = maple_filtered.groupby(maple_filtered['Created Date'].dt.date).size().mean() if not maple_filtered.empty else 0
-        maple_weekly = maple_filtered.groupby(maple_filtered['Created Date'].dt.isocalendar().week).size().mean() if not maple_filtered.empty else 0
-        maple_monthly = len(maple_filtered) if selected_month != "All" else 0
-        maple_south = maple_filtered[maple_filtered['Zone'] == 'South']
-        maple_west = maple_filtered[maple_filtered['Zone'] == 'West']
-        st.write(f"Daily Avg: {maple_daily:.2f}")
-        st.write(f"Weekly Avg: {maple_weekly:.2f}")
-        st.write(f"Monthly Total: {maple_monthly}")
-        st.write(f"South Zone Total: {len(maple_south)}")
-        st.write(f"West Zone Total: {len(maple_west)}")
-
-
-    with col2:
-        st.subheader("Cashify")
-    
-        # Calculate daily average
-        cashify_daily = cashify_filtered.groupby(cashify_filtered['Order Date'].dt.date).size().mean() if not cashify_filtered.empty else 0
-    
-        # Calculate weekly average
-        cashify_weekly = cashify_filtered.groupby(cashify_filtered['Order Date'].dt.isocalendar().week).size().mean() if not cashify_filtered.empty else 0
-    
-    # Calculate monthly total (only if specific month is selected)
-        cashify_monthly = len(cashify_filtered) if selected_month != "All" else 0
-    
-    # Calculate zone totals - with improved filtering
-    # First check what zone column exists in the data
-        zone_col = 'Zone' if 'Zone' in cashify_filtered.columns else 'Store Zone' if 'Store Zone' in cashify_filtered.columns else None
-    
-        if zone_col:
-            # Clean zone names by stripping whitespace and standardizing case
-            cashify_filtered[zone_col] = cashify_filtered[zone_col].str.strip().str.title()
-        
-            # Filter for South zone (handling different possible names)
-            south_zone_filters = [
-            cashify_filtered[zone_col].str.contains('South', case=False, na=False),
-            cashify_filtered[zone_col].str.contains('S Zone', case=False, na=False),
-            cashify_filtered[zone_col].str.contains('South Zone', case=False, na=False)
-            ]
-        
-            # Combine filters with OR condition
-            south_filter = pd.Series(False, index=cashify_filtered.index)
-            for f in south_zone_filters:
-                south_filter = south_filter | f
-        
-            cashify_south = cashify_filtered[south_filter]
-        
-            # Filter for West zone
-            west_zone_filters = [
-                cashify_filtered[zone_col].str.contains('West', case=False, na=False),
-                cashify_filtered[zone_col].str.contains('W Zone', case=False, na=False),
-                cashify_filtered[zone_col].str.contains('West Zone', case=False, na=False)
-            ]
-        
-            # Combine filters with OR condition
-            west_filter = pd.Series(False, index=cashify_filtered.index)
-            for f in west_zone_filters:
-                west_filter = west_filter | f
-        
-            cashify_west = cashify_filtered[west_filter]
-        else:
-            st.warning("Zone column not found in Cashify data")
-            cashify_south = pd.DataFrame()
-            cashify_west = pd.DataFrame()
-    
-            # Display the metrics
-        st.write(f"Daily Avg: {cashify_daily:.2f}")
-        st.write(f"Weekly Avg: {cashify_weekly:.2f}")
-        st.write(f"Monthly Total: {cashify_monthly}")
-        st.write(f"South Zone Total: {len(cashify_south)}")
-        st.write(f"West Zone Total: {len(cashify_west)}")
-
-    # Weekly Market Share Overview
-    st.header("1.1 Weekly Market Share Overview")
-    if selected_month != "All" and 'Zone' in maple_filtered.columns and 'Store State' in maple_filtered.columns:
-        weeks = get_weeks_in_month(selected_year, selected_month)
-        weekly_ms_data = []
-        south_states = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
-        for state in south_states:
-            for week_name, start_date, end_date in weeks:
-                maple_week = maple_filtered[
-                    (maple_filtered['Store State'] == state) &
-                    (maple_filtered['Created Date'].dt.date >= start_date) &
-                    (maple_filtered['Created Date'].dt.date <= end_date)
-                ]
-                cashify_week = cashify_filtered[
-                    (cashify_filtered['Store State'] == state) &
-                    (cashify_filtered['Order Date'].dt.date >= start_date) &
-                    (cashify_filtered['Order Date'].dt.date <= end_date)
-                ]
-                maple_count = len(maple_week)
-                total_count = maple_count + len(cashify_week)
-                ms = calculate_market_share(maple_count, total_count)
-                weekly_ms_data.append({
-                    'Store State': state,
-                    'Week': week_name,
-                    'Market Share (%)': round(ms, 2)
-                })
-        
-        weekly_ms_df = pd.DataFrame(weekly_ms_data)
-        if not weekly_ms_df.empty:
-            weekly_ms_pivot = weekly_ms_df.pivot(index='Store State', columns='Week', values='Market Share (%)').fillna(0)
-            st.write("**Weekly Market Share by State:**")
-            st.dataframe(weekly_ms_pivot)
-            
-            st.download_button(
-                label="Download Weekly Market Share as Excel",
-                data=create_excel_buffer(weekly_ms_pivot.reset_index(), 'Weekly Market Share'),
-                file_name="weekly_market_share.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        else:
-            st.warning("No data available for weekly market share analysis.")
-    else:
-        st.warning("Please select a specific month for weekly market share analysis.")
-
-    # 2. Monthly Market Share Overview for South Zone
-    st.header("2. Monthly Market Share Overview for South Zone")
-    if 'Zone' in maple_df.columns and 'Store State' in maple_df.columns and 'Month' in maple_df.columns:
-        south_states = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
-        if selected_month != "All":
-            last_n_months = get_last_n_months(selected_month, selected_year, 3)
-            monthly_ms_data = []
-            for month, year in last_n_months:
-                maple_ms = maple_df[
-                    (maple_df['Zone'] == 'South') &
-                    (maple_df['Store State'].isin(south_states)) &
-                    (maple_df['Month'] == month) &
-                    (maple_df['Year'] == year)
-                ].groupby(['Store State']).size().reset_index(name='Maple Count')
-                cashify_ms = cashify_df[
-                    (cashify_df['Zone'] == 'South') &
-                    (cashify_df['Store State'].isin(south_states)) &
-                    (cashify_df['Month'] == month) &
-                    (cashify_df['Year'] == year)
-                ].groupby(['Store State']).size().reset_index(name='Cashify Count')
-                
-                monthly_ms = pd.merge(
-                    maple_ms,
-                    cashify_ms,
-                    on=['Store State'],
-                    how='outer'
-                ).fillna({'Maple Count': 0, 'Cashify Count': 0})
-                monthly_ms['Total Trade-ins'] = monthly_ms['Maple Count'] + monthly_ms['Cashify Count']
-                monthly_ms['Market Share (%)'] = monthly_ms.apply(
-                    lambda row: calculate_market_share(row['Maple Count'], row['Total Trade-ins']), axis=1
-                ).round(2)
-                monthly_ms['Month'] = month
-                monthly_ms_data.append(monthly_ms[['Store State', 'Month', 'Market Share (%)']])
-            
-            monthly_ms_df = pd.concat(monthly_ms_data, ignore_index=True)
-            monthly_ms_pivot = monthly_ms_df.pivot(index='Store State', columns='Month', values='Market Share (%)').fillna(0)
-            
-            st.write("**Monthly Market Share by State:**")
-            st.dataframe(monthly_ms_pivot)
-            
-            fig_ms = px.bar(
-                monthly_ms_df,
-                x='Store State',
-                y='Market Share (%)',
-                color='Month',
-                title=f"Monthly Market Share by South Zone States (Current and Last 3 Months)",
-                text='Market Share (%)',
-                height=600,
-                barmode='group'
-            )
-            fig_ms.update_traces(texttemplate='%{text:.1f}', textposition='auto', textfont=dict(size=14, weight='bold'))
-            fig_ms.update_layout(
-                showlegend=True,
-                xaxis_tickangle=45,
-                margin=dict(t=150)
-            )
-            st.plotly_chart(fig_ms, use_container_width=True)
-            
-            st.download_button(
-                label="Download Monthly Market Share as Excel",
-                data=create_excel_buffer(monthly_ms_pivot.reset_index(), 'Monthly Market Share'),
-                file_name="monthly_market_share.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        else:
-            st.warning("Please select a specific month to view current and last 3 months' market share.")
-    else:
-        st.warning("Required columns (Zone, Store State, Month) missing for monthly market share analysis.")
-
-    # 2.1 Overall Market Share of South Zone (>50%)
-    st.header("2.1 Overall Market Share of South Zone (>50%)")
-    south_market_data = []
-    south_zone = "South"
-    south_states = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
-    state_dropdown = st.selectbox("Select South Zone State", south_states, key="state_select_2_1")
-    if south_zone in set(maple_filtered['Zone'].dropna()) if 'Zone' in maple_filtered.columns else []:
-        south_stores = maple_filtered[maple_filtered['Zone'] == south_zone]['Store Name'].unique()
-        last_n_months = get_last_n_months(selected_month, selected_year, 2) if selected_month != "All" else [(selected_month, selected_year)]
-        last_n_months = [(selected_month, selected_year)] + last_n_months
-        for month, year in last_n_months:
-            maple_ms = maple_df[
-                (maple_df['Zone'] == south_zone) &
-                (maple_df['Store State'] == state_dropdown) &
-                (maple_df['Month'] == month) &
-                (maple_df['Year'] == year)
-            ]
-            cashify_ms = cashify_df[
-                (cashify_df['Zone'] == south_zone) &
-                (cashify_df['Store State'] == state_dropdown) &
-                (cashify_df['Month'] == month) &
-                (cashify_df['Year'] == year)
-            ]
-            if maple_ms.empty:
-                logging.info(f"No Maple data for South Zone in {month} {year}. Skipping.")
-                continue
-            valid_stores = maple_ms['Store Name'].unique()
-            for store in south_stores:
-                if store not in valid_stores:
-                    continue
-                store_spocs = maple_ms[maple_ms['Store Name'] == store]['Spoc Name'].unique() if 'Spoc Name' in maple_ms.columns else ["No Spoc"]
-                store_state = maple_ms[maple_ms['Store Name'] == store]['Store State'].iloc[0] if not maple_ms[maple_ms['Store Name'] == store].empty and 'Store State' in maple_ms.columns else "Unknown"
-                for store_spoc in store_spocs:
-                    maple_count = len(maple_ms[(maple_ms['Store Name'] == store) & (maple_ms['Spoc Name'] == store_spoc)]) if store_spoc != "No Spoc" else len(maple_ms[maple_ms['Store Name'] == store])
-                    total_count = maple_count + len(cashify_ms[cashify_ms['Store Name'] == store])
-                    ms = calculate_market_share(maple_count, total_count)
-                    if ms > 50:
-                        south_market_data.append({
-                            'Zone': south_zone,
-                            'Store State': store_state,
-                            'Store Name': store,
-                            'Spoc Name': store_spoc,
-                            'Month': month,
-                            'Market Share (%)': round(ms, 2)
-                        })
-    
-    if south_market_data:
-        south_ms_df = pd.DataFrame(south_market_data)
-        south_ms_df['Store_SPOC'] = south_ms_df['Store Name'] + ' (' + south_ms_df['Spoc Name'] + ')'
-        fig_south_ms = px.bar(
-            south_ms_df,
-            x='Store_SPOC',
-            y='Market Share (%)',
-            color='Month',
-            text='Market Share (%)',
-            title=f"Market Share (>50%) in {state_dropdown} by Store and SPOC",
-            height=600,
-            barmode='group'
-        )
-        fig_south_ms.update_traces(texttemplate='%{text:.1f}%', textposition='auto')
-        fig_south_ms.update_layout(
-            showlegend=True,
-            xaxis_title="Store Name (SPOC)",
-            xaxis_tickangle=45
-        )
-        st.plotly_chart(fig_south_ms, use_container_width=True)
-    else:
-        st.write(f"No data available for {state_dropdown} with market share above 50%.")
-
-    # 2.2 Zone-wise Market Share
-    st.header("2.2 Zone-wise Market Share")
-    if selected_month != "All":
-        last_n_months = get_last_n_months(selected_month, selected_year, 4)
-        zone_market_data = []
-        all_zones = sorted(set(maple_df['Zone'].dropna())) if 'Zone' in maple_df.columns else ['Unknown']
-        for month, year in last_n_months:
-            for zn in all_zones:
-                if zn in ['South', 'West']:
-                    zone_maple = len(maple_df[(maple_df['Zone'] == zn) & (maple_df['Month'] == month) & (maple_df['Year'] == year)])
-                    zone_total = zone_maple + len(cashify_df[(cashify_df['Zone'] == zn) & (cashify_df['Month'] == month) & (cashify_df['Year'] == year)]) if 'Zone' in cashify_df.columns else 0
-                    zone_ms = calculate_market_share(zone_maple, zone_total)
-                    zone_market_data.append({
-                        'Zone': zn,
-                        'Month': month,
-                        'Market Share (%)': round(zone_ms, 2)
-                    })
-        
-        if zone_market_data:
-            zone_ms_df = pd.DataFrame(zone_market_data)
-            zone_ms_pivot = zone_ms_df.pivot(index='Zone', columns='Month', values='Market Share (%)').fillna(0)
-            st.write("**Market Share by Zone (South and West):**")
-            st.dataframe(zone_ms_df)
-            
-            fig_zone_ms = px.bar(
-                zone_ms_df,
-                x='Zone',
-                y='Market Share (%)',
-                color='Month',
-                text='Market Share (%)',
-                title=f"Zone-wise Market Share (Current and Last Month)",
-                barmode='group'
-            )
-            fig_zone_ms.update_traces(texttemplate='%{text:.1f}', textposition='auto')
-            fig_zone_ms.update_layout(showlegend=True)
-            st.plotly_chart(fig_zone_ms, use_container_width=True)
-        else:
-            st.write("No zone-wise market share data available.")
-    else:
-        st.write("Please select a specific month to view current and last 3 months.")
-
-    # 2.3 Low Market Share Stores
-    st.header("2.3 Stores with Market Share Below 50% in Selected Zone")
-    zones = sorted(set(maple_df['Zone'].dropna())) if 'Zone' in maple_df.columns else ['Unknown']
-    zone = st.selectbox("Select Zone", zones, key="zone_select_2_3")
-    stores_in_zone = maple_filtered[maple_filtered['Zone'] == zone]['Store Name'].unique() if 'Zone' in maple_filtered.columns else []
-    low_market_data = []
-    
-    for store in stores_in_zone:
-        store_spocs = maple_filtered[maple_filtered['Store Name'] == store]['Spoc Name'].unique() if 'Spoc Name' in maple_filtered.columns else ["No Spoc"]
-        for store_spoc in store_spocs:
-            maple_count = len(maple_filtered[(maple_filtered['Store Name'] == store) & (maple_filtered['Spoc Name'] == store_spoc)]) if store_spoc != "No Spoc" else len(maple_filtered[maple_filtered['Store Name'] == store])
-            total_count = maple_count + len(cashify_filtered[cashify_filtered['Store Name'] == store])
-            ms = calculate_market_share(maple_count, total_count)
-            if ms < 50:
-                low_market_data.append({
-                    'Store Name': store,
-                    'Spoc Name': store_spoc,
-                    'Maple Devices': maple_count,
-                    'Market Share (%)': ms
-                })
-    
-    if low_market_data:
-        low_ms_df = pd.DataFrame(low_market_data)
-        st.write("**Stores with Market Share Below 50%**")
-        st.dataframe(low_ms_df)
-
-        fig = px.bar(
-            low_ms_df,
-            x='Market Share (%)',
-            y='Store Name',
-            color='Spoc Name',
-            text='Maple Devices',
-            title=f"Stores in {zone} with Market Share Below 50%",
-            orientation='h'
-        )
-        fig.update_traces(textposition='inside')
-        st.plotly_chart(fig)
-
-        st.download_button(
-            label="Download Low Market Share Stores as Excel",
-            data=create_excel_buffer(low_ms_df, 'Low Market Share Stores'),
-            file_name="low_ms_stores.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    else:
-        st.write(f"No stores in {zone} have a market share below 50%.")
-
-    # 2.4 State-wise Device Counts and Top Performer SPOCs
-    st.header("2.4 State-wise Device Counts and Top Performer SPOCs")
-    south_states = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
-    if 'Store State' in maple_filtered.columns and 'Store State' in cashify_filtered.columns:
-        st.write("**Device Counts per State (South Zone)**")
-        maple_state_counts = maple_filtered[maple_filtered['Store State'].isin(south_states)].groupby('Store State').size().reset_index(name='Maple Device Count')
-        cashify_state_counts = cashify_filtered[cashify_filtered['Store State'].isin(south_states)].groupby('Store State').size().reset_index(name='Cashify Device Count')
-        state_counts = pd.merge(maple_state_counts, cashify_state_counts, on='Store State', how='outer').fillna(0)
-        state_counts_melted = pd.melt(
-            state_counts,
-            id_vars=['Store State'],
-            value_vars=['Maple Device Count', 'Cashify Device Count'],
-            var_name='Source',
-            value_name='Device Count'
-        )
-
-        logging.info(f"State-wise Device Counts: {state_counts[['Store State', 'Maple Device Count', 'Cashify Device Count']].to_dict('records')}")
-
-        if not state_counts_melted.empty:
-            fig_state = px.bar(
-                state_counts_melted,
-                x='Store State',
-                y='Device Count',
-                color='Source',
-                text='Device Count',
-                title=f"Device Counts per State (South Zone, Year: {selected_year}, Month: {selected_month})",
-                barmode='group',
-                color_discrete_map={'Maple Device Count': '#636EFA', 'Cashify Device Count': '#EF553B'}
-            )
-            fig_state.update_traces(texttemplate='%{text:.0f}', textposition='auto')
-            fig_state.update_layout(showlegend=True)
-            st.plotly_chart(fig_state, use_container_width=True)
-        else:
-            st.write("No device data available for state-wise analysis in South Zone.")
-    
-    # Top Performer SPOCs
-    #st.write("**Top Performing SPOCs (Target Achievement >50%)**")
-    #if 'Spoc Name' in maple_filtered.columns and all(col in spoc_df.columns for col in ['Spoc Name', 'Store State', 'Store Name']):
-        #last_n_months = get_last_n_months(selected_month, selected_year, 2) if selected_month != "All" else [(selected_month, selected_year)]
-        #spoc_achievements = []
-        #for month, year in last_n_months:
-         #  temp_maple = maple_df[(maple_df['Month'] == month) & (maple_df['Year'] == year) & (maple_df['Store State'].isin(south_states))]
-            #temp_ach = temp_maple.groupby(['Spoc Name', 'Store Name', 'Month']).size().reset_index(name='Achievement')
-            #temp_ach['Year'] = year
-            #spoc_achievements.append(temp_ach)
-        #spoc_achievements = pd.concat(spoc_achievements, ignore_index=True)
-        
-        #target_columns = [col for col in spoc_df.columns if col.endswith('Target')]
-        #spoc_targets = spoc_df[['Spoc Name', 'Store Name', 'Store State'] + target_columns]
-        #top_spoc_df = pd.merge(
-        #   spoc_achievements,
-        #   spoc_targets,
-        #   on=['Spoc Name', 'Store Name'],
-        #   how='inner'
-        #)
-        #top_spoc_df = top_spoc_df[top_spoc_df['Store State'].isin(south_states)]
-        
-        #for month in ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']:
-            #target_col = f"{month} Target"
-            #if target_col in top_spoc_df.columns:
-                #top_spoc_df[f'% {month} Target Achieved'] = top_spoc_df.apply(
-                #   lambda x: calculate_target_achievement(x['Achievement'], x[target_col]) if x['Month'] == month and pd.notna(x[target_col]) else pd.NA, axis=1
-                #).round(2)
-
-        #top_spoc_df = top_spoc_df[top_spoc_df['Month'].isin(['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'])]
-        #)
-
-        # Split into two groups: 50-75% and >75%
-        #spoc_50_75 = top_spoc_df[top_spoc_df[f'% {selected_month} Target Achieved'].between(50, 75)]
-        #spoc_above_75 = top_spoc_df[top_spoc_df[f'% {selected_month} Target Achieved'] > 75]
-        
-        #display_cols = ['Spoc Name', 'Store State', 'Store Name', 'Month', 'Achievement'] + [col for col in top_spoc_df.columns if col.endswith('Target') or col.startswith('%')]
-        
-        # Display 50-75%
-        #if not spoc_50_75.empty:
-            #st.subheader("SPOCs with Target Achievement 50-75%")
-            #st.dataframe(spoc_50_75[display_cols])
-
-            #spoc_50_75['Spoc_Display'] = spoc_50_75['Spoc Name'] + ' (' + spoc_50_75['Store State'] + ')'
-            #fig_spoc_50_75 = px.bar(
-            #    spoc_50_75,
-                #x='Spoc_Display',
-                #y=f'% {selected_month} Target Achieved',
-                #color='Month',
-                #text=f'% {selected_month} Target Achieved',
-                #title=f"SPOCs with 50-75% Target Achievement (South Zone)",
-                #height=600
-            #)
-            #fig_spoc_50_75.update_traces(texttemplate='%{text:.1f}%', textposition='auto')
-            #fig_spoc_50_75.update_layout(xaxis_title="SPOC Name (State)", xaxis_tickangle=45, showlegend=True)
-            #st.plotly_chart(fig_spoc_50_75, use_container_width=True)
-        
-        # Display >75%
-        #if not spoc_above_75.empty:
-            #st.subheader("SPOCs with Target Achievement >75%")
-            #st.dataframe(spoc_above_75[display_cols])
-            
-            #spoc_above_75['Spoc_Display'] = spoc_above_75['Spoc Name'] + ' (' + spoc_above_75['Store State'] + ')'
-            #fig_spoc_above_75 = px.bar(
-            #   spoc_above_75,
-            #    x='Spoc_Display',
-            #    y=f'% {selected_month} Target Achieved',
-            #    color='Month',
-            #    text=f'% {selected_month} Target Achieved',
-                #title=f"SPOCs with >75% Target Achievement (South Zone)",
-                #height=600
-            #)
-            #fig_spoc_above_75.update_traces(texttemplate='%{text:.1f}%', textposition='auto')
-            #fig_spoc_above_75.update_layout(xaxis_title="SPOC Name (State)", xaxis_tickangle=45, showlegend=True)
-            #st.plotly_chart(fig_spoc_above_75, use_container_width=True)
-
-            #st.download_button(
-            #    label="Download Top Performing SPOCs as Excel",
-            #    data=create_excel_buffer(spoc_above_75[display_cols], 'Top SPOCs'),
-            #    file_name="top_spocs.xlsx",
-            #    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            #)
-        #else:
-            #st.write("No SPOCs have target achievement above 50% for the selected period.")
-    #else:
-        #st.warning("Required columns missing for SPOC performance analysis (Spoc Name, Store State, or Target columns).")
-
-    # 2.5 Market Share Analysis
-    st.header("2.5 Market Share Analysis")
-    zones = sorted(set(maple_df['Zone'].dropna())) if 'Zone' in maple_df.columns else ['Unknown']
-    zone = st.selectbox("Select Zone", zones, key="zone_select_2_5")
-    store_states = sorted(set(maple_df[maple_df['Zone'] == zone]['Store State'].dropna()) | {'Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry'}) if 'Zone' in maple_df.columns else ['Unknown']
-    if not store_states:
-        store_states = sorted(set(spoc_df['Store State'].dropna()) | {'Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry'}) if 'Store State' in spoc_df.columns else ['Unknown']
-    store_state = st.selectbox("Select Store State", store_states, key="state_select_2_5")
-    store_names = sorted(set(maple_filtered[maple_filtered['Store State'] == store_state]['Store Name'].dropna()))
-    if not store_names:
-        st.warning("No store names available for the selected store state.")
-        st.stop()
-    store_name = st.selectbox("Select Store Name", store_names, key="store_select_2_5")
-    spocs = sorted(set(maple_filtered[maple_filtered['Store Name'] == store_name]['Spoc Name'].dropna())) if 'Spoc Name' in maple_filtered.columns else []
-    if not spocs:
-        st.info("No SPOCs available for the selected store. Using store-level data.")
-        spoc = "No Spoc"
-    else:
-        spoc = st.selectbox("Select SPOC", spocs, key="spoc_select_2_5")
-
-    if spoc == "No Spoc":
-        spoc_achievement = len(maple_filtered[maple_filtered['Store Name'] == store_name])
-        total_trades = spoc_achievement + len(cashify_filtered[cashify_filtered['Store Name'] == store_name])
-        cashify_count = len(cashify_filtered[(cashify_filtered['Store State'] == store_state) & (cashify_filtered['Store Name'] == store_name)])
-    else:
-        spoc_achievement = len(maple_filtered[(maple_filtered['Store Name'] == store_name) & (maple_filtered['Spoc Name'] == spoc)])
-        total_trades = spoc_achievement + len(cashify_filtered[cashify_filtered['Store Name'] == store_name])
-        cashify_count = len(cashify_filtered[(cashify_filtered['Store State'] == store_state) & (cashify_filtered['Store Name'] == store_name)])
-
-    market_share = calculate_market_share(spoc_achievement, total_trades)
-    target = spoc_df[spoc_df['Spoc Name'] == spoc][target_column].iloc[0] if spoc != "No Spoc" and not spoc_df[spoc_df['Spoc Name'] == spoc].empty and target_column in spoc_df.columns else 0
-    target_achievement_percent = calculate_target_achievement(spoc_achievement, target)
-    shortfall = target - spoc_achievement
-
-    st.write(f"Market Share: {market_share:.2f}%")
-    st.markdown(f"SPOC Target ({selected_month}): {target}")
-    st.write(f"SPOC Achievement: {spoc_achievement}")
-    st.write(f"Target Achieved MTD: {target_achievement_percent:.2f}%")
-    st.markdown(f"SPOC Shortfall: {shortfall}")
-    st.write(f"Total Trade-ins at Store (Maple + Cashify): {total_trades}")
-    st.write(f"Total Trade-ins in Cashify (Selected State and Store): {cashify_count}")
-
-    # 3. SPOC Performance in Selected Month
-    st.header("3. SPOC Performance in Selected Month")
-    if selected_month != "All" and 'Spoc Name' in maple_filtered.columns:
-        st.subheader(f"{spoc}'s Performance in {selected_month} {selected_year}")
-        spoc_count = len(maple_filtered[maple_filtered['Spoc Name'] == spoc]) if spoc != 'No Spoc' else 0
-        st.write(f"Devices Acquired: {spoc_count}")
-
-        last_n_months = get_last_n_months(selected_month, selected_year, 2)
-        spoc_perf_data = []
-        for month, year in last_n_months:
-            temp_maple = maple_df[(maple_df['Month'] == month) & (maple_df['Year'] == year)]
-            if spoc != 'No Spoc':
-                spoc_cat = temp_maple[temp_maple['Spoc Name'] == spoc].groupby('Product Category').size().reset_index(name='Count')
-            else:
-                spoc_cat = temp_maple[temp_maple['Store Name'] == store_name].groupby('Product Category').size().reset_index(name='Count')
-            spoc_cat['Month'] = month
-            spoc_perf_data.append(spoc_cat)
-
-        if spoc_perf_data:
-            spoc_perf_df = pd.concat(spoc_perf_data, ignore_index=True)
-            valid_categories = ['Mobile Phone', 'Laptop', 'Tablet', 'SmartWatch (Apple)', 'SmartWatch (Android)']
-            spoc_perf_df = spoc_perf_df[spoc_perf_df['Product Category'].isin(valid_categories)]
-            
-            if not spoc_perf_df.empty:
-                fig_spoc_perf = px.bar(
-                    spoc_perf_df,
-                    x='Product Category',
-                    y='Count',
-                    color='Month',
-                    text='Count',
-                    title=f"{spoc}'s Devices Acquired by Category (Current and Last Month)",
-                    barmode='group'
-                )
-                fig_spoc_perf.update_traces(texttemplate='%{text:.0f}', textposition='auto')
-                fig_spoc_perf.update_layout(showlegend=True)
-                st.plotly_chart(fig_spoc_perf)
-            else:
-                st.write("No spoc-wise performance data available for spoc.")
-        else:
-            st.write("No performance data available for spoc.")
-    else:
-        st.write("Please select a specific month to view spoc performance.")
-
-    # 4. Category-wise Contribution in Selected Zone
-    st.header("4. Category-wise Contribution in Selected Zone")
-
-    # First ensure we have proper product categorization
-    def categorize_products(df):
-        if 'Product Category' not in df.columns and 'Product Type' in df.columns:
-            df['Product Category'] = df['Product Type'].apply(categorize_product_type)
-        elif 'Product Category' not in df.columns:
-            df['Product Category'] = 'Other'
-        return df
-
-    # Apply categorization to both datasets
-    maple_filtered = categorize_products(maple_filtered)
-    cashify_filtered = categorize_products(cashify_filtered)
-
-    if 'Zone' not in maple_filtered.columns or 'Zone' not in cashify_filtered.columns:
-        st.error("Zone column missing in Maple or Cashify data. Please ensure it is mapped correctly.")
-    else:
-        maple_zone = maple_filtered[maple_filtered['Zone'] == zone] if zone in maple_filtered['Zone'].values else maple_filtered
-        cashify_zone = cashify_filtered[cashify_filtered['Zone'] == zone] if zone in cashify_filtered['Zone'].values else cashify_filtered
-    
-        if 'Product Category' not in maple_zone.columns or 'Product Category' not in cashify_zone.columns:
-            st.error("Product Category column missing in filtered data.")
-        else:
-            # Get counts by category
-            maple_cat = maple_zone.groupby('Product Category').size().reset_index(name='Maple Device Count')
-            cashify_cat = cashify_zone.groupby('Product Category').size().reset_index(name='Cashify Device Count')
-        
-            # Merge the counts
-            cat_df = pd.merge(maple_cat, cashify_cat, on='Product Category', how='outer').fillna(0)
-
-            if not cat_df.empty:
-                # Prepare data for visualization
-                cat_df_melted = pd.melt(
-                cat_df,
-                id_vars=['Product Category'],
-                value_vars=['Maple Device Count', 'Cashify Device Count'],
-                var_name='Source',
-                value_name='Device Count'
-                )
-                # Define our valid categories (including 'Other' for visualization)
-                valid_categories = ['Mobile Phone', 'Laptop', 'Tablet',
-                                    'SmartWatch (Apple)', 'SmartWatch (Android)', 'Other']
-
-                # Filter and sort categories
-                cat_df_melted = cat_df_melted[cat_df_melted['Product Category'].isin(valid_categories)]
-                cat_df_melted['Product Category'] = pd.Categorical(
-                    cat_df_melted['Product Category'],
-                    categories=valid_categories,
-                    ordered=True
-                    )
-                cat_df_melted = cat_df_melted.sort_values('Product Category')
-            
-                if not cat_df_melted.empty:
-                    # Create visualization
-                    fig = px.bar(
-                    cat_df_melted,
-                    x='Product Category',
-                    y='Device Count',
-                    color='Source',
-                    text='Device Count',
-                    title=f"Category-wise Device Counts in {zone} Zone",
-                    category_orders={"Product Category": valid_categories}
-                    )
-                    fig.update_traces(texttemplate='%{text:.0f}', textposition='auto')
-                    fig.update_layout(
-                    barmode='group', 
-                    showlegend=True,
-                    xaxis_title="Product Category",
-                    yaxis_title="Number of Devices"
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                    # Show raw data as well
-                    st.subheader("Detailed Category Breakdown")
-                    st.dataframe(cat_df.sort_values('Maple Device Count', ascending=False))
-                else:
-                    st.warning(f"No valid category data for {zone}. Available categories: {cat_df['Product Category'].unique().tolist()}")
-            else:
-                st.warning(f"No category data available for {zone} zone.")
-
-
-# Assuming these are defined earlier:
-# maple_filtered, cashify_filtered, spoc_df, spoc, spoc_weekoffs,
-# selected_month, selected_year, store_name, store_state
-# and helper function create_csv_buffer(), calculate_market_share()
-
-    def process_devices_lost_section(maple_filtered, cashify_filtered, spoc_df, selected_year, selected_month, selected_day):
-        st.header("5. Devices Lost on SPOC Weekoff Days at Their Store")
-    
-        if selected_month == "All":
-            st.warning("Please select a specific month for weekoff analysis")
-            return
-    
-        # Get SPOC weekoff days
-        spoc_weekoffs = {}
-        if 'Weekoff Day' in spoc_df.columns and 'Spoc Name' in spoc_df.columns:
-            for _, row in spoc_df.iterrows():
-                if pd.notna(row['Weekoff Day']) and row['Weekoff Day'] != "Vacant":
-                    spoc_weekoffs[row['Spoc Name']] = get_weekoffs(selected_year, selected_month, row['Weekoff Day'])
-    
-        if not spoc_weekoffs:
-            st.info("No weekoff data available in SPOC data")
-            return
-    
-        # Get SPOCs with weekoff data
-        spoc_list = list(spoc_weekoffs.keys())
-        if not spoc_list:
-            st.info("No SPOCs with weekoff days found")
-            return
-    
-        selected_spoc = st.selectbox("Select SPOC", spoc_list, key="spoc_weekoff_select")
-        weekoff_dates = spoc_weekoffs.get(selected_spoc, [])
-    
-        if not weekoff_dates:
-            st.info(f"No weekoff days for {selected_spoc} in {selected_month}")
-            return
-    
-        # Get stores for this SPOC
-        spoc_stores = spoc_df[spoc_df['Spoc Name'] == selected_spoc]['Store Name'].unique()
-        if not spoc_stores:
-            st.info(f"No stores found for SPOC {selected_spoc}")
-            return
-    
-        # Get Cashify devices lost on weekoff days
-        weekoff_dates_set = set([d if isinstance(d, date) else d.date() for d in weekoff_dates])
-        cashify_losses = cashify_filtered[
-            (cashify_filtered['Store Name'].isin(spoc_stores)) &
-            (cashify_filtered['Order Date'].dt.date.isin(weekoff_dates_set))
-        ]
-    
-        if cashify_losses.empty:
-            st.info(f"No devices lost on weekoff days for {selected_spoc}")
-            return
-    
-    # Group by store and product category
-        losses_by_store = cashify_losses.groupby(['Store Name', 'Product Category']).size().reset_index(name='Count')
-    
-        st.write(f"**Devices lost on {selected_spoc}'s weekoff days:**")
-        st.dataframe(losses_by_store)
-    
-        if not losses_by_store.empty:
-            fig = px.bar(
-            losses_by_store,
-            x='Store Name',
-            y='Count',
-            color='Product Category',
-            text='Count',
-            title=f"Devices Lost on {selected_spoc}'s Weekoff Days by Store",
-            barmode='group'
-            )
-            st.plotly_chart(fig, use_container_width=True)
-
-    def process_working_day_losses(maple_filtered, cashify_filtered, spoc_df, selected_year, selected_month):
-        st.header("6. Working Day Losses")
-    
-        if selected_month == "All":
-            st.warning("Please select a specific month for working day analysis")
-            return
-    
-            # Get SPOC weekoff days
-        spoc_weekoffs = {}
-        if 'Weekoff Day' in spoc_df.columns and 'Spoc Name' in spoc_df.columns:
-            for _, row in spoc_df.iterrows():
-                if pd.notna(row['Weekoff Day']) and row['Weekoff Day'] != "Vacant":
-                    spoc_weekoffs[row['Spoc Name']] = get_weekoffs(selected_year, selected_month, row['Weekoff Day'])
-
-        if not spoc_weekoffs:
-            st.info("No weekoff data available in SPOC data")
-            return
-    
-        spoc_list = list(spoc_weekoffs.keys())
-        if not spoc_list:
-            st.info("No SPOCs with weekoff days found")
-            return
-    
-        selected_spoc = st.selectbox("Select SPOC", spoc_list, key="spoc_working_select")
-        weekoff_dates = spoc_weekoffs.get(selected_spoc, [])
-    
-        if not weekoff_dates:
-            st.info(f"No weekoff days for {selected_spoc} in {selected_month}")
-            return
-    
-        # Get stores for this SPOC
-        spoc_stores = spoc_df[spoc_df['Spoc Name'] == selected_spoc]['Store Name'].unique()
-        if not spoc_stores:
-            st.info(f"No stores found for SPOC {selected_spoc}")
-            return
-    
-        # Get working days (all dates in month minus weekoff days)
-        month_num = {"January": 1, "February": 2, "March": 3, "April": 4, "May": 5, "June": 6,
-                 "July": 7, "August": 8, "September": 9, "October": 10, "November": 11, "December": 12}
-        first_day = date(selected_year, month_num[selected_month], 1)
-        last_day = (first_day + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-        all_dates = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
-        working_dates = [d for d in all_dates if d not in [wd.date() for wd in weekoff_dates]]
-    
-        # Get Cashify devices lost on working days
-        cashify_losses = cashify_filtered[
-            (cashify_filtered['Store Name'].isin(spoc_stores)) &
-        (cashify_filtered['Order Date'].dt.date.isin(working_dates))
-    ]
-    
-        if cashify_losses.empty:
-            st.info(f"No working day losses for {selected_spoc}")
-            return
-    
-        # Group by store and product category
-        losses_by_store = cashify_losses.groupby(['Store Name', 'Product Category']).size().reset_index(name='Count')
-    
-        st.write(f"**Working day losses for {selected_spoc}:**")
-        st.dataframe(losses_by_store)
+    cube_filtered = filter_cube(cube, selected_year, selected_month, selected_day)
+
+    # Only the selected section is computed on each rerun
+    section = st.radio("Select Section", BASE_SECTIONS, horizontal=True, key="base_section")
+
+    if section == "1. Average Devices Acquired":
+        process_device_averages(cache_key, cube_filtered, selected_year, selected_month, selected_day)
+    elif section == "1.1 Weekly Market Share":
+        process_weekly_market_share(cache_key, cube_filtered, selected_year, selected_month, selected_day)
+    elif section == "2. Monthly Market Share":
+        process_monthly_market_share(cache_key, cube, selected_year, selected_month)
+    elif section == "2.1 South Zone Market Share":
+        process_south_zone_market_share(cache_key, cube, cube_filtered, selected_year, selected_month, selected_day)
+    elif section == "2.2 Zone-wise Market Share":
+        process_zone_market_share(cache_key, cube, selected_year, selected_month)
+    elif section == "2.3 Low Market Share Stores":
+        process_low_market_share_stores(cache_key, cube, cube_filtered, selected_year, selected_month, selected_day)
+    elif section == "2.4 State-wise Device Counts":
+        process_state_device_counts(cache_key, cube_filtered, selected_year, selected_month, selected_day)
+    elif section == "2.5 Market Share Analysis":
+        process_market_share_analysis(cache_key, cube, maple_filtered, cashify_filtered, spoc_df, period_targets, selected_year, selected_month, selected_day)
+    elif section == "3. SPOC Performance":
+        process_spoc_performance(cache_key, cube, maple_dataset, maple_filtered, selected_year, selected_month, selected_day)
+    elif section == "4. Category-wise Contribution":
+        process_category_contribution(cache_key, cube, cube_filtered, selected_year, selected_month, selected_day)
+    elif section == "5. Weekoff Day Losses":
+        process_devices_lost_section(cache_key, cashify_filtered, spoc_df, selected_year, selected_month, selected_day)
+    elif section == "6. Working Day Losses":
+        process_working_day_losses(cache_key, cashify_filtered, spoc_df, selected_year, selected_month, selected_day)
+    elif section == "7. Trade-in Losses":
+        process_tradein_losses(cache_key, cashify_filtered, selected_year, selected_month, selected_day)
+    elif section == "8. Pricing Comparison":
+        process_pricing_comparison(cache_key, maple_filtered, cashify_filtered, selected_year, selected_month, selected_day)
+        process_price_distribution(cache_key)
+        process_model_pricing(cache_key)
+
+@st.fragment
+def process_spoc_profile(maple_dataset, spoc_df):
+    # 3. SPOC Performance Profile
+    st.header("3. SPOC Performance Profile")
+    if 'SPOC_ID' in spoc_df.columns:
+        spoc_list = spoc_df.sort_values('Spoc Name')[['Spoc Name', 'SPOC_ID']].dropna().drop_duplicates()
+        selected_spoc_id_adv = st.selectbox("Select SPOC", spoc_list['SPOC_ID'], format_func=lambda x: spoc_list[spoc_list['SPOC_ID']==x]['Spoc Name'].iloc[0], key="adv_spoc_select")
+        if selected_spoc_id_adv:
+            start_date_sep = pd.Timestamp('2024-09-01')
+            spoc_history = count_dataset_rows(maple_dataset, 'Created Date', ['Created Date'], start=start_date_sep, equals={'SPOC_ID': selected_spoc_id_adv})
+            st.metric(f"Total Trade-ins Since Sep '24", int(spoc_history['Count'].sum()))
+            if not spoc_history.empty:
+                monthly_perf = spoc_history.set_index('Created Date')['Count'].resample('ME').sum().reset_index()
+                monthly_perf.columns = ['Month', 'Count']
+                monthly_perf['Month'] = monthly_perf['Month'].dt.strftime('%b %Y')
+                fig_spoc_hist = px.bar(monthly_perf, x='Month', y='Count', text_auto=True, title="Monthly Trade-in Performance")
+                st.plotly_chart(fig_spoc_hist)
     
-        if not losses_by_store.empty:
-            fig = px.bar(
-            losses_by_store,
-            x='Store Name',
-            y='Count',
-            color='Product Category',
-            text='Count',
-            title=f"Working Day Losses for {selected_spoc} by Store",
-            barmode='group'
-            )
-            st.plotly_chart(fig, use_container_width=True)
 
-    def process_tradein_losses(cashify_filtered, selected_year, selected_month):
-        st.header("7. Trade-ins Lost to Cashify by State and Store")
-    
-        if selected_month == "All":
-            st.warning("Please select a specific month for trade-in analysis")
-            return
-    
-        # Filter for south states and completed orders
-        south_states = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
-        status_filter = cashify_filtered['Order Status'] == 'Completed' if 'Order Status' in cashify_filtered.columns else pd.Series([True] * len(cashify_filtered))
-    
-        tradein_losses = cashify_filtered[
-            (cashify_filtered['Store State'].isin(south_states)) &
-            (cashify_filtered['Month'] == selected_month) &
-            (cashify_filtered['Year'] == selected_year) &
-            status_filter
-        ]
-    
-        if tradein_losses.empty:
-            st.info("No trade-in losses data available for selected period")
-            return
-    
-    # Enhanced product categorization
-        tradein_losses['Product Category'] = tradein_losses['Product Type'].apply(categorize_product_type)
-    
-    # Create detailed table
-        st.subheader("Detailed Trade-in Losses by State, Store and SPOC")
-    
-    # Get required columns (check if they exist first)
-        required_cols = ['Store State', 'Store Name', 'Spoc Name', 'Product Category', 
-                    'Product Type', 'Old Device Name', 'Initial Device Amount']
-        available_cols = [col for col in required_cols if col in tradein_losses.columns]
-    
-        if not available_cols:
-            st.error("Required columns not found in Cashify data")
-            return
-    
-        detailed_losses = tradein_losses[available_cols].copy()
-    
-    # Add count column
-        detailed_losses['Count'] = 1
-    
-    # Create pivot table for visualization
-        pivot_data = detailed_losses.groupby(['Store State', 'Store Name', 'Spoc Name', 'Product Category']).agg({
-        'Count': 'sum',
-        'Initial Device Amount': 'mean'
-        }).reset_index()
-    
-    # Display the detailed data
-        st.dataframe(detailed_losses)
+@st.fragment
+def process_store_productivity(maple_cube):
+    # 5. Highest Productive Stores
+    st.header("5. Highest Productive Stores (Last 6 Months)")
+    last_6_months = get_last_n_months_for_page(6)
     
-    # Visualization 1: State-wise losses
-        st.subheader("Trade-in Losses by State")
-        state_losses = detailed_losses.groupby('Store State')['Count'].sum().reset_index()
-        fig_state = px.bar(
-        state_losses,
-        x='Store State',
-        y='Count',
-        text='Count',
-        title=f"Total Trade-ins Lost to Cashify by State ({selected_month} {selected_year})",
-        color='Store State'
-        )
-        st.plotly_chart(fig_state, use_container_width=True)
+    # Add zone filter
+    zone_filter = st.selectbox("Select Zone for Store Productivity", ['South', 'West'], key="store_prod_zone")
     
-    # Visualization 2: Store-wise losses within each state
-        st.subheader("Trade-in Losses by Store (Within Each State)")
+    maple_last_6m = maple_cube[
+        (maple_cube['Zone'] == zone_filter) &
+        (maple_cube['Month'].isin([m[0] for m in last_6_months])) &
+        (maple_cube['Year'].isin([m[1] for m in last_6_months]))
+    ]
     
-    # Create a selectbox to choose state
-        selected_state = st.selectbox(
-        "Select State to View Store-wise Losses",
-            sorted(detailed_losses['Store State'].unique()),
-            key="state_select_tradein"
+    if not maple_last_6m.empty:
+        # Get top 6 stores in the selected zone
+        top_6_stores = maple_last_6m.groupby('Store Name', observed=True)['Count'].sum().nlargest(6).index
+
+        # Prepare data for visualization
+        top_stores_monthly = maple_last_6m[maple_last_6m['Store Name'].isin(top_6_stores)].groupby(['Store Name', 'Month'], observed=True)['Count'].sum().reset_index(name='Count')
+
+        # Ensure correct month ordering
+        month_order = [m[0] for m in last_6_months]
+        top_stores_monthly['Month'] = pd.Categorical(top_stores_monthly['Month'], categories=month_order, ordered=False)
+        
+        # Create visualization
+        fig_prod = px.line(
+            top_stores_monthly, 
+            x='Month', 
+            y='Count', 
+            color='Store Name', 
+            markers=True, 
+            text='Count', 
+            title=f"Monthly Productivity of Top 15 Maple Stores in {zone_filter} Zone",
+            height=600
         )
-    
-        state_store_losses = detailed_losses[detailed_losses['Store State'] == selected_state]
-        store_summary = state_store_losses.groupby(['Store Name', 'Spoc Name'])['Count'].sum().reset_index()
-    
-        fig_store = px.bar(
-            store_summary,
-            x='Store Name',
-        y='Count',
-        color='Spoc Name',
-        text='Count',
-        title=f"Trade-in Losses by Store in {selected_state}",
-        barmode='group'
+        fig_prod.update_traces(textposition="top center")
+        fig_prod.update_layout(
+            xaxis_title="Month",
+            yaxis_title="Number of Trade-ins",
+            legend_title="Store Name"
         )
-        fig_store.update_layout(xaxis_tickangle=45)
-        st.plotly_chart(fig_store, use_container_width=True)
-    
-    # Visualization 3: Product category distribution for selected state
-        st.subheader(f"Product Category Distribution in {selected_state}")
-        state_category_losses = state_store_losses.groupby('Product Category')['Count'].sum().reset_index()
+        st.plotly_chart(fig_prod, use_container_width=True)
+    else:
+        st.warning(f"No data available for {zone_filter} zone in the last 6 months")
+
+@st.fragment
+def process_store_performance_ranking(spoc_df, cube):
+    # 7. Store Performance Ranking & Analysis
+    st.header("7. Store Performance Ranking & Analysis")
+    maple_dates = cube.loc[cube['Source'] == 'Maple', 'Date']
+    min_date, max_date = maple_dates.min().date(), maple_dates.max().date()
+    date_range = st.date_input("Select Date Range", (max_date - timedelta(days=30), max_date), min_date, max_date, key="perf_date_range_adv")
     
-        fig_category = px.pie(
-        state_category_losses,
-        names='Product Category',
-        values='Count',
-        title=f"Product Categories Lost in {selected_state}"
+    if len(date_range) == 2:
+        start, end = date_range
+        store_perf_df = compute_market_share(cube, 'store', start=start, end=end).drop(columns=['Total Trade-ins'])
+        store_perf_df['Market Share (%)'] = store_perf_df['Market Share (%)'].round(2)
+        
+        # Add SPOC information
+        store_perf_df = pd.merge(
+            store_perf_df,
+            spoc_df[['Store Name', 'Spoc Name']].drop_duplicates(),
+            on='Store Name',
+            how='left'
         )
-        st.plotly_chart(fig_category, use_container_width=True)
-    
-    # Download buttons
-        st.download_button(
-        label="Download Detailed Trade-in Losses as CSV",
-        data=create_csv_buffer(detailed_losses, 'Trade-in Losses'),
-        file_name=f"tradein_losses_{selected_month}_{selected_year}.csv",
-        mime="text/csv"
+        
+        st.subheader("State-wise Contribution to Maple Trade-ins")
+        state_contrib = store_perf_df.groupby('Store State', observed=True)['Maple Count'].sum().reset_index()
+        fig_state_pie = px.pie(state_contrib, names='Store State', values='Maple Count', title="Maple Trade-in Volume by State")
+        st.plotly_chart(fig_state_pie)
+        st.subheader("Store Performance Ranking")
+        st.dataframe(store_perf_df.sort_values('Maple Count', ascending=False).reset_index(drop=True))
+
+        st.subheader("Stores where Cashify Outperforms Maple")
+        st.dataframe(store_perf_df[store_perf_df['Cashify Count'] > store_perf_df['Maple Count']].sort_values('Cashify Count', ascending=False))
+
+def process_shopped_around(cache_key):
+    st.header("8. Devices Quoted by Both Maple and Cashify")
+    matches, lost, leaderboard = get_section_result(
+        cache_key, ('shopped_around',),
+        lambda: compute_shopped_around(get_imei_index(cache_key))
+    )
+    if matches.empty:
+        st.info("No device IMEI appears in both the Maple and Cashify data.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Devices in Both Feeds", f"{len(matches):,}")
+    col2.metric("Lost to Cashify After a Maple Quote", f"{len(lost):,}")
+    col3.metric("Median Days to Cashify", f"{lost['Gap (Days)'].median():.0f}" if not lost.empty else "-")
+
+    if not leaderboard.empty:
+        st.subheader("Shopped Around and Lost: Store Leaderboard")
+        st.dataframe(leaderboard)
+        fig = px.bar(
+            leaderboard.head(15),
+            x='Store Name',
+            y='Devices Lost',
+            text='Devices Lost',
+            hover_data=['Avg Gap (Days)', 'Avg Price Difference (₹)', 'Value Lost (₹)'],
+            title="Devices Quoted by Maple and Traded In with Cashify (Top 15 Stores)"
         )
-    
+        fig.update_traces(textposition='outside')
+        st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("View Matched Devices"):
+        st.dataframe(matches.sort_values('Date (Cashify)', ascending=False))
         st.download_button(
-        label="Download Summary Data as CSV",
-        data=create_csv_buffer(pivot_data, 'Trade-in Summary'),
-        file_name=f"tradein_summary_{selected_month}_{selected_year}.csv",
-        mime="text/csv"
+            label="Download Matched Devices CSV",
+            data=create_csv_buffer(matches, 'Matched Devices'),
+            file_name="devices_in_both_feeds.csv",
+            mime="text/csv"
         )
 
-    def process_pricing_comparison(maple_filtered, cashify_filtered, selected_year, selected_month):
-        st.header("8. Device Loss to Cashify with Pricing Comparison")
-    
-        if selected_month == "All":
-            st.warning("Please select a specific month for pricing comparison")
-            return
-    
-        south_states = ['Andhra Pradesh', 'Telangana', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Puducherry']
-    
-        # Filter for south states and current month
-        cashify_prices = cashify_filtered[
-            (cashify_filtered['Store State'].isin(south_states)) &
-            (cashify_filtered['Month'] == selected_month) &
-            (cashify_filtered['Year'] == selected_year)
-        ]
-    
-        maple_prices = maple_filtered[
-         (maple_filtered['Store State'].isin(south_states)) &
-         (maple_filtered['Month'] == selected_month) &
-         (maple_filtered['Year'] == selected_year)
-        ]
-    
-        if cashify_prices.empty or maple_prices.empty:
-            st.warning("Insufficient data for pricing comparison")
-            return
-    
-    # Enhanced product categorization
-    cashify_prices['Product Category'] = cashify_prices['Product Type'].apply(categorize_product_type)
-    maple_prices['Product Category'] = maple_prices['Product Type'].apply(categorize_product_type)
-    
-    # Filter for valid categories
-    valid_categories = ['Mobile Phone', 'Laptop', 'Tablet', 'SmartWatch (Apple)', 'SmartWatch (Android)']
-    cashify_prices = cashify_prices[cashify_prices['Product Category'].isin(valid_categories)]
-    maple_prices = maple_prices[maple_prices['Product Category'].isin(valid_categories)]
-    
-    if cashify_prices.empty or maple_prices.empty:
-        st.warning("No valid product categories for pricing comparison")
-        return
-    
-    # Calculate average prices by category and program type
-    cashify_avg = cashify_prices.groupby(['Product Category', 'Product Type'])['Initial Device Amount'].mean().reset_index()
-    maple_avg = maple_prices.groupby(['Product Category', 'Product Type'])['Maple Bid'].mean().reset_index()
-    
-    pricing_comparison = pd.merge(
-        cashify_avg,
-        maple_avg,
-        on=['Product Category', 'Product Type'],
-        how='outer',
-        suffixes=('_Cashify', '_Maple')
-    ).fillna(0)
-    
-    pricing_comparison['Price Difference (₹)'] = pricing_comparison['Initial Device Amount'] - pricing_comparison['Maple Bid']
-    pricing_comparison['Price Difference (%)'] = (pricing_comparison['Price Difference (₹)'] / pricing_comparison['Maple Bid']) * 100
-    
-    # Format for display
-    pricing_comparison = pricing_comparison.round(2)
-    pricing_comparison.columns = [
-        'Product Category', 
-        'Program Type',
-        'Avg Cashify Price (₹)', 
-        'Avg Maple Price (₹)', 
-        'Price Difference (₹)', 
-        'Price Difference (%)'
-    ]
-    
-    st.write(f"**Pricing Comparison for {selected_month} {selected_year}**")
-    st.dataframe(pricing_comparison)
-    
-    # Visualization - Price Difference by Category and Program Type
-    fig = px.bar(
-        pricing_comparison,
-        x='Product Category',
-        y='Price Difference (₹)',
-        color='Program Type',
-        barmode='group',
-        text='Price Difference (₹)',
-        title=f"Price Difference (Cashify - Maple) by Category ({selected_month} {selected_year})",
-        labels={'value': 'Price Difference (₹)', 'variable': 'Price Source'}
-    )
-    fig.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-    st.plotly_chart(fig, use_container_width=True)
-    
-    # Visualization - Average Prices Comparison
-    fig_prices = px.bar(
-        pricing_comparison.melt(id_vars=['Product Category', 'Program Type'], 
-                              value_vars=['Avg Cashify Price (₹)', 'Avg Maple Price (₹)']),
-        x='Product Category',
-        y='value',
-        color='variable',
-        facet_col='Program Type',
-        text='value',
-        title=f"Average Pricing Comparison by Program Type ({selected_month} {selected_year})",
-        labels={'value': 'Price (₹)', 'variable': 'Price Source'}
-    )
-    fig_prices.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-    fig_prices.update_layout(showlegend=True)
-    st.plotly_chart(fig_prices, use_container_width=True)
-
-def advanced_analytics(maple_df, cashify_df, spoc_df):
+def advanced_analytics(maple_dataset, cashify_dataset, spoc_df, cube, target_achievement, cache_key):
     st.title("Advanced Analytics & SPOC Performance")
     
     # 1. Zonal Market Share Trend with Hourly Data Points
     st.header("1. Zonal Market Share Trend")
-    zone_options = [z for z in maple_df['Zone'].unique() if z in ['South', 'West']]
+    maple_cube = cube[cube['Source'] == 'Maple']
+    zone_options = [z for z in maple_cube['Zone'].unique() if z in ['South', 'West']]
     selected_zone_adv = st.selectbox("Select Zone", zone_options, key="adv_zone")
     timeframe_options = [7, 15, 30, 60, 90]
     default_timeframe = 30
     timeframe_days = st.sidebar.radio("Select Timeframe (Days)", options=timeframe_options, index=timeframe_options.index(default_timeframe))
 
     if selected_zone_adv:
-        end_date = maple_df['Created Date'].max()
+        end_date = maple_cube['Date'].max()
         start_date = end_date - timedelta(days=timeframe_days)
     
         if timeframe_days == 1:  # Special handling for 1-day view
             date_range_index = pd.date_range(start_date, end_date, freq='H')
-            maple_daily = maple_df[maple_df['Zone'] == selected_zone_adv].set_index('Created Date').resample('H').size().reindex(date_range_index, fill_value=0)
-            cashify_daily = cashify_df[cashify_df['Zone'] == selected_zone_adv].set_index('Order Date').resample('H').size().reindex(date_range_index, fill_value=0)
+            maple_window = read_dataset_window(maple_dataset, 'Created Date', start_date, end_date, include_end=True)
+            cashify_window = read_dataset_window(cashify_dataset, 'Order Date', start_date, end_date, include_end=True)
+            maple_daily = maple_window[maple_window['Zone'] == selected_zone_adv].set_index('Created Date').resample('H').size().reindex(date_range_index, fill_value=0)
+            cashify_daily = cashify_window[cashify_window['Zone'] == selected_zone_adv].set_index('Order Date').resample('H').size().reindex(date_range_index, fill_value=0)
+            daily_ms = pd.DataFrame({'Maple': maple_daily, 'Cashify': cashify_daily})
         else:
             date_range_index = pd.date_range(start_date, end_date, freq='D')
-            maple_daily = maple_df[maple_df['Zone'] == selected_zone_adv].set_index('Created Date').resample('D').size().reindex(date_range_index, fill_value=0)
-            cashify_daily = cashify_df[cashify_df['Zone'] == selected_zone_adv].set_index('Order Date').resample('D').size().reindex(date_range_index, fill_value=0)
+            zone_shares = compute_market_share(cube[cube['Zone'] == selected_zone_adv], 'zone', period='day', start=start_date, end=end_date)
+            daily_ms = zone_shares.set_index('Date')[['Maple Count', 'Cashify Count']].reindex(date_range_index, fill_value=0)
+            daily_ms.columns = ['Maple', 'Cashify']
     
-        daily_ms = pd.DataFrame({'Maple': maple_daily, 'Cashify': cashify_daily})
-        daily_ms['Market Share'] = daily_ms.apply(lambda r: calculate_market_share(r['Maple'], r['Maple'] + r['Cashify']), axis=1)
+        daily_ms['Market Share'] = calculate_market_share(daily_ms['Maple'], daily_ms['Maple'] + daily_ms['Cashify'])
         daily_ms['Delta'] = daily_ms['Market Share'].diff()
     
     # Create figure with colored markers
@@ -2026,17 +3363,17 @@ def advanced_analytics(maple_df, cashify_df, spoc_df):
 
     # 2. State Performance in Zone
     st.header(f"2. State Performance in {selected_zone_adv} Zone (Last 30 Days)")
-    states_in_zone = maple_df[maple_df['Zone'] == selected_zone_adv]['Store State'].dropna().unique()
-    state_perf_data = []
+    states_in_zone = maple_cube.loc[maple_cube['Zone'] == selected_zone_adv, 'Store State'].dropna().unique()
     if len(states_in_zone) > 0:
-        end_date = maple_df['Created Date'].max()
-        for state in states_in_zone:
-            maple_state = len(maple_df[(maple_df['Store State'] == state) & (maple_df['Created Date'] >= end_date - timedelta(days=30))])
-            cashify_state = len(cashify_df[(cashify_df['Store State'] == state) & (cashify_df['Order Date'] >= end_date - timedelta(days=30))])
-            state_ms = calculate_market_share(maple_state, maple_state + cashify_state)
-            state_perf_data.append({'State': state, 'Market Share (%)': state_ms, 'Maple Volume': maple_state})
-        
-        state_perf_df = pd.DataFrame(state_perf_data)
+        end_date = maple_cube['Date'].max()
+        state_shares = compute_market_share(
+            cube[cube['Store State'].isin(states_in_zone)], 'state', start=end_date - timedelta(days=30)
+        ).set_index('Store State').reindex(states_in_zone, fill_value=0)
+        state_perf_df = pd.DataFrame({
+            'State': states_in_zone,
+            'Market Share (%)': state_shares['Market Share (%)'].values,
+            'Maple Volume': state_shares['Maple Count'].values
+        })
         col1, col2 = st.columns(2)
         with col1:
             st.write("📈 **Growing States (MS > 50%)**")
@@ -2045,29 +3382,16 @@ def advanced_analytics(maple_df, cashify_df, spoc_df):
             st.write("📉 **De-growing States (MS < 20%)**")
             st.dataframe(state_perf_df[state_perf_df['Market Share (%)'] < 20].sort_values('Market Share (%)'))
 
-    # 3. SPOC Performance Profile
-    st.header("3. SPOC Performance Profile")
-    if 'SPOC_ID' in spoc_df.columns:
-        spoc_list = spoc_df.sort_values('Spoc Name')[['Spoc Name', 'SPOC_ID']].dropna().drop_duplicates()
-        selected_spoc_id_adv = st.selectbox("Select SPOC", spoc_list['SPOC_ID'], format_func=lambda x: spoc_list[spoc_list['SPOC_ID']==x]['Spoc Name'].iloc[0], key="adv_spoc_select")
-        if selected_spoc_id_adv:
-            start_date_sep = pd.Timestamp('2024-09-01')
-            spoc_history = maple_df[(maple_df['SPOC_ID'] == selected_spoc_id_adv) & (maple_df['Created Date'] >= start_date_sep)]
-            st.metric(f"Total Trade-ins Since Sep '24", len(spoc_history))
-            if not spoc_history.empty:
-                monthly_perf = spoc_history.set_index('Created Date').resample('ME').size().reset_index()
-                monthly_perf.columns = ['Month', 'Count']
-                monthly_perf['Month'] = monthly_perf['Month'].dt.strftime('%b %Y')
-                fig_spoc_hist = px.bar(monthly_perf, x='Month', y='Count', text_auto=True, title="Monthly Trade-in Performance")
-                st.plotly_chart(fig_spoc_hist)
-    
+    process_spoc_profile(maple_dataset, spoc_df)
+
     # 4. Trade-in Loss Analysis
     st.header("4. Trade-in Loss Analysis (Last 6 Months)")
     last_6_months = get_last_n_months_for_page(6)
-    cashify_last_6m = cashify_df.merge(pd.DataFrame(last_6_months, columns=['Month', 'Year']), on=['Month', 'Year'], how='inner')
-    if not cashify_last_6m.empty:
+    windows = [get_date_window(year, month) for month, year in last_6_months]
+    loss_window = (min(start for start, _ in windows), max(end for _, end in windows))
+    lob_loss = count_dataset_rows(cashify_dataset, 'Order Date', ['Month', 'Product Category'], *loss_window, months=last_6_months)
+    if not lob_loss.empty:
         st.subheader("Loss by Product Category (LOB)")
-        lob_loss = cashify_last_6m.groupby(['Month', 'Product Category']).size().reset_index(name='Count')
         
         # Create a larger, clearer visualization
         fig_lob_loss = px.bar(
@@ -2091,13 +3415,15 @@ def advanced_analytics(maple_df, cashify_df, spoc_df):
 
         st.subheader("Top 10 Stores with Highest Losses (and Top Lost Devices)")
         # Get top 10 stores by total losses
-        store_loss_total = cashify_last_6m.groupby(['Store Name', 'Store State']).size().reset_index(name='Total Losses').sort_values('Total Losses', ascending=False).head(10)
+        store_loss_total = count_dataset_rows(cashify_dataset, 'Order Date', ['Store Name', 'Store State'], *loss_window, months=last_6_months)
+        store_loss_total = store_loss_total.rename(columns={'Count': 'Total Losses'}).sort_values('Total Losses', ascending=False).head(10)
         
         if not store_loss_total.empty:
             # Get top lost devices for each store
-            top_device_loss = cashify_last_6m[cashify_last_6m['Store Name'].isin(store_loss_total['Store Name'])]
-            top_device_loss = top_device_loss.groupby(['Store Name', 'Old Device Name']).size().reset_index(name='Device Count')
-            top_device_loss = top_device_loss.loc[top_device_loss.groupby('Store Name')['Device Count'].idxmax()]
+            top_device_loss = count_dataset_rows(cashify_dataset, 'Order Date', ['Store Name', 'Old Device Name'], *loss_window, months=last_6_months)
+            top_device_loss = top_device_loss.rename(columns={'Count': 'Device Count'})
+            top_device_loss = top_device_loss[top_device_loss['Store Name'].isin(store_loss_total['Store Name'])]
+            top_device_loss = top_device_loss.loc[top_device_loss.groupby('Store Name', observed=True)['Device Count'].idxmax()]
             
             # Merge with total losses
             store_loss_final = pd.merge(
@@ -2134,51 +3460,7 @@ def advanced_analytics(maple_df, cashify_df, spoc_df):
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
-    # 5. Highest Productive Stores
-    st.header("5. Highest Productive Stores (Last 6 Months)")
-    last_6_months = get_last_n_months_for_page(6)
-    
-    # Add zone filter
-    zone_filter = st.selectbox("Select Zone for Store Productivity", ['South', 'West'], key="store_prod_zone")
-    
-    maple_last_6m = maple_df[
-        (maple_df['Zone'] == zone_filter) &
-        (maple_df['Month'].isin([m[0] for m in last_6_months])) &
-        (maple_df['Year'].isin([m[1] for m in last_6_months]))
-    ]
-    
-    if not maple_last_6m.empty:
-        # Get top 6 stores in the selected zone
-        top_6_stores = maple_last_6m.groupby('Store Name').size().nlargest(6).index
-
-        # Prepare data for visualization
-        top_stores_monthly = maple_last_6m[maple_last_6m['Store Name'].isin(top_6_stores)].groupby(['Store Name', 'Month']).size().reset_index(name='Count')
-
-        # Ensure correct month ordering
-        month_order = [m[0] for m in last_6_months]
-        top_stores_monthly['Month'] = pd.Categorical(top_stores_monthly['Month'], categories=month_order, ordered=False)
-        
-        # Create visualization
-        fig_prod = px.line(
-            top_stores_monthly, 
-            x='Month', 
-            y='Count', 
-            color='Store Name', 
-            markers=True, 
-            text='Count', 
-            title=f"Monthly Productivity of Top 15 Maple Stores in {zone_filter} Zone",
-            height=600
-        )
-        fig_prod.update_traces(textposition="top center")
-        fig_prod.update_layout(
-            xaxis_title="Month",
-            yaxis_title="Number of Trade-ins",
-            legend_title="Store Name"
-        )
-        st.plotly_chart(fig_prod, use_container_width=True)
-    else:
-        st.warning(f"No data available for {zone_filter} zone in the last 6 months")
-
+    process_store_productivity(maple_cube)
 
     # 6. Monthly SPOC Target Performance
     st.header("6. SPOC Target Performance (Current vs. Previous Month)")
@@ -2188,16 +3470,13 @@ def advanced_analytics(maple_df, cashify_df, spoc_df):
             prev_month, prev_year = months_to_compare[0]
             curr_month, curr_year = months_to_compare[1]
             
-            perf_df = spoc_df[['SPOC_ID', 'Spoc Name', 'Store Name', 'Store State']].copy().dropna(subset=['SPOC_ID'])
-            
-            for m, y, suffix in [(curr_month, curr_year, '_curr'), (prev_month, prev_year, '_prev')]:
-                target_col = f"{m} Target"
-                if target_col in spoc_df.columns:
-                    perf_df = pd.merge(perf_df, spoc_df[['SPOC_ID', target_col]], on='SPOC_ID', how='left')
-                    perf_df.rename(columns={target_col: f'Target{suffix}'}, inplace=True)
-                    ach_df = maple_df[(maple_df['Month'] == m) & (maple_df['Year'] == y)].groupby('SPOC_ID').size().reset_index(name=f'Achieved{suffix}')
-                    perf_df = pd.merge(perf_df, ach_df, on='SPOC_ID', how='left')
-                    perf_df[f'% Achieved{suffix}'] = perf_df.apply(lambda r: calculate_target_achievement(r.get(f'Achieved{suffix}', 0), r.get(f'Target{suffix}', 0)), axis=1).round(1)
+            perf_df = spoc_df[['SPOC_ID', 'Spoc Name', 'Store Name', 'Store State']].dropna(subset=['SPOC_ID'])
+            month_perf = filter_cube_months(target_achievement, months_to_compare)
+            for period, suffix in [(1, '_curr'), (0, '_prev')]:
+                period_perf = month_perf.loc[month_perf['Period'] == period, ['SPOC_ID', 'Target', 'Achieved', '% Achieved']]
+                period_perf = period_perf.set_index('SPOC_ID').add_suffix(suffix)
+                period_perf[f'% Achieved{suffix}'] = period_perf[f'% Achieved{suffix}'].round(1)
+                perf_df = perf_df.merge(period_perf, left_on='SPOC_ID', right_index=True, how='left')
 
             perf_df = perf_df.fillna(0)
             display_cols = ['Spoc Name', 'Store Name', 'Store State']
@@ -2211,42 +3490,8 @@ def advanced_analytics(maple_df, cashify_df, spoc_df):
             perf_display_df.columns = perf_display_df.columns.str.replace('_curr', f' ({curr_month})').str.replace('_prev', f' ({prev_month})')
             st.dataframe(perf_display_df.sort_values(by=f'% Achieved ({curr_month})', ascending=False))
 
-    # 7. Store Performance Ranking & Analysis
-    st.header("7. Store Performance Ranking & Analysis")
-    min_date, max_date = maple_df['Created Date'].min().date(), maple_df['Created Date'].max().date()
-    date_range = st.date_input("Select Date Range", (max_date - timedelta(days=30), max_date), min_date, max_date, key="perf_date_range_adv")
-    
-    if len(date_range) == 2:
-        start, end = date_range
-        maple_perf = maple_df[maple_df['Created Date'].dt.date.between(start, end)]
-        cashify_perf = cashify_df[cashify_df['Order Date'].dt.date.between(start, end)]
-        
-        maple_counts = maple_perf.groupby(['Store Name', 'Store State', 'Zone']).size().reset_index(name='Maple Count')
-        cashify_counts = cashify_perf.groupby(['Store Name', 'Store State', 'Zone']).size().reset_index(name='Cashify Count')
-        
-        store_perf_df = pd.merge(maple_counts, cashify_counts, on=['Store Name', 'Store State', 'Zone'], how='outer').fillna(0)
-        store_perf_df['Market Share (%)'] = store_perf_df.apply(
-            lambda r: calculate_market_share(r['Maple Count'], r['Maple Count'] + r['Cashify Count']), 
-            axis=1
-        ).round(2)
-        
-        # Add SPOC information
-        store_perf_df = pd.merge(
-            store_perf_df,
-            spoc_df[['Store Name', 'Spoc Name']].drop_duplicates(),
-            on='Store Name',
-            how='left'
-        )
-        
-        st.subheader("State-wise Contribution to Maple Trade-ins")
-        state_contrib = store_perf_df.groupby('Store State')['Maple Count'].sum().reset_index()
-        fig_state_pie = px.pie(state_contrib, names='Store State', values='Maple Count', title="Maple Trade-in Volume by State")
-        st.plotly_chart(fig_state_pie)
-        st.subheader("Store Performance Ranking")
-        st.dataframe(store_perf_df.sort_values('Maple Count', ascending=False).reset_index(drop=True))
-
-        st.subheader("Stores where Cashify Outperforms Maple")
-        st.dataframe(store_perf_df[store_perf_df['Cashify Count'] > store_perf_df['Maple Count']].sort_values('Cashify Count', ascending=False))
+    process_store_performance_ranking(spoc_df, cube)
+    process_shopped_around(cache_key)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file